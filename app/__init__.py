@@ -9,9 +9,17 @@ def create_app() -> Flask:
         static_url_path="/static",
     )
     # Registrer blueprints fra routes-pakken
-    from .routes import pages_bp, api_bp
+    from .routes import pages_bp, api_bp, media_bp
     app.register_blueprint(pages_bp)
     app.register_blueprint(api_bp)
+    app.register_blueprint(media_bp)
+    from .metrics import init_app as init_metrics
+    init_metrics(app)
+    from .scheduler import ensure_scheduler
+    @app.before_request
+    def start_background_jobs() -> None:
+        # Hvorfor her og ikke ved import: tråder overlever ikke fork (gunicorn --preload)
+        ensure_scheduler()
     @app.after_request
     def apply_common_headers(resp: Response) -> Response:
         # Basale headere
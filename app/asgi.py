@@ -0,0 +1,195 @@
+# File: app/asgi.py
+"""
+ASGI-modus: /events serveres på asyncio, alt annet går til Flask via en tynn
+WSGI-bro i en liten trådpool.
+Hvorfor: under gunicorn gthread binder hver åpne SSE-strøm én av 4 tråder pr.
+worker, så 8 skjermer er taket før /tick og admin-API sulter. Her er en åpen
+strøm bare en korutine + en liten asyncio.Queue; tusenvis av ledige
+tilkoblinger koster noen få KB hver og ingen tråder.
+Abonnentene registreres i samme sett som WSGI-køene (sse.subscribe), så relay
+mellom workere og tilstandsvakta virker likt i begge moduser.
+Kjør (krever en ASGI-server, f.eks. uvicorn):
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker --workers 2
+"""
+from __future__ import annotations
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from . import sse
+from .events import ensure_watcher, state_event
+__all__ = ["AsyncSubscriber", "create_asgi_app"]
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+_SSE_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+class AsyncSubscriber:
+    """Trådsikker bro fra publish() (vilkårlig tråd) til en asyncio-kø."""
+    __slots__ = ("loop", "queue", "overflow")
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = 100) -> None:
+        self.loop = loop
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=maxsize)
+        self.overflow = False
+    def _push(self, frame: bytes) -> None:
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Hvorfor: samme policy som SSEQueue – dropp klienten, den reconnecter
+            self.overflow = True
+            sse.unsubscribe(self)
+    def put_nowait(self, frame: bytes) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._push, frame)
+        except RuntimeError:
+            sse.unsubscribe(self)  # loopen er stengt
+def _wsgi_environ(scope: Scope, body: bytes) -> Dict[str, Any]:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ: Dict[str, Any] = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": str(client[0]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "CONTENT_LENGTH": str(len(body)),
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+            continue
+        if name == "CONTENT_LENGTH":
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+class _AsgiApp:
+    def __init__(
+        self,
+        wsgi_app: Callable,
+        *,
+        threads: int = 8,
+        ping_interval: float = sse.PING_INTERVAL_S,
+    ) -> None:
+        self.wsgi_app = wsgi_app
+        self.ping_interval = ping_interval
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="countdown-wsgi"
+        )
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return  # websockets o.l. støttes ikke
+        if scope["path"] == "/events" and scope["method"] in ("GET", "HEAD"):
+            await self._events(scope, receive, send)
+            return
+        await self._wsgi(scope, receive, send)
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            msg = await receive()
+            if msg["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif msg["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    # --- /events ---------------------------------------------------------------
+    async def _events(self, scope: Scope, receive: Receive, send: Send) -> None:
+        loop = asyncio.get_running_loop()
+        sub = AsyncSubscriber(loop)
+        sse.subscribe(sub)
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        getter: Optional["asyncio.Future[bytes]"] = None
+        try:
+            ensure_watcher()
+            snapshot = await loop.run_in_executor(self.executor, state_event)
+            await send({"type": "http.response.start", "status": 200, "headers": _SSE_HEADERS})
+            if scope["method"] == "HEAD":
+                await send({"type": "http.response.body", "body": b""})
+                return
+            first = sse.RETRY_FRAME + sse.encode_frame(0, "state", snapshot)
+            await send({"type": "http.response.body", "body": first, "more_body": True})
+            while not sub.overflow:
+                getter = asyncio.ensure_future(sub.queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, disconnected},
+                    timeout=self.ping_interval,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if getter in done:
+                    frame = getter.result()
+                else:
+                    getter.cancel()
+                    if disconnected in done:
+                        return
+                    frame = sse.encode_frame(0, "ping", {"ts": time.time()})
+                await send({"type": "http.response.body", "body": frame, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        except OSError:
+            pass  # klient koblet fra midt i send
+        finally:
+            # Hvorfor ikke fange CancelledError: serveren avbryter ved shutdown/disconnect
+            # og må se avbruddet; her ryddes bare opp før det går videre.
+            sse.unsubscribe(sub)
+            disconnected.cancel()
+            if getter is not None:
+                getter.cancel()
+    @staticmethod
+    async def _wait_disconnect(receive: Receive) -> None:
+        while True:
+            msg = await receive()
+            if msg["type"] == "http.disconnect":
+                return
+    # --- WSGI-bro -----------------------------------------------------------------
+    async def _wsgi(self, scope: Scope, receive: Receive, send: Send) -> None:
+        chunks: List[bytes] = []
+        more = True
+        while more:
+            msg = await receive()
+            if msg["type"] == "http.disconnect":
+                return
+            chunks.append(msg.get("body", b""))
+            more = msg.get("more_body", False)
+        environ = _wsgi_environ(scope, b"".join(chunks))
+        status, headers, body = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._run_wsgi, environ
+        )
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+    def _run_wsgi(self, environ: Dict[str, Any]) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+        started: Dict[str, Any] = {}
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info: Any = None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [
+                (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers
+            ]
+            return lambda data: None  # write() brukes ikke av Flask
+        result = self.wsgi_app(environ, start_response)
+        try:
+            body = b"".join(result)  # hvorfor: strømmende ruter (/events) håndteres over
+        finally:
+            close = getattr(result, "close", None)
+            if close:
+                close()
+        return started.get("status", 500), started.get("headers", []), body
+def create_asgi_app(wsgi_app: Callable, **kwargs: Any) -> _AsgiApp:
+    return _AsgiApp(wsgi_app, **kwargs)
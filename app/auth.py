@@ -1,24 +1,170 @@
 # app/auth.py
+"""
+Admin-autentisering.
+- Passordet i config hashes én gang pr. config-revisjon (storage.config_etag(): bare
+  stat() ved treff), så beskyttede kall slipper å laste/parse config for å sjekke det.
+- X-Admin-Password sammenlignes i konstant tid (hmac.compare_digest på SHA-256).
+- Godkjent passord gir et kortlivet sesjonstoken (cookie 'admin_token', eller
+  X-Admin-Token / POST /api/auth/token for andre klienter). Tokenet er HMAC-signert med
+  en nøkkel avledet av en tilfeldig hemmelighet og passord-hashen, så det gjelder i
+  alle workere og blir ugyldig når passordet endres. Hvorfor: autosave, diag og
+  statuslinjen (/api/sys/about-status hvert 10. s) trenger da bare en HMAC-sjekk.
+- Hemmeligheten lages ved første oppstart og lagres 0600 ved siden av config.json
+  (config.secret); COUNTDOWN_SECRET_KEY overstyrer. Hvorfor: uten den kunne et
+  oppfanget token brute-forces offline mot passordet. Slett fila for å gjøre alle
+  utstedte token ugyldige.
+- Skrivende kall som bare er autentisert med cookie må ha samme Origin (hvis sendt)
+  og JSON-body eller X-Requested-With (CSRF; SameSite=Strict alene holder ikke for
+  eldre nettlesere/underdomener). Header-autentisering (passord/token) sendes aldri
+  automatisk av nettleseren og trenger ikke sjekken.
+"""
 from __future__ import annotations
+import hashlib
+import hmac
 import os
-from functools import wraps
-from flask import request, jsonify
-from .storage import load_config
+import threading
+import time
+from functools import lru_cache, wraps
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from flask import jsonify, make_response, request
+from . import storage
+__all__ = [
+    "TOKEN_COOKIE",
+    "TOKEN_TTL_S",
+    "require_password",
+    "issue_token",
+    "verify_token",
+    "auth_enabled",
+    "secret_path_for",
+]
+TOKEN_COOKIE = "admin_token"
+TOKEN_TTL_S = int(os.environ.get("COUNTDOWN_AUTH_TOKEN_TTL_S", "900") or 900)
+_SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+_lock = threading.Lock()
+# (etag, sha256(passord) eller None, token-nøkkel)
+_cred: Tuple[Optional[str], Optional[bytes], bytes] = (None, None, b"")
+_secrets: Dict[str, bytes] = {}  # sti → hemmelighet
+def secret_path_for(config_path) -> Path:
+    """config.json → config.secret (samme katalog)."""
+    p = Path(config_path)
+    return p.with_name(p.stem + ".secret")
+def _read_or_create_secret(path: Path) -> bytes:
+    try:
+        data = path.read_bytes().strip()
+        if data:
+            return data
+    except FileNotFoundError:
+        pass
+    # tmp + link: en annen worker kan lage fila samtidig; den første vinner
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+    fd = os.open(str(tmp), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(32).hex().encode("ascii") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(str(tmp), str(path))
+        except FileExistsError:
+            pass
+    finally:
+        try:
+            os.unlink(str(tmp))
+        except OSError:
+            pass
+    return path.read_bytes().strip()
+def _secret() -> bytes:
+    env = (os.environ.get("COUNTDOWN_SECRET_KEY") or "").strip()
+    if env:
+        return env.encode("utf-8")
+    path = secret_path_for(storage.CONFIG_PATH)
+    key = str(path)
+    secret = _secrets.get(key)
+    if secret is None:
+        with _lock:
+            secret = _secrets.get(key)
+            if secret is None:
+                secret = _secrets[key] = _read_or_create_secret(path)
+    return secret
+@lru_cache(maxsize=4)
+def _token_key(secret: bytes, digest: bytes) -> bytes:
+    return hmac.new(secret, b"countdown-admin-token\0" + digest, hashlib.sha256).digest()
+def _credential() -> Tuple[Optional[bytes], bytes]:
+    """(passord-hash, token-nøkkel) for gjeldende config-revisjon; None = ingen passord."""
+    global _cred
+    etag = storage.config_etag()
+    cached_etag, digest, key = _cred
+    if cached_etag == etag:
+        return digest, key
+    # Ny revisjon er som regel bare en kjøreverdi (picsum-rotasjon o.l.): nøkkelen
+    # er cachet på (hemmelighet, passord-hash) og avledes ikke på nytt
+    pw = str(storage.load_config().get("admin_password") or "").strip()
+    digest = hashlib.sha256(pw.encode("utf-8")).digest() if pw else None
+    key = _token_key(_secret(), digest) if digest is not None else b""
+    with _lock:
+        _cred = (etag, digest, key)
+    return digest, key
+def auth_enabled() -> bool:
+    return os.environ.get("COUNTDOWN_DISABLE_AUTH") != "1" and _credential()[0] is not None
+def _sign(key: bytes, exp: int) -> str:
+    return hmac.new(key, f"v1.{exp}".encode("ascii"), hashlib.sha256).hexdigest()[:32]
+def issue_token(now: Optional[float] = None) -> Tuple[str, int]:
+    """(token, utløp i epoch-sekunder). Krever at passord er satt."""
+    digest, key = _credential()
+    if digest is None:
+        raise ValueError("Ingen admin-passord satt")
+    exp = int(now if now is not None else time.time()) + TOKEN_TTL_S
+    return f"v1.{exp}.{_sign(key, exp)}", exp
+def verify_token(token: str, now: Optional[float] = None) -> Optional[int]:
+    """Utløpstid hvis tokenet er gyldig for gjeldende passord, ellers None."""
+    parts = (token or "").split(".")
+    if len(parts) != 3 or parts[0] != "v1" or not parts[1].isdigit():
+        return None
+    exp = int(parts[1])
+    if exp <= (now if now is not None else time.time()):
+        return None
+    digest, key = _credential()
+    if digest is None or not hmac.compare_digest(parts[2], _sign(key, exp)):
+        return None
+    return exp
+def _password_ok(got: str, digest: bytes) -> bool:
+    return hmac.compare_digest(hashlib.sha256(got.encode("utf-8")).digest(), digest)
+def _csrf_ok() -> bool:
+    """Cookie-autentisert skriving: samme Origin (hvis sendt) og JSON/X-Requested-With."""
+    if request.method in _SAFE_METHODS:
+        return True
+    origin = request.headers.get("Origin")
+    if origin and urlsplit(origin).netloc != request.host:
+        return False
+    return request.is_json or bool(request.headers.get("X-Requested-With"))
 def require_password(fn):
     """
-    Krever X-Admin-Password header KUN hvis det finnes et passord i config
-    og COUNTDOWN_DISABLE_AUTH != '1'.
+    Krever gyldig sesjonstoken eller X-Admin-Password header KUN hvis det finnes et
+    passord i config og COUNTDOWN_DISABLE_AUTH != '1'.
     """
     @wraps(fn)
     def wrapper(*args, **kwargs):
         if os.environ.get("COUNTDOWN_DISABLE_AUTH") == "1":
             return fn(*args, **kwargs)  # hvorfor: eksplisitt bypass i drift/feilsøking
-        cfg = load_config()
-        pw = str(cfg.get("admin_password") or "").strip()
-        if pw == "":
+        digest, _key = _credential()
+        if digest is None:
             return fn(*args, **kwargs)  # hvorfor: tomt passord = ingen auth
-        got = request.headers.get("X-Admin-Password", "")
-        if got == pw:
+        header_token = request.headers.get("X-Admin-Token")
+        token = header_token or request.cookies.get(TOKEN_COOKIE, "")
+        exp = verify_token(token) if token else None
+        # Egendefinerte headere krever CORS-preflight, så bare ren cookie-auth sjekkes
+        via_cookie = not header_token and "X-Admin-Password" not in request.headers
+        if exp is not None and via_cookie and not _csrf_ok():
+            return jsonify({"error": "Forbidden", "code": "csrf"}), 403
+        if exp is not None and exp - time.time() > TOKEN_TTL_S / 2:
             return fn(*args, **kwargs)
-        return jsonify({"error": "Unauthorized"}), 401
+        if exp is None and not _password_ok(request.headers.get("X-Admin-Password", ""), digest):
+            return jsonify({"error": "Unauthorized"}), 401
+        # Passord godkjent eller token i siste halvdel av levetiden: nytt token i cookie
+        resp = make_response(fn(*args, **kwargs))
+        resp.set_cookie(TOKEN_COOKIE, issue_token()[0], max_age=TOKEN_TTL_S, httponly=True, samesite="Strict", path="/")
+        return resp
     return wrapper
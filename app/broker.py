@@ -0,0 +1,131 @@
+# File: app/broker.py
+"""
+Pub/sub-backend bak sse.publish(): når hendelser frem til alle gunicorn-workere?
+- InMemoryBackend: kun denne prosessen (tester, flask run, waitress).
+- UnixDatagramBackend: hver worker binder en unix-datagram-socket i en felles
+  katalog. publish() leverer lokalt og sender samme ferdigkodede ramme (bytes)
+  til alle andre sockets i katalogen, så en lagring på worker A når klientene
+  på worker B med én syscall pr. peer. Døde sockets (worker borte) ryddes ved første feil.
+Valg: COUNTDOWN_SSE_BACKEND=memory|unix (default unix der AF_UNIX finnes).
+Katalog: COUNTDOWN_SSE_DIR, ellers settings.private_run_dir("countdown-sse").
+"""
+from __future__ import annotations
+import atexit
+import logging
+import os
+import socket
+import threading
+from typing import Callable, Optional
+from .settings import private_run_dir
+__all__ = [
+    "Backend",
+    "InMemoryBackend",
+    "UnixDatagramBackend",
+    "default_backend",
+]
+log = logging.getLogger(__name__)
+Deliver = Callable[[bytes], None]
+class Backend:
+    """Grensesnitt: start(deliver) én gang, deretter publish(frame) fra alle tråder."""
+    def start(self, deliver: Deliver) -> None:
+        raise NotImplementedError
+    def publish(self, frame: bytes) -> None:
+        raise NotImplementedError
+    def close(self) -> None:
+        pass
+class InMemoryBackend(Backend):
+    def __init__(self) -> None:
+        self._deliver: Optional[Deliver] = None
+    def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+    def publish(self, frame: bytes) -> None:
+        if self._deliver is not None:
+            self._deliver(frame)
+class UnixDatagramBackend(Backend):
+    MAX_DATAGRAM = 64 * 1024
+    # Hvorfor flagg og ikke setblocking(False): mottakstråden bruker samme socket og
+    # skal blokkere i recv(). Full mottaksbuffer hos en peer → EAGAIN → rammen droppes.
+    _SEND_FLAGS = getattr(socket, "MSG_DONTWAIT", 0)
+    def __init__(self, run_dir: str) -> None:
+        self.run_dir = run_dir
+        self.path = ""
+        self._sock: Optional[socket.socket] = None
+        self._deliver: Optional[Deliver] = None
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+    def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        os.makedirs(self.run_dir, mode=0o700, exist_ok=True)
+        self.path = os.path.join(self.run_dir, f"{os.getpid()}-{os.urandom(3).hex()}.sock")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.path)
+        self._sock = sock
+        self._thread = threading.Thread(
+            target=self._recv_loop, name="countdown-sse-relay", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+    def _recv_loop(self) -> None:
+        sock = self._sock
+        while sock is not None and not self._closed:
+            try:
+                frame = sock.recv(self.MAX_DATAGRAM)
+            except OSError:
+                return  # socket lukket
+            if frame and self._deliver is not None:
+                self._deliver(frame)
+    def _peers(self):
+        try:
+            names = os.listdir(self.run_dir)
+        except OSError:
+            return []
+        return [
+            os.path.join(self.run_dir, n)
+            for n in names
+            if n.endswith(".sock") and os.path.join(self.run_dir, n) != self.path
+        ]
+    def publish(self, frame: bytes) -> None:
+        if self._deliver is not None:
+            self._deliver(frame)
+        sock = self._sock
+        if sock is None:
+            return
+        if len(frame) > self.MAX_DATAGRAM:
+            log.warning("SSE-hendelse for stor for relay (%d bytes) – kun lokal", len(frame))
+            return
+        for peer in self._peers():
+            try:
+                sock.sendto(frame, self._SEND_FLAGS, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Hvorfor: worker er borte (restart/kill) – rydd etter den
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                pass  # peer henger etter; dropp heller enn å blokkere
+            except OSError:
+                log.debug("sendto %s feilet", peer, exc_info=True)
+    def close(self) -> None:
+        self._closed = True
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+def _default_run_dir() -> str:
+    explicit = (os.environ.get("COUNTDOWN_SSE_DIR") or "").strip()
+    if explicit:
+        return explicit
+    return private_run_dir("countdown-sse")
+def default_backend() -> Backend:
+    kind = (os.environ.get("COUNTDOWN_SSE_BACKEND") or "").strip().lower()
+    if kind == "memory" or not hasattr(socket, "AF_UNIX"):
+        return InMemoryBackend()
+    return UnixDatagramBackend(_default_run_dir())
@@ -2,16 +2,18 @@
 """
 Target-beregning + tick.
 Ny kanonisk 'clock'-modus (tidligere 'screen').
+Alle beregninger går via compile_schedule(cfg) (tolket én gang pr. revisjon).
 """
 from __future__ import annotations
-import time as _t
+import json
 from datetime import datetime, time as dtime, timedelta
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from .recurrence import Calendar
 from .settings import TZ
-_MONO0_NS = _t.monotonic_ns()
-_WALL0_MS = int(_t.time() * 1000)
+from .timesource import get_timesource
 def _now_ms() -> int:
-    return _WALL0_MS + (_t.monotonic_ns() - _MONO0_NS) // 1_000_000
+    """Veggklokke i ms: monoton mellom ankringer, slewet mot systemklokka (timesource.py)."""
+    return get_timesource().now_ms()
 def _parse_hhmm(hhmm: str) -> dtime:
     hh, mm = hhmm.strip().split(":", 1)
     return dtime(hour=int(hh), minute=int(mm), tzinfo=TZ)
@@ -19,112 +21,228 @@ def _ms_from_dt(dt: datetime) -> int:
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=TZ)
     return int(dt.astimezone(TZ).timestamp() * 1000)
-def _next_daily_target_with_overrun(
-    hhmm: str, now_dt: datetime, overrun_ms: int
-) -> int:
-    t = _parse_hhmm(hhmm)
-    today = now_dt.replace(hour=t.hour, minute=t.minute, second=0, microsecond=0)
-    if now_dt <= today:
-        return _ms_from_dt(today)
-    if (now_dt - today) <= timedelta(milliseconds=overrun_ms):
-        return _ms_from_dt(today)
-    return _ms_from_dt(today + timedelta(days=1))
+# ── kompilert plan ────────────────────────────────────────────────────────────
+_FAR_PAST = -(1 << 62)
+_FAR_FUTURE = 1 << 62
+class CompiledSchedule:
+    """
+    Én config-revisjon ferdig tolket: terskler som heltall, og mål + 'HH:MM' for
+    gjeldende vindu. Hvorfor: compute_tick parset daily_time/once_at, gjorde
+    TZ-konvertering og strftime på hvert kall; nå er en tick heltallssammenligninger.
+    Målet gjelder for lo < now <= hi (daily: fra forrige mål + overrun til dette
+    mål + overrun); utenfor vinduet regnes nytt vindu (én gang pr. døgn).
+    'calendar' bruker samme vindu mellom forekomstene fra recurrence.Calendar.
+    """
+    __slots__ = ("mode", "clock", "warn_ms", "alert_ms", "blink_ms", "overrun_ms", "_hm", "_cal", "_win")
+    def __init__(self, cfg: Dict[str, Any]) -> None:
+        mode = cfg.get("mode", "daily")
+        self.mode = mode
+        self.clock = mode == "clock"
+        self.warn_ms = int(cfg.get("warn_minutes", 4)) * 60_000
+        self.alert_ms = int(cfg.get("alert_minutes", 2)) * 60_000
+        self.blink_ms = int(cfg.get("blink_seconds", 10)) * 1000
+        self.overrun_ms = int(cfg.get("overrun_minutes", 1)) * 60_000
+        self._hm: Optional[Tuple[int, int]] = None
+        self._cal: Optional[Calendar] = None
+        fixed = 0
+        if mode == "daily":
+            hhmm = (cfg.get("daily_time") or "").strip()
+            if hhmm:
+                t = _parse_hhmm(hhmm)
+                self._hm = (t.hour, t.minute)
+        elif mode == "calendar":
+            self._cal = Calendar(cfg.get("calendar"))
+        elif mode == "once":
+            s = (cfg.get("once_at") or "").strip()
+            if s:
+                try:
+                    fixed = _ms_from_dt(datetime.fromisoformat(s))
+                except Exception:
+                    fixed = 0
+        elif mode == "duration":
+            start_ms = int(cfg.get("duration_started_ms") or 0)
+            mins = int(cfg.get("duration_minutes") or 0)
+            if start_ms > 0 and mins > 0:
+                fixed = start_ms + mins * 60_000
+        # (lo, hi, target_ms, target_hhmm); byttes atomisk som én tuple
+        self._win: Tuple[int, int, int, str] = (_FAR_PAST, _FAR_FUTURE, fixed, _target_hhmm(fixed))
+        if self._hm is not None or self._cal is not None:
+            self._win = (0, -1, 0, "")  # tomt vindu → regnes ved første kall
+    def _roll_calendar(self, now_ms: int) -> Tuple[int, int, int, str]:
+        cal = self._cal
+        target_ms = cal.next_at_or_after(now_ms - self.overrun_ms)  # type: ignore[union-attr]
+        if target_ms is None:
+            win = (now_ms - 1, now_ms + 3_600_000, 0, "")  # ingen forekomster: se igjen om en time
+        else:
+            prev_ms = cal.prev_before(target_ms)  # type: ignore[union-attr]
+            lo = prev_ms + self.overrun_ms if prev_ms is not None else _FAR_PAST
+            win = (lo, target_ms + self.overrun_ms, target_ms, _target_hhmm(target_ms))
+        self._win = win
+        return win
+    def _roll(self, now_ms: int) -> Tuple[int, int, int, str]:
+        if self._cal is not None:
+            return self._roll_calendar(now_ms)
+        hh, mm = self._hm  # type: ignore[misc]
+        now_dt = datetime.fromtimestamp(now_ms / 1000, tz=TZ)
+        today = now_dt.replace(hour=hh, minute=mm, second=0, microsecond=0)
+        target_dt = today if now_ms - _ms_from_dt(today) <= self.overrun_ms else today + timedelta(days=1)
+        target_ms = _ms_from_dt(target_dt)
+        prev_ms = _ms_from_dt(target_dt - timedelta(days=1))
+        win = (prev_ms + self.overrun_ms, target_ms + self.overrun_ms, target_ms, _target_hhmm(target_ms))
+        self._win = win
+        return win
+    def window(self, now_ms: int) -> Tuple[int, int, int, str]:
+        """(lo, hi, target_ms, target_hhmm) for vinduet now_ms ligger i; gyldig for lo < now_ms <= hi."""
+        win = self._win
+        if win[0] < now_ms <= win[1]:
+            return win
+        return self._roll(now_ms)
+    def target(self, now_ms: int) -> int:
+        return 0 if self.clock else self.window(now_ms)[2]
+    def schedule(self, now_ms: int) -> List[Tuple[int, str]]:
+        if self.clock:
+            return []
+        target_ms = self.window(now_ms)[2]
+        if target_ms <= 0:
+            return []
+        out = [
+            (target_ms - self.warn_ms, "warn"),
+            (target_ms - self.alert_ms, "alert"),
+            (target_ms - self.blink_ms, "blink"),
+            (target_ms, "target"),
+            (target_ms + self.overrun_ms + 1, "rollover" if self.mode in ("daily", "calendar") else "ended"),
+        ]
+        return sorted(b for b in out if b[0] > now_ms)
+    def tick(self, now_ms: int) -> Dict[str, Any]:
+        if self.clock:
+            return {
+                "now_ms": now_ms,
+                "target_ms": 0,
+                "target_hhmm": "",
+                "display_ms": 0,
+                "signed_display_ms": 0,
+                "state": "clock",
+                "mode": "clock",
+                "blink": False,
+                "warn_ms": 0,
+                "alert_ms": 0,
+                "overrun_ms": 0,
+            }
+        _lo, _hi, target_ms, hhmm = self.window(now_ms)
+        signed = target_ms - now_ms
+        blink = False
+        display_ms = 0
+        if target_ms <= 0:
+            state, phase = "idle", "ended"
+        elif signed > 0:
+            state = "countdown"
+            phase = "alert" if signed <= self.alert_ms else ("warn" if signed <= self.warn_ms else "normal")
+            blink = signed <= self.blink_ms
+            display_ms = signed
+        elif -signed <= self.overrun_ms:
+            state, phase = "overrun", "over"
+            display_ms = max(0, self.overrun_ms + signed)
+        else:
+            state, phase = "ended", "ended"
+        return {
+            "now_ms": now_ms,
+            "target_ms": target_ms,
+            "target_hhmm": hhmm,
+            "display_ms": display_ms,
+            "signed_display_ms": signed,
+            "state": state,
+            "mode": phase,
+            "blink": blink,
+            "warn_ms": self.warn_ms,
+            "alert_ms": self.alert_ms,
+            "overrun_ms": self.overrun_ms,
+        }
+# Feltene som bestemmer planen; samme verdier → samme kompilerte objekt
+SCHEDULE_KEYS: Tuple[str, ...] = (
+    "mode",
+    "daily_time",
+    "once_at",
+    "duration_started_ms",
+    "duration_minutes",
+    "warn_minutes",
+    "alert_minutes",
+    "blink_seconds",
+    "overrun_minutes",
+)
+_COMPILED: Dict[Tuple[Any, ...], CompiledSchedule] = {}
+_COMPILED_MAX = 64
+def compile_schedule(cfg: Dict[str, Any]) -> CompiledSchedule:
+    """
+    Kompilert plan for cfg, gjenbrukt så lenge SCHEDULE_KEYS er uendret.
+    Nøkkelen er verdiene (ikke etag), så også ad hoc-dicts (selftest, tester) treffer.
+    """
+    key = tuple(cfg.get(k) for k in SCHEDULE_KEYS)
+    if key[0] == "calendar":
+        key += (json.dumps(cfg.get("calendar"), sort_keys=True, default=str),)
+    try:
+        sc = _COMPILED.get(key)
+    except TypeError:  # uhashbar verdi (ugyldig config) → ingen cache
+        return CompiledSchedule(cfg)
+    if sc is None:
+        if len(_COMPILED) >= _COMPILED_MAX:
+            _COMPILED.clear()
+        sc = _COMPILED[key] = CompiledSchedule(cfg)
+    return sc
+# ── offentlige hjelpere ───────────────────────────────────────────────────────
 def compute_target_ms(cfg: Dict[str, Any], *, now_ms: Optional[int] = None) -> int:
     now_ms = now_ms if now_ms is not None else _now_ms()
-    mode = cfg.get("mode", "daily")
-    if mode == "clock":
-        return 0
-    if mode == "daily":
-        hhmm = (cfg.get("daily_time") or "").strip()
-        if not hhmm:
-            return 0
-        overrun_ms = int(cfg.get("overrun_minutes", 1)) * 60_000
-        return _next_daily_target_with_overrun(
-            hhmm, datetime.fromtimestamp(now_ms / 1000, tz=TZ), overrun_ms
-        )
-    if mode == "once":
-        s = (cfg.get("once_at") or "").strip()
-        if not s:
-            return 0
-        try:
-            dt = datetime.fromisoformat(s)
-            return _ms_from_dt(dt)
-        except Exception:
-            return 0
-    if mode == "duration":
-        start_ms = int(cfg.get("duration_started_ms") or 0)
-        mins = int(cfg.get("duration_minutes") or 0)
-        if start_ms <= 0 or mins <= 0:
-            return 0
-        return start_ms + mins * 60_000
-    return 0
-def compute_tick(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    return compile_schedule(cfg).target(now_ms)
+def compute_schedule(
+    cfg: Dict[str, Any], *, now_ms: Optional[int] = None
+) -> List[Tuple[int, str]]:
+    """
+    Kommende tilstandsgrenser som sortert [(ts_ms, navn)], kun ts > now_ms.
+    Navn: warn, alert, blink, target (→ overrun), ended (once/duration) eller
+    rollover (daily/calendar: nytt mål ved neste forekomst). ts er første ms der compute_tick gir
+    ny fase, så en vakt/klient kan sove til schedule[0] i stedet for å polle.
+    Tom liste: ingen grenser (clock, idle eller allerede ferdig).
+    """
+    now_ms = now_ms if now_ms is not None else _now_ms()
+    return compile_schedule(cfg).schedule(now_ms)
+def _target_hhmm(target_ms: int) -> str:
+    if target_ms <= 0:
+        return ""
+    try:
+        return datetime.fromtimestamp(target_ms / 1000, tz=TZ).strftime("%H:%M")
+    except Exception:
+        return ""
+def compute_sync(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parametre for klientside-tick (/sync): target, terskler og server-now.
+    Hvorfor: state/fase/blink er en ren funksjon av disse (samme regler som
+    compute_tick), så en skjerm kan regne lokalt og bare resynke ved
+    config-endring, rollover eller hvert N. minutt i stedet for 1 Hz /tick.
+    """
     now_ms = _now_ms()
-    mode_cfg = cfg.get("mode", "daily")
-    if mode_cfg == "clock":
+    sc = compile_schedule(cfg)
+    if sc.clock:
         return {
             "now_ms": now_ms,
+            "clock": True,
             "target_ms": 0,
             "target_hhmm": "",
-            "display_ms": 0,
-            "signed_display_ms": 0,
-            "state": "clock",
-            "mode": "clock",
-            "blink": False,
             "warn_ms": 0,
             "alert_ms": 0,
+            "blink_ms": 0,
             "overrun_ms": 0,
+            "schedule": [],
         }
-    target_ms = compute_target_ms(cfg, now_ms=now_ms)
-    warn_ms = int(cfg.get("warn_minutes", 4)) * 60_000
-    alert_ms = int(cfg.get("alert_minutes", 2)) * 60_000
-    blink_s = int(cfg.get("blink_seconds", 10))
-    signed = target_ms - now_ms
-    if target_ms <= 0:
-        state = "idle"
-        phase = "ended"
-        blink = False
-        display_ms = 0
-    else:
-        if signed > 0:
-            state = "countdown"
-            phase = (
-                "alert"
-                if signed <= alert_ms
-                else ("warn" if signed <= warn_ms else "normal")
-            )
-            blink = signed <= blink_s * 1000
-            display_ms = signed
-        else:
-            overrun_ms = int(cfg.get("overrun_minutes", 1)) * 60_000
-            if -signed <= overrun_ms:
-                state = "overrun"
-                phase = "over"
-                blink = False
-                display_ms = max(0, overrun_ms + signed)
-            else:
-                state = "ended"
-                phase = "ended"
-                blink = False
-                display_ms = 0
-    target_hhmm = ""
-    if target_ms > 0:
-        try:
-            target_hhmm = datetime.fromtimestamp(target_ms / 1000, tz=TZ).strftime(
-                "%H:%M"
-            )
-        except Exception:
-            target_hhmm = ""
+    _lo, _hi, target_ms, hhmm = sc.window(now_ms)
     return {
         "now_ms": now_ms,
+        "clock": False,
         "target_ms": target_ms,
-        "target_hhmm": target_hhmm,
-        "display_ms": int(max(0, display_ms)),
-        "signed_display_ms": int(signed),
-        "state": state,
-        "mode": phase,
-        "blink": bool(blink),
-        "warn_ms": warn_ms,
-        "alert_ms": alert_ms,
-        "overrun_ms": int(cfg.get("overrun_minutes", 1)) * 60_000,
+        "target_hhmm": hhmm,
+        "warn_ms": sc.warn_ms,
+        "alert_ms": sc.alert_ms,
+        "blink_ms": sc.blink_ms,
+        "overrun_ms": sc.overrun_ms,
+        "schedule": [list(b) for b in sc.schedule(now_ms)],
     }
+def compute_tick(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    return compile_schedule(cfg).tick(_now_ms())
@@ -0,0 +1,59 @@
+# File: app/displays.py
+"""
+Skjermprofiler: /?display=lobby viser felles config med profilens tema, overlays og
+meldinger lagt over (cfg['displays'][navn]), og eventuelt planen til en navngitt
+instans (profil.instance, se instances.py).
+Hvorfor: én server driver mange kiosker uten én prosess pr. skjerm.
+Sammenslått config caches pr. (profil, revisjon): et treff er ett dict-oppslag +
+storage.config_etag() (stat, ingen kopi), så /sync og /tick med display er O(1).
+Ukjent profil gir felles config (skjermen viser noe i stedet for å feile).
+Returnerte config-objekter deles mellom forespørsler og skal ikke muteres.
+"""
+from __future__ import annotations
+import threading
+from typing import Any, Dict, Optional, Tuple
+from .instances import DEFAULT_ID
+from .countdown import SCHEDULE_KEYS
+from .storage import config_etag, load_config_versioned, merge_profile
+__all__ = ["resolve_display", "display_etag"]
+_INHERITED = SCHEDULE_KEYS + ("calendar",)
+_lock = threading.Lock()
+# navn → (revisjon, sammenslått config, profil-etag)
+_CACHE: Dict[str, Tuple[str, Dict[str, Any], str]] = {}
+def display_etag(etag: str, name: str) -> str:
+    """Egen revisjon pr. profil, så ETag/304 og cfg_etag skiller skjermene."""
+    return f"{etag}.{name}"
+def _build(cfg: Dict[str, Any], etag: str, name: str) -> Tuple[str, Dict[str, Any], str]:
+    profile = (cfg.get("displays") or {}).get(name)
+    if not isinstance(profile, dict):
+        return etag, cfg, etag
+    merged = merge_profile(cfg, profile)
+    iid = profile.get("instance")
+    inst = (cfg.get("instances") or {}).get(iid) if iid and iid != DEFAULT_ID else None
+    if isinstance(inst, dict):
+        merged.update({k: v for k, v in inst.items() if k in _INHERITED})
+    merged["_display"] = name
+    return etag, merged, display_etag(etag, name)
+def resolve_display(
+    name: Optional[str], cfg: Optional[Dict[str, Any]] = None, etag: Optional[str] = None
+) -> Tuple[Dict[str, Any], str]:
+    """
+    (config, etag) for profilen. Uten navn: felles config. cfg/etag kan gis når
+    kalleren allerede har lastet dem; ellers sjekkes bare revisjonen ved treff.
+    """
+    if not name:
+        if cfg is None or etag is None:
+            return load_config_versioned()
+        return cfg, etag
+    cur = etag if etag is not None else config_etag()
+    hit = _CACHE.get(name)
+    if hit is not None and hit[0] == cur:
+        return hit[1], hit[2]
+    if cfg is None or etag is None:
+        cfg, cur = load_config_versioned()
+    entry = _build(cfg, cur, name)
+    with _lock:
+        if len(_CACHE) > 256:  # navn kommer fra URL-en; hold tabellen liten
+            _CACHE.clear()
+        _CACHE[name] = entry
+    return entry[1], entry[2]
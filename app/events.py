@@ -0,0 +1,99 @@
+# File: app/events.py
+"""
+Domenehendelser for /events (SSE): config-endringer og tilstandsoverganger.
+- 'config': sendes når replace_config har skrevet ny config (til alle workere).
+- 'state' : sendes når compute_tick går over i ny state/fase/blink eller nytt mål
+            (countdown→overrun→ended, normal→warn→alert).
+- 'picsum': ny Picsum-id etter auto-rotasjon (scheduler.PicsumRotation, alle workere).
+Overgangene oppdages av én vakt-tråd pr. worker som bare kjører så lenge noen
+abonnerer, og leveres kun lokalt (hver worker avleder dem selv). Vakta sover
+til neste grense fra compute_schedule (sendes på sekundet) og ser ellers bare
+etter ny config-revisjon (én stat() pr. sekund, eller straks ved lokal lagring).
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from . import countdown
+from .countdown import compute_schedule, compute_tick
+from .sse import publish, subscriber_count
+from .storage import load_config_versioned
+__all__ = [
+    "state_event",
+    "notify_config_written",
+    "notify_picsum_rotated",
+    "ensure_watcher",
+]
+_WATCH_INTERVAL_S = 0.2  # mens ingen abonnerer (venter på idle-grense)
+_CONFIG_POLL_S = 1.0  # hvorfor: skrivinger fra andre workere sees bare via stat()
+_IDLE_GRACE_S = 5.0  # hvorfor: ny klient registrerer køen først når strømmen starter
+_watch_lock = threading.Lock()
+_watch_thread: Optional[threading.Thread] = None
+_last_key: Optional[Tuple[Any, ...]] = None
+_wake = threading.Event()
+def _transition_key(ev: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (ev["state"], ev["mode"], ev["blink"], ev["target_ms"], ev["cfg_etag"])
+def state_event() -> Dict[str, Any]:
+    """Øyeblikksbilde av tick som 'state'-hendelse (samme felter som /tick)."""
+    cfg, etag = load_config_versioned()
+    return _state_event(cfg, etag)
+def _state_event(cfg: Dict[str, Any], etag: str) -> Dict[str, Any]:
+    t = compute_tick(cfg)
+    t["cfg_rev"] = int(cfg.get("_updated_at", 0))
+    t["cfg_etag"] = etag
+    return {"type": "state", **t}
+def notify_config_written(cfg: Dict[str, Any], etag: str) -> None:
+    publish(
+        {"type": "config", "rev": int(cfg.get("_updated_at", 0)), "etag": etag}
+    )
+    _wake.set()
+def notify_picsum_rotated(picsum_id: int, next_switch_ms: Optional[int]) -> None:
+    publish({"type": "picsum", "id": int(picsum_id), "next_switch_ms": next_switch_ms})
+def _watch_loop() -> None:
+    global _watch_thread, _last_key
+    idle_since: Optional[float] = None
+    schedule: List[Tuple[int, str]] = []
+    sched_etag: Optional[str] = None
+    while True:
+        wait_s = _WATCH_INTERVAL_S
+        if subscriber_count() == 0:
+            now = time.monotonic()
+            idle_since = idle_since or now
+            if now - idle_since >= _IDLE_GRACE_S:
+                with _watch_lock:
+                    if subscriber_count() == 0:
+                        _watch_thread = None
+                        _last_key = None
+                        return
+        else:
+            idle_since = None
+            try:
+                cfg, etag = load_config_versioned()
+                now_ms = countdown._now_ms()
+                if etag != sched_etag or (schedule and schedule[0][0] <= now_ms):
+                    ev = _state_event(cfg, etag)
+                    key = _transition_key(ev)
+                    if key != _last_key:
+                        if _last_key is not None:
+                            publish(ev, broadcast=False)
+                        _last_key = key
+                    schedule = compute_schedule(cfg, now_ms=ev["now_ms"])
+                    sched_etag = etag
+                wait_s = _CONFIG_POLL_S
+                if schedule:
+                    due_s = (schedule[0][0] - countdown._now_ms()) / 1000
+                    wait_s = min(wait_s, max(0.0, due_s))
+            except Exception:
+                sched_etag = None  # hvorfor: vakta skal aldri dø av en enkelt feil (f.eks. halvskrevet fil)
+        _wake.wait(wait_s)
+        _wake.clear()
+def ensure_watcher() -> None:
+    """Start vakt-tråden hvis den ikke allerede kjører i denne workeren."""
+    global _watch_thread
+    with _watch_lock:
+        if _watch_thread is not None and _watch_thread.is_alive():
+            return
+        _watch_thread = threading.Thread(
+            target=_watch_loop, name="countdown-events", daemon=True
+        )
+        _watch_thread.start()
@@ -0,0 +1,156 @@
+# File: app/imaging.py
+"""
+Ferdigrendrede bakgrunner: eksakt størrelse, gråtone, blur og tint bakt inn i én bitmap.
+Hvorfor: kiosken (WebKit på Pi-GPU) tegnet CSS-filter (dynamic blur_px opptil 80 px,
+tint-gradient over bildet) på nytt hver frame; et statisk bilde er nesten gratis.
+- render_image: bilde/Picsum → cover (JPEG) eller contain (PNG med gjennomsiktige kanter).
+- render_dynamic: de to radiale gradientene fra theme.background.dynamic, forhåndsblurret
+  (PNG med alfa). Klienten ber typisk om 1/4 oppløsning og skalerer opp; blur skjuler det.
+Resultatene caches i media.get_variant_cache() med nøkkel fra parametrene (og kildens
+mtime/størrelse), så samme oppsett rendres én gang.
+Pillow er valgfri: uten den gir *_variant ImagingUnavailable (/media/bg → 501) og
+klienten faller tilbake til CSS-filtrene.
+Rendring koster sekunder CPU og titalls MB på en Pi, så blur er begrenset til
+MAX_BLUR_PX, og bare én rendring kjører om gangen pr. prosess (RENDER_CONCURRENCY);
+samme nøkkel rendres én gang på tvers av workere (DiskLRU.produce).
+"""
+from __future__ import annotations
+import hashlib
+import io
+import json
+import math
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from .media import MediaError, get_variant_cache
+try:
+    from PIL import Image, ImageFilter, ImageOps
+except ImportError:  # pragma: no cover - Pillow er valgfri
+    Image = ImageFilter = ImageOps = None  # type: ignore[assignment]
+__all__ = [
+    "HAVE_PIL",
+    "ImagingUnavailable",
+    "Shape",
+    "parse_hex",
+    "render_image",
+    "render_dynamic",
+    "image_variant",
+    "dynamic_variant",
+]
+HAVE_PIL = Image is not None
+MAX_BLUR_PX = 40.0
+RENDER_CONCURRENCY = 1
+_render_slots = threading.BoundedSemaphore(RENDER_CONCURRENCY)
+_HEX_RE = re.compile(r"^#?([0-9a-fA-F]{6})$")
+# (rx_vmax, ry_vmax, pos_x_pct, pos_y_pct, stop_pct) – som dynamic.shapeN
+Shape = Tuple[float, float, float, float, float]
+class ImagingUnavailable(MediaError):
+    """Pillow er ikke installert."""
+def _require_pil() -> None:
+    if not HAVE_PIL:
+        raise ImagingUnavailable("Pillow er ikke installert")
+def parse_hex(value: Optional[str]) -> Optional[Tuple[int, int, int]]:
+    m = _HEX_RE.match((value or "").strip())
+    if not m:
+        return None
+    h = m.group(1)
+    return int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16)
+def _encode(img: "Image.Image", fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        img.convert("RGB").save(buf, "JPEG", quality=88, optimize=True, progressive=True)
+    else:
+        img.save(buf, "PNG", optimize=False, compress_level=6)
+    return buf.getvalue()
+def _blur_rgba(img: "Image.Image", radius: float) -> "Image.Image":
+    # Premultiplisert (RGBa), ellers blør fargen til gjennomsiktige piksler inn i kantene
+    return img.convert("RGBa").filter(ImageFilter.GaussianBlur(radius)).convert("RGBA")
+def render_image(
+    src: Path,
+    w: int,
+    h: int,
+    *,
+    fit: str = "cover",
+    grayscale: bool = False,
+    blur: float = 0.0,
+    tint: Optional[Tuple[int, int, int]] = None,
+    tint_opacity: float = 0.0,
+) -> Tuple[bytes, str]:
+    """Returnerer (bytes, 'jpg'|'png'). Samme resultat som CSS cover/contain + tint-lag."""
+    _require_pil()
+    with Image.open(src) as im:
+        im = ImageOps.exif_transpose(im)
+        im = im.convert("L").convert("RGB") if grayscale else im.convert("RGB")
+        if fit == "contain":
+            scale = min(w / im.width, h / im.height)
+            im = im.resize((max(1, round(im.width * scale)), max(1, round(im.height * scale))), Image.Resampling.LANCZOS)
+            canvas = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+            canvas.paste(im, ((w - im.width) // 2, (h - im.height) // 2))
+        else:
+            canvas = ImageOps.fit(im, (w, h), Image.Resampling.LANCZOS).convert("RGBA")
+    if blur > 0:
+        canvas = _blur_rgba(canvas, min(blur, MAX_BLUR_PX))
+    if tint is not None and tint_opacity > 0:
+        # Tint-laget dekker hele flaten, også tomme kanter ved contain (som CSS)
+        layer = Image.new("RGBA", (w, h), tint + (round(255 * min(tint_opacity, 1.0)),))
+        canvas.alpha_composite(layer)
+    if fit == "contain":
+        return _encode(canvas, "PNG"), "png"
+    return _encode(canvas, "JPEG"), "jpg"
+def _radial_layer(w: int, h: int, color: Tuple[int, int, int], shape: Shape) -> "Image.Image":
+    # CSS: radial-gradient(RXvmax RYvmax at X% Y%, color 0%, transparent STOP%)
+    rx, ry, px, py, stop = shape
+    vmax = max(w, h) / 100.0
+    ew = max(1, round(2 * rx * vmax))
+    eh = max(1, round(2 * ry * vmax))
+    s = max(stop, 1.0) / 100.0
+    # radial_gradient: 0 i sentrum, 255 ved hjørnene (avstand √2 · radius)
+    lut = [round(255 * max(0.0, 1.0 - (v / 255.0 * math.sqrt(2)) / s)) for v in range(256)]
+    mask = Image.radial_gradient("L").point(lut).resize((ew, eh), Image.Resampling.BILINEAR)
+    blob = Image.new("RGBA", (ew, eh), color + (255,))
+    blob.putalpha(mask)
+    layer = Image.new("RGBA", (w, h), color + (0,))
+    layer.paste(blob, (round(px / 100.0 * w - ew / 2), round(py / 100.0 * h - eh / 2)))
+    return layer
+def render_dynamic(
+    w: int,
+    h: int,
+    *,
+    color_from: Tuple[int, int, int],
+    color_to: Tuple[int, int, int],
+    shape1: Shape,
+    shape2: Shape,
+    blur: float = 0.0,
+) -> bytes:
+    """Dynamic-laget som PNG med alfa; første gradient ligger øverst (CSS-rekkefølge)."""
+    _require_pil()
+    canvas = _radial_layer(w, h, color_to, shape2)
+    canvas.alpha_composite(_radial_layer(w, h, color_from, shape1))
+    if blur > 0:
+        canvas = _blur_rgba(canvas, min(blur, MAX_BLUR_PX))
+    return _encode(canvas, "PNG")
+def _limited(fn, *args: Any, **kwargs: Any) -> Any:
+    with _render_slots:
+        return fn(*args, **kwargs)
+def _key(kind: str, params: Dict[str, Any]) -> str:
+    raw = json.dumps([kind, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=10).hexdigest()
+def image_variant(src: Path, w: int, h: int, *, src_key: Optional[str] = None, **opts: Any) -> Path:
+    """
+    Cachet render_image. Kilden identifiseres med src_key (uforanderlige filer, f.eks.
+    Picsum-cachen der mtime flyttes ved bruk) eller ellers sti + mtime + størrelse.
+    """
+    _require_pil()
+    if src_key is None:
+        st = src.stat()
+        src_key = f"{src}:{st.st_mtime_ns}:{st.st_size}"
+    ext = "png" if opts.get("fit") == "contain" else "jpg"
+    params = {"src": src_key, "w": w, "h": h, **opts}
+    name = f"img_{w}x{h}_{_key('image', params)}.{ext}"
+    return get_variant_cache().produce(name, lambda: _limited(render_image, src, w, h, **opts)[0])
+def dynamic_variant(w: int, h: int, **opts: Any) -> Path:
+    """Cachet render_dynamic."""
+    _require_pil()
+    name = f"dyn_{w}x{h}_{_key('dynamic', {'w': w, 'h': h, **opts})}.png"
+    return get_variant_cache().produce(name, lambda: _limited(render_dynamic, w, h, **opts))
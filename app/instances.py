@@ -0,0 +1,59 @@
+# File: app/instances.py
+"""
+Navngitte nedtellinger (cfg['instances']) evaluert samlet.
+- Hver instans arver planfeltene (countdown.SCHEDULE_KEYS + calendar) fra roten og
+  overstyrer det den selv har. Id 'default' er roten selv (med mindre den er definert).
+- Planene kompileres én gang pr. config-revisjon (etag) og holdes i ett oppslag;
+  compute_ticks bruker én felles now_ms og er ellers bare heltallssammenligninger.
+Hvorfor: én Pi styrer mange rom; /tick?ids=a,b,c leser config én gang (cachet)
+og svarer for alle, uten fil-lesing eller parsing pr. instans.
+"""
+from __future__ import annotations
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from . import countdown
+from .countdown import SCHEDULE_KEYS, CompiledSchedule, compile_schedule
+__all__ = ["DEFAULT_ID", "instance_plans", "compute_ticks"]
+DEFAULT_ID = "default"
+_INHERITED = SCHEDULE_KEYS + ("calendar",)
+_lock = threading.Lock()
+_plans: Tuple[Optional[str], Dict[str, CompiledSchedule]] = (None, {})
+def _compile(cfg: Dict[str, Any]) -> Dict[str, CompiledSchedule]:
+    base = {k: cfg.get(k) for k in _INHERITED}
+    plans: Dict[str, CompiledSchedule] = {DEFAULT_ID: compile_schedule(cfg)}
+    for iid, inst in (cfg.get("instances") or {}).items():
+        if isinstance(inst, dict):
+            plans[iid] = CompiledSchedule({**base, **{k: v for k, v in inst.items() if k in _INHERITED}})
+    return plans
+def instance_plans(cfg: Dict[str, Any], etag: str) -> Dict[str, CompiledSchedule]:
+    """Kompilerte planer for alle instanser i denne revisjonen (bygges ved ny etag)."""
+    global _plans
+    cached_etag, plans = _plans
+    if cached_etag == etag:
+        return plans
+    with _lock:
+        if _plans[0] != etag:
+            _plans = (etag, _compile(cfg))
+        return _plans[1]
+def compute_ticks(
+    cfg: Dict[str, Any],
+    etag: str,
+    ids: Optional[Iterable[str]] = None,
+    *,
+    now_ms: Optional[int] = None,
+) -> Tuple[int, Dict[str, Dict[str, Any]], List[str]]:
+    """
+    Tick for hver id (None = alle) med felles now_ms.
+    Returnerer (now_ms, {id: tick}, ukjente_ids).
+    """
+    now_ms = now_ms if now_ms is not None else countdown._now_ms()
+    plans = instance_plans(cfg, etag)
+    ticks: Dict[str, Dict[str, Any]] = {}
+    missing: List[str] = []
+    for iid in plans if ids is None else ids:
+        plan = plans.get(iid)
+        if plan is None:
+            missing.append(iid)
+        else:
+            ticks[iid] = plan.tick(now_ms)
+    return now_ms, ticks, missing
@@ -0,0 +1,349 @@
+# File: app/media.py
+"""
+Lokal bildecache for Picsum-bakgrunner (brukes av /media/picsum/<id>/<w>x<h>).
+- Disk-LRU med størrelsestak: én fil pr. (id, størrelse, grayscale, blur);
+  mtime oppdateres ved treff, eldste filer slettes når taket passeres.
+- Single-flight pr. nøkkel: samtidige forespørsler etter samme bilde gir én
+  nedlasting.
+- Forhåndshenting: neste oppføringer i picsum_catalog hentes i bakgrunnen i samme
+  størrelse, så rotasjon er momentan og virker offline etter oppvarming.
+- Offline: finnes ikke eksakt størrelse og upstream feiler, brukes største
+  lagrede variant av samme bilde.
+- DiskLRU er felles for Picsum-originaler og ferdigrendrede bakgrunner (app.imaging).
+  COUNTDOWN_MEDIA_MAX_MB er ett tak for begge: originalene får 2/3, variantene 1/3
+  (VARIANTS_SHARE), så cachen samlet aldri bruker mer enn taket på SD-kortet.
+- Størrelser rundes av med snap_size() til et lite sett skjermstørrelser, og taket
+  håndheves på tvers av workere: totalen skannes under flock på <katalog>/.lock før
+  det ryddes, og samme nøkkel lages av én prosess om gangen (.locks/<spor>).
+  Hvorfor: rutene er åpne; uten dette ga hver ny w×h en ny nedlasting (opptil 15 MB)
+  og en ny fil, og to workere med hver sin total kunne sammen passere taket.
+Miljø: COUNTDOWN_PICSUM_BASE (default https://picsum.photos),
+COUNTDOWN_MEDIA_DIR (default <prosjekt>/.cache/media), COUNTDOWN_MEDIA_MAX_MB (default 200).
+"""
+from __future__ import annotations
+import hashlib
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import urllib.request
+from pathlib import Path
+from queue import Empty, Queue
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from .settings import PROJECT_ROOT
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows o.l.: bare trådlås
+    fcntl = None  # type: ignore[assignment]
+__all__ = [
+    "DiskLRU",
+    "PicsumCache",
+    "MediaError",
+    "snap_size",
+    "next_catalog_ids",
+    "get_cache",
+    "get_variant_cache",
+    "set_cache",
+]
+log = logging.getLogger(__name__)
+MAX_SIDE = 5000
+MAX_DOWNLOAD_BYTES = 15 * 1024 * 1024
+FETCH_TIMEOUT_S = 15.0
+# Lang side rundes opp til nærmeste trinn (toppen er 4K; større skjermer skalerer opp)
+SIZE_STEPS = (256, 384, 512, 640, 800, 1024, 1280, 1600, 1920, 2560, 3840)
+# Vanlige sideforhold (lang/kort); kort side følger av nærmeste forhold
+ASPECTS = (1.0, 5 / 4, 4 / 3, 3 / 2, 16 / 10, 16 / 9, 21 / 9)
+_LOCK_SLOTS = 64
+# Andel av COUNTDOWN_MEDIA_MAX_MB til ferdigrendrede varianter; resten til Picsum-originaler
+VARIANTS_SHARE = 1 / 3
+_NAME_RE = re.compile(r"^(\d+)_(\d+)x(\d+)(_g)?(?:_b(\d+))?\.jpg$")
+class MediaError(RuntimeError):
+    """Bildet kunne ikke hentes (og finnes ikke i cachen)."""
+def snap_size(w: int, h: int) -> Tuple[int, int]:
+    """
+    (w, h) → nærmeste kanoniske størrelse: lang side opp til SIZE_STEPS, forholdet til
+    nærmeste i ASPECTS. Gir ≤ 143 størrelser totalt, så cachen får treff og åpne ruter
+    kan ikke tvinge frem en ny nedlasting/rendring pr. piksel.
+    """
+    w, h = max(1, int(w)), max(1, int(h))
+    long_side, short_side = max(w, h), min(w, h)
+    ratio = long_side / short_side
+    aspect = min(ASPECTS, key=lambda a: abs(math.log(ratio / a)))
+    step = next((s for s in SIZE_STEPS if s >= long_side), SIZE_STEPS[-1])
+    other = max(1, round(step / aspect))
+    return (step, other) if w >= h else (other, step)
+class _FileLock:
+    """Eksklusiv flock på path (ingen lås der fcntl mangler)."""
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._fd: Optional[int] = None
+    def __enter__(self) -> "_FileLock":
+        if fcntl is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+    def __exit__(self, *exc) -> None:
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+class DiskLRU:
+    """
+    Filer i én katalog med størrelsestak: mtime = sist brukt, eldste slettes først.
+    Produksjon av en fil er single-flight pr. navn (samtidige kall venter på første).
+    """
+    def __init__(self, root: Path, *, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+    def _path(self, name: str) -> Path:
+        return self.root / name
+    def _is_entry(self, name: str) -> bool:
+        return not name.startswith(".")
+    def _scan_total(self) -> int:
+        total = 0
+        try:
+            for entry in os.scandir(self.root):
+                if entry.is_file() and self._is_entry(entry.name):
+                    total += entry.stat().st_size
+        except FileNotFoundError:
+            pass
+        return total
+    def _key_lock(self, name: str) -> _FileLock:
+        # Fast antall låsefiler; kollisjoner betyr bare at to nøkler venter på hverandre
+        slot = int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=2).digest(), "big") % _LOCK_SLOTS
+        return _FileLock(self.root / ".locks" / str(slot))
+    def _evict(self, keep: str) -> None:
+        # Hvorfor skanning under flock: andre workere skriver i samme katalog, så en
+        # total holdt i denne prosessen ville ikke se filene deres
+        with self._lock, _FileLock(self.root / ".lock"):
+            total = self._scan_total()
+            if total <= self.max_bytes:
+                return
+            entries = []
+            for e in os.scandir(self.root):
+                if e.is_file() and self._is_entry(e.name) and e.name != keep:
+                    st = e.stat()
+                    entries.append((st.st_mtime_ns, e.name, st.st_size))
+            entries.sort()
+            for _mtime, name, size in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(self._path(name))
+                except OSError:
+                    continue
+                total -= size
+                self.stats["evictions"] += 1
+    def _store(self, name: str, data: bytes) -> Path:
+        """Skriv atomisk (tmp → replace) og rydd over taket."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        dest = self._path(name)
+        fd, tmp = tempfile.mkstemp(prefix=".dl.", dir=str(self.root))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, dest)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        self._evict(keep=name)
+        return dest
+    def lookup(self, name: str) -> Optional[Path]:
+        """Sti hvis filen finnes (og merk den som sist brukt), ellers None."""
+        path = self._path(name)
+        if not path.exists():
+            return None
+        try:
+            os.utime(path)  # LRU: sist brukt
+        except OSError:
+            pass
+        self.stats["hits"] += 1
+        return path
+    def produce(self, name: str, make: Callable[[], bytes], *, timeout: float = FETCH_TIMEOUT_S + 1) -> Path:
+        """Sti til name; lages med make() ved bom. Feil fra make() sendes videre."""
+        while True:
+            path = self.lookup(name)
+            if path is not None:
+                return path
+            with self._lock:
+                ev = self._inflight.get(name)
+                leader = ev is None
+                if leader:
+                    ev = self._inflight[name] = threading.Event()
+            if not leader:
+                ev.wait(timeout)
+                if self._path(name).exists():
+                    continue
+                raise MediaError("produksjon av bildet feilet")
+            try:
+                with self._key_lock(name):
+                    path = self.lookup(name)  # en annen worker kan ha laget den mens vi ventet
+                    if path is not None:
+                        return path
+                    self.stats["misses"] += 1
+                    return self._store(name, make())
+            finally:
+                with self._lock:
+                    self._inflight.pop(name, None)
+                ev.set()
+class PicsumCache(DiskLRU):
+    def __init__(self, root: Path, *, max_bytes: int, base_url: str) -> None:
+        super().__init__(root, max_bytes=max_bytes)
+        self.base_url = base_url.rstrip("/")
+        self._prefetch_q: "Queue[Tuple[int, int, int, bool, int]]" = Queue(maxsize=64)
+        self._prefetch_thread: Optional[threading.Thread] = None
+        self.stats.update({"fetches": 0, "fallbacks": 0})
+    @staticmethod
+    def _name(pid: int, w: int, h: int, grayscale: bool, blur: int) -> str:
+        return f"{pid}_{w}x{h}{'_g' if grayscale else ''}{f'_b{blur}' if blur else ''}.jpg"
+    def _url(self, pid: int, w: int, h: int, grayscale: bool, blur: int) -> str:
+        params = []
+        if grayscale:
+            params.append("grayscale")
+        if blur:
+            params.append(f"blur={blur}")
+        q = f"?{'&'.join(params)}" if params else ""
+        return f"{self.base_url}/id/{pid}/{w}/{h}{q}"
+    def _download(self, url: str) -> bytes:
+        self.stats["fetches"] += 1
+        req = urllib.request.Request(url, headers={"User-Agent": "countdown-media/1"})
+        with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT_S) as resp:
+            ctype = resp.headers.get("Content-Type", "")
+            if not ctype.startswith("image/"):
+                raise MediaError(f"uventet innholdstype {ctype!r}")
+            data = resp.read(MAX_DOWNLOAD_BYTES + 1)
+        if len(data) > MAX_DOWNLOAD_BYTES:
+            raise MediaError("bildet er for stort")
+        return data
+    def _fallback(self, pid: int, grayscale: bool, blur: int) -> Optional[Path]:
+        best: Optional[Tuple[int, str]] = None
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return None
+        for name in names:
+            m = _NAME_RE.match(name)
+            if not m or int(m.group(1)) != pid:
+                continue
+            if bool(m.group(4)) != grayscale or int(m.group(5) or 0) != blur:
+                continue
+            area = int(m.group(2)) * int(m.group(3))
+            if best is None or area > best[0]:
+                best = (area, name)
+        return self._path(best[1]) if best else None
+    def get(self, pid: int, w: int, h: int, *, grayscale: bool = False, blur: int = 0) -> Path:
+        """Sti til bildet på disk; henter det ved behov. MediaError hvis umulig."""
+        if not (0 < pid and 0 < w <= MAX_SIDE and 0 < h <= MAX_SIDE and 0 <= blur <= 10):
+            raise ValueError("ugyldig bilde-størrelse/parametre")
+        url = self._url(pid, w, h, grayscale, blur)
+        try:
+            return self.produce(self._name(pid, w, h, grayscale, blur), lambda: self._download(url))
+        except Exception as e:
+            fb = self._fallback(pid, grayscale, blur)
+            if fb is not None:
+                self.stats["fallbacks"] += 1
+                return fb
+            if isinstance(e, MediaError):
+                raise
+            raise MediaError(str(e)) from e
+    # --- forhåndshenting -------------------------------------------------------
+    def prefetch(self, ids: Iterable[int], w: int, h: int, *, grayscale: bool = False, blur: int = 0) -> None:
+        """Legg manglende bilder i kø for henting i bakgrunnen (dropper ved full kø)."""
+        for pid in ids:
+            if self._path(self._name(pid, w, h, grayscale, blur)).exists():
+                continue
+            try:
+                self._prefetch_q.put_nowait((pid, w, h, grayscale, blur))
+            except Exception:
+                break
+        self._ensure_prefetcher()
+    def _ensure_prefetcher(self) -> None:
+        with self._lock:
+            if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+                return
+            self._prefetch_thread = threading.Thread(
+                target=self._prefetch_loop, name="countdown-media-prefetch", daemon=True
+            )
+            self._prefetch_thread.start()
+    def _prefetch_loop(self) -> None:
+        while True:
+            try:
+                pid, w, h, g, b = self._prefetch_q.get(timeout=30)
+            except Empty:
+                return  # ledig: la tråden dø, startes igjen ved neste prefetch()
+            try:
+                self.get(pid, w, h, grayscale=g, blur=b)
+            except Exception:
+                log.debug("prefetch av picsum %s feilet", pid, exc_info=True)
+            finally:
+                self._prefetch_q.task_done()
+    def wait_prefetch(self, timeout: float = 10.0) -> bool:
+        """Vent til prefetch-køen er tom (tester/verktøy)."""
+        done = threading.Event()
+        def _join() -> None:
+            self._prefetch_q.join()
+            done.set()
+        threading.Thread(target=_join, daemon=True).start()
+        return done.wait(timeout)
+def next_catalog_ids(catalog: List[int], current: int, n: int) -> List[int]:
+    """De n neste id-ene etter current i katalogrekkefølge (rundt), uten current."""
+    if not catalog:
+        return []
+    try:
+        start = catalog.index(current) + 1
+    except ValueError:
+        start = 0
+    out: List[int] = []
+    for i in range(len(catalog)):
+        pid = catalog[(start + i) % len(catalog)]
+        if pid != current and pid not in out:
+            out.append(pid)
+        if len(out) >= n:
+            break
+    return out
+_cache_lock = threading.Lock()
+_cache: Optional[PicsumCache] = None
+_variants: Optional[DiskLRU] = None
+def _media_root() -> Path:
+    return Path((os.environ.get("COUNTDOWN_MEDIA_DIR") or "").strip() or str(PROJECT_ROOT / ".cache" / "media"))
+def _max_bytes() -> int:
+    try:
+        max_mb = float(os.environ.get("COUNTDOWN_MEDIA_MAX_MB") or 200)
+    except ValueError:
+        max_mb = 200.0
+    return int(max_mb * 1024 * 1024)
+def _budgets() -> Tuple[int, int]:
+    """(originaler, varianter) i bytes; summen er aldri over COUNTDOWN_MEDIA_MAX_MB."""
+    total = _max_bytes()
+    variants = int(total * VARIANTS_SHARE)
+    return total - variants, variants
+def _default_cache() -> PicsumCache:
+    base = (os.environ.get("COUNTDOWN_PICSUM_BASE") or "").strip() or "https://picsum.photos"
+    return PicsumCache(_media_root() / "picsum", max_bytes=_budgets()[0], base_url=base)
+def get_cache() -> PicsumCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = _default_cache()
+        return _cache
+def get_variant_cache() -> DiskLRU:
+    """Ferdigrendrede bakgrunner (app.imaging); VARIANTS_SHARE av det felles taket."""
+    global _variants
+    with _cache_lock:
+        if _variants is None:
+            _variants = DiskLRU(_media_root() / "variants", max_bytes=_budgets()[1])
+        return _variants
+def set_cache(cache: Optional[PicsumCache], variants: Optional[DiskLRU] = None) -> None:
+    """Bytt cacher (tester); None → bygges på nytt fra miljøet ved neste bruk."""
+    global _cache, _variants
+    with _cache_lock:
+        _cache = cache
+        _variants = variants
@@ -0,0 +1,319 @@
+# File: app/metrics.py
+"""
+Prometheus-lignende metrikker: tellere og histogrammer med faste bøtter, eksportert
+som tekst (exposition format 0.0.4) på /metrics.
+- Registrering er låsefri: hver tråd skriver i sin egen shard (dict → liste med tall),
+  og render() summerer shardene. Bare første registrering i en tråd tar en lås.
+  Hvorfor: /tick og /sync kan komme i hundretall pr. sekund; en felles lås ville bli
+  flaskehalsen den skal måle.
+- Shards fra avsluttede tråder slås inn i en felles rest ved eksport (ingen lekkasje
+  når serveren bytter tråder).
+- init_app() måler alle ruter (rute-mal, ikke rå sti, så kardinaliteten holdes lav).
+- Flere workere (gunicorn --workers 2): hver prosess skriver summene sine til
+  <katalog>/<pid>.json hvert SHARE_S og ved hver skraping, og render() summerer alle
+  filene under flock. Filer fra døde workere slås inn i retired.json, så tellerne
+  aldri går ned uansett hvilken worker skrapen treffer. Andre workeres tall er
+  høyst SHARE_S gamle. Katalog: COUNTDOWN_METRICS_DIR, ellers
+  settings.private_run_dir("countdown-metrics"); COUNTDOWN_METRICS_SHARED=0 slår
+  delingen av (bare egen prosess).
+Lesingen er ikke atomisk på tvers av shards; et skrape-øyeblikk kan mangle en
+observasjon som er underveis, men ingenting går tapt.
+"""
+from __future__ import annotations
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .settings import private_run_dir
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - uten fcntl: ingen deling mellom prosesser
+    fcntl = None  # type: ignore[assignment]
+__all__ = [
+    "BUCKETS",
+    "Counter",
+    "Histogram",
+    "counter",
+    "histogram",
+    "render",
+    "reset",
+    "share_dir",
+    "init_app",
+    "CONTENT_TYPE",
+]
+log = logging.getLogger(__name__)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SHARE_S = 5.0
+_PID_FILE_RE = re.compile(r"^(\d+)\.json$")
+_RETIRED = "retired.json"
+# Sekunder; dekker µs-treff i cachen opp til trege subprosesser
+BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+_NB = len(BUCKETS)
+Key = Tuple[str, Tuple[str, ...]]
+class _Shard:
+    __slots__ = ("thread", "values")
+    def __init__(self, thread: Optional[threading.Thread]) -> None:
+        self.thread = thread
+        # tellere: [verdi]; histogram: [bøtte 0..n-1, +Inf, sum]
+        self.values: Dict[Key, List[float]] = {}
+_local = threading.local()
+_shards_lock = threading.Lock()
+_shards: List[_Shard] = []
+_retired = _Shard(None)
+_families: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {}  # navn → (type, hjelp, etiketter)
+def _shard() -> _Shard:
+    sh = getattr(_local, "shard", None)
+    if sh is None:
+        sh = _Shard(threading.current_thread())
+        with _shards_lock:
+            _shards.append(sh)
+        _local.shard = sh
+    return sh
+class Counter:
+    __slots__ = ("name",)
+    def __init__(self, name: str) -> None:
+        self.name = name
+    def inc(self, *labels: str, n: float = 1) -> None:
+        vals = _shard().values
+        key = (self.name, labels)
+        cell = vals.get(key)
+        if cell is None:
+            cell = vals[key] = [0]
+        cell[0] += n
+class Histogram:
+    __slots__ = ("name",)
+    def __init__(self, name: str) -> None:
+        self.name = name
+    def observe(self, seconds: float, *labels: str) -> None:
+        vals = _shard().values
+        key = (self.name, labels)
+        cell = vals.get(key)
+        if cell is None:
+            cell = vals[key] = [0] * (_NB + 1) + [0.0]
+        cell[bisect_left(BUCKETS, seconds)] += 1
+        cell[-1] += seconds
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+def _register(name: str, kind: str, help_text: str, labels: Tuple[str, ...]) -> None:
+    prev = _families.get(name)
+    if prev is not None and prev[0] != kind:
+        raise ValueError(f"metrikk {name} finnes allerede som {prev[0]}")
+    _families[name] = (kind, help_text, tuple(labels))
+def counter(name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+    _register(name, "counter", help_text, labels)
+    return Counter(name)
+def histogram(name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Histogram:
+    _register(name, "histogram", help_text, labels)
+    return Histogram(name)
+def _merge_into(dst: Dict[Key, List[float]], src: Dict[Key, List[float]]) -> None:
+    for key, cell in list(src.items()):
+        cur = dst.get(key)
+        if cur is None:
+            dst[key] = list(cell)
+        else:
+            for i, v in enumerate(cell):
+                cur[i] += v
+def _collect() -> Dict[Key, List[float]]:
+    with _shards_lock:
+        dead = [sh for sh in _shards if sh.thread is not None and not sh.thread.is_alive()]
+        for sh in dead:
+            _merge_into(_retired.values, sh.values)
+            _shards.remove(sh)
+        live = list(_shards)
+        total: Dict[Key, List[float]] = {k: list(v) for k, v in _retired.values.items()}
+    for sh in live:
+        _merge_into(total, sh.values)
+    return total
+# ── deling mellom workere ─────────────────────────────────────────────────────
+_dump_lock = threading.Lock()  # collect+skriv i én operasjon: en eldre dump overskriver aldri en nyere
+_sharer = {"pid": 0}
+def share_dir() -> Optional[str]:
+    """Felles katalog for workernes summer, eller None når deling er av."""
+    if fcntl is None or (os.environ.get("COUNTDOWN_METRICS_SHARED") or "").strip() == "0":
+        return None
+    explicit = (os.environ.get("COUNTDOWN_METRICS_DIR") or "").strip()
+    if explicit:
+        return explicit
+    return private_run_dir("countdown-metrics")
+def _write_values(path: str, data: Dict[Key, List[float]]) -> None:
+    payload = json.dumps([[n, list(lbl), cell] for (n, lbl), cell in data.items()], separators=(",", ":"))
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+def _read_values(path: str) -> Dict[Key, List[float]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return {(n, tuple(lbl)): cell for n, lbl, cell in json.load(f)}
+def _dump_own(dirpath: str) -> Dict[Key, List[float]]:
+    with _dump_lock:
+        data = _collect()
+        os.makedirs(dirpath, mode=0o700, exist_ok=True)
+        _write_values(os.path.join(dirpath, f"{os.getpid()}.json"), data)
+    return data
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # finnes, men tilhører en annen bruker
+    return True
+class _DirLock:
+    def __init__(self, dirpath: str) -> None:
+        self.path = os.path.join(dirpath, ".lock")
+        self._fd: Optional[int] = None
+    def __enter__(self) -> "_DirLock":
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+    def __exit__(self, *exc: Any) -> None:
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+def _collect_shared(dirpath: str) -> Dict[Key, List[float]]:
+    """Summer for alle workere i dirpath (egen prosess skrives først, så tallene er ferske)."""
+    own_pid = os.getpid()
+    os.makedirs(dirpath, mode=0o700, exist_ok=True)
+    with _DirLock(dirpath):
+        total = {k: list(v) for k, v in _dump_own(dirpath).items()}
+        retired_path = os.path.join(dirpath, _RETIRED)
+        try:
+            retired = _read_values(retired_path)
+        except (OSError, ValueError):
+            retired = {}
+        folded = False
+        for name in os.listdir(dirpath):
+            m = _PID_FILE_RE.match(name)
+            if not m or int(m.group(1)) == own_pid:
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                data = _read_values(path)
+            except (OSError, ValueError):
+                continue
+            if _pid_alive(int(m.group(1))):
+                _merge_into(total, data)
+            else:
+                _merge_into(retired, data)
+                os.unlink(path)
+                folded = True
+        if folded:
+            _write_values(retired_path, retired)
+        _merge_into(total, retired)
+    return total
+def _share_loop(pid: int, dirpath: str) -> None:
+    while _sharer["pid"] == pid:
+        time.sleep(SHARE_S)
+        try:
+            _dump_own(dirpath)
+        except OSError:
+            log.debug("metrikker: kunne ikke skrive %s", dirpath, exc_info=True)
+def _ensure_sharer() -> None:
+    """Start skrivetråden i denne prosessen (én gang pr. pid; tråder overlever ikke fork)."""
+    pid = os.getpid()
+    if _sharer["pid"] == pid:
+        return
+    dirpath = share_dir()
+    with _shards_lock:
+        if _sharer["pid"] == pid:
+            return
+        _sharer["pid"] = pid
+    if dirpath is None:
+        return
+    threading.Thread(target=_share_loop, args=(pid, dirpath), name="countdown-metrics-share", daemon=True).start()
+    # Siste tall før prosessen avslutter (ellers mister en restartet worker opptil SHARE_S)
+    atexit.register(lambda: _dump_own(dirpath) if os.getpid() == pid else None)
+def _esc(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+_LE = tuple('le="' + _num(b) + '"' for b in BUCKETS) + ('le="+Inf"',)
+def render() -> str:
+    """Alle metrikker i Prometheus' tekstformat (summert over workere når deling er på)."""
+    dirpath = share_dir()
+    data: Optional[Dict[Key, List[float]]] = None
+    if dirpath is not None:
+        try:
+            data = _collect_shared(dirpath)
+        except OSError:
+            log.warning("metrikker: deling via %s feilet – bare denne workeren", dirpath, exc_info=True)
+    if data is None:
+        data = _collect()
+    by_name: Dict[str, List[Tuple[Tuple[str, ...], List[float]]]] = {}
+    for (name, labels), cell in data.items():
+        by_name.setdefault(name, []).append((labels, cell))
+    out: List[str] = []
+    for name in sorted(_families):
+        kind, help_text, label_names = _families[name]
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        for labels, cell in sorted(by_name.get(name, [])):
+            if kind == "counter":
+                out.append(f"{name}{_labels(label_names, labels)} {_num(cell[0])}")
+                continue
+            acc = 0
+            for le, n in zip(_LE, cell[: _NB + 1]):
+                acc += n
+                out.append(f"{name}_bucket{_labels(label_names, labels, le)} {_num(acc)}")
+            out.append(f"{name}_sum{_labels(label_names, labels)} {_num(cell[-1])}")
+            out.append(f"{name}_count{_labels(label_names, labels)} {_num(acc)}")
+    return "\n".join(out) + "\n"
+def reset() -> None:
+    """Nullstill alle målinger (tester)."""
+    with _shards_lock:
+        for sh in _shards:
+            sh.values.clear()
+        _retired.values.clear()
+# ── faste metrikker ───────────────────────────────────────────────────────────
+HTTP_REQUESTS = counter(
+    "countdown_http_requests_total", "HTTP-forespørsler pr. rute, metode og status.", ("route", "method", "status")
+)
+HTTP_LATENCY = histogram(
+    "countdown_http_request_duration_seconds", "Tid i Flask pr. rute (uten strømmet body).", ("route", "method")
+)
+STORAGE_LATENCY = histogram(
+    "countdown_storage_duration_seconds", "Tid i storage-operasjoner (load_config, atomic_write, state_append).", ("op",)
+)
+SUBPROCESS_LATENCY = histogram(
+    "countdown_subprocess_duration_seconds", "Varighet for subprosesser fra API/sysinfo/ntp.", ("cmd",)
+)
+SUBPROCESS_FAILURES = counter(
+    "countdown_subprocess_failures_total", "Subprosesser som feilet (rc != 0 eller unntak).", ("cmd",)
+)
+def init_app(app: Any) -> None:
+    """Mål alle Flask-ruter (før/etter-kroker)."""
+    from flask import g, request
+    @app.before_request
+    def _metrics_start() -> None:
+        g._metrics_t0 = time.perf_counter()
+        _ensure_sharer()
+    @app.after_request
+    def _metrics_record(resp):
+        t0 = getattr(g, "_metrics_t0", None)
+        if t0 is not None:
+            rule = request.url_rule
+            route = rule.rule if rule is not None else "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - t0, route, request.method)
+            HTTP_REQUESTS.inc(route, request.method, str(resp.status_code))
+        return resp
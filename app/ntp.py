@@ -0,0 +1,173 @@
+# File: app/ntp.py
+"""
+NTP-status for /api/sys/ntp-status og about-status (timedatectl + journal).
+- Siste kontakt: LastSyncUSec / NTPMessage fra timedatectl; mangler de, brukes siste
+  relevante linje fra systemd-timesyncd i journalen.
+- Journalen leses inkrementelt: første gang de siste JOURNAL_TAIL linjene, deretter
+  bare nye linjer etter lagret cursor (--after-cursor + --show-cursor). Funnet
+  beholdes mellom kall, så en rolig journal koster ett kort journalctl-kall.
+  Ugyldig cursor (journalen rotert/slettet) → ny hale neste gang.
+- Status caches i TTL_S; utløpt cache friskes opp av én tråd mens samtidige kall
+  venter på samme resultat (ingen dupliserte subprosesser).
+"""
+from __future__ import annotations
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .settings import TZ
+from .sysinfo import CmdResult, parse_kv, run_cmd
+__all__ = ["JOURNAL_TAIL", "TTL_S", "NtpMonitor", "get_ntp_monitor", "set_ntp_monitor", "ntp_status"]
+JOURNAL_TAIL = 500
+TTL_S = 15.0
+_LINE_RE = re.compile(r"^\s*([0-9]+(?:\.[0-9]+)?)\s+(.*)$")
+_SERVER_RE = re.compile(r"server\s+([0-9A-Za-z\.\-:]+)(?:[:\s]|$)")
+_CURSOR_PREFIX = "-- cursor:"
+_SYNC_MARKERS = ("Initial clock synchronization", "Synchronized to time server", "Contacted time server")
+def _scan_lines(lines: List[str]) -> Tuple[Optional[Tuple[int, Optional[str]]], Optional[str]]:
+    """(siste (ms, server) blant linjene, cursor fra --show-cursor) fra short-unix-utdata."""
+    found: Optional[Tuple[int, Optional[str]]] = None
+    cursor: Optional[str] = None
+    for line in lines:
+        if line.startswith(_CURSOR_PREFIX):
+            cursor = line[len(_CURSOR_PREFIX):].strip() or None
+            continue
+        m = _LINE_RE.match(line)
+        if not m:
+            continue
+        msg = m.group(2)
+        if any(marker in msg for marker in _SYNC_MARKERS):
+            m2 = _SERVER_RE.search(msg)
+            found = (int(float(m.group(1)) * 1000), m2.group(1) if m2 else None)
+    return found, cursor
+def _extract_destination_ts(ntp_message: str) -> int | None:
+    if not ntp_message:
+        return None
+    m = re.search(
+        r"DestinationTimestamp=([A-Za-z]{3}\s+\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}\s+[A-Za-z]+)",
+        ntp_message,
+    )
+    if not m:
+        return None
+    try:
+        dt = datetime.strptime(m.group(1), "%a %Y-%m-%d %H:%M:%S %Z").replace(tzinfo=TZ)
+        return int(dt.timestamp() * 1000)
+    except Exception:
+        return None
+def _pick_last_contact(ts: dict, base: dict):
+    best_ms = None
+    src = None
+    try:
+        us = int(ts.get("LastSyncUSec") or 0)
+        if us > 0:
+            best_ms = us // 1000
+            src = "LastSyncUSec"
+    except Exception:
+        pass
+    ntpmsg = base.get("NTPMessage") or ts.get("NTPMessage")
+    dest_ms = _extract_destination_ts(ntpmsg or "")
+    if dest_ms and (best_ms is None or dest_ms > best_ms):
+        best_ms = dest_ms
+        src = "DestinationTimestamp"
+    return best_ms, src
+def _to_bool(s: Any) -> bool:
+    return str(s).lower() in {"1", "true", "yes"}
+class NtpMonitor:
+    """Bufret NTP-status med inkrementell journal-leser. runner kan byttes ut (tester)."""
+    def __init__(
+        self,
+        runner: Callable[..., CmdResult] = run_cmd,
+        ttl_s: float = TTL_S,
+        unit: str = "systemd-timesyncd",
+    ) -> None:
+        self.runner = runner
+        self.ttl_s = ttl_s
+        self.unit = unit
+        self._lock = threading.Lock()  # beskytter payload/tidspunkt
+        self._refresh_lock = threading.Lock()  # én oppfriskning om gangen
+        self._payload: Optional[Dict[str, Any]] = None
+        self._at = 0.0  # monotonic
+        self._cursor: Optional[str] = None
+        self._journal_last: Optional[Tuple[int, Optional[str]]] = None
+        self.stats = {"refreshes": 0, "journal_reads": 0, "journal_lines": 0}
+    def journal_last_sync(self) -> Tuple[Optional[int], Optional[str]]:
+        """(ms, server) for siste synk i journalen; leser bare nye linjer."""
+        args = ["journalctl", "-u", self.unit, "--no-pager", "-o", "short-unix", "--show-cursor"]
+        if self._cursor:
+            args.append(f"--after-cursor={self._cursor}")
+        else:
+            args += ["-n", str(JOURNAL_TAIL)]
+        ok, out, _err, _rc = self.runner(args, timeout=6)
+        self.stats["journal_reads"] += 1
+        if not ok:
+            self._cursor = None  # ukjent/rotert cursor: les halen på nytt neste gang
+        else:
+            lines = out.splitlines()
+            self.stats["journal_lines"] += len(lines)
+            found, cursor = _scan_lines(lines)
+            if found is not None:
+                self._journal_last = found
+            if cursor:
+                self._cursor = cursor
+        return self._journal_last if self._journal_last is not None else (None, None)
+    def _collect(self) -> Dict[str, Any]:
+        ok1, out1, _, _ = self.runner(["timedatectl", "show"])
+        ok2, out2, _, _ = self.runner(["timedatectl", "show-timesync"])
+        base = parse_kv(out1) if ok1 else {}
+        ts = parse_kv(out2) if ok2 else {}
+        last_ms, src = _pick_last_contact(ts, base)
+        if not last_ms:
+            j_ms, j_src = self.journal_last_sync()
+            if j_ms:
+                last_ms, src = j_ms, f"journal:{j_src or 'timesyncd'}"
+        return {
+            "NTPSynchronized": _to_bool(base.get("NTPSynchronized")),
+            "SystemClockSynchronized": _to_bool(base.get("SystemClockSynchronized")),
+            "ServerName": ts.get("ServerName"),
+            "ServerAddress": ts.get("ServerAddress"),
+            "LastSyncUSec": ts.get("LastSyncUSec"),
+            "LastContactMS": last_ms,
+            "LastContactISO": (
+                datetime.fromtimestamp(last_ms / 1000, tz=TZ).isoformat()
+                if last_ms
+                else None
+            ),
+            "LastContactSource": src,
+            "NTPMessage": base.get("NTPMessage"),
+            "PollIntervalUSec": ts.get("PollIntervalUSec"),
+        }
+    def _fresh(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._payload is not None and time.monotonic() - self._at < self.ttl_s:
+                return self._payload
+        return None
+    def status(self) -> Dict[str, Any]:
+        """Gjeldende status (kopi); friskes opp når TTL er ute."""
+        payload = self._fresh()
+        if payload is None:
+            with self._refresh_lock:
+                payload = self._fresh()  # en annen tråd kan ha blitt ferdig mens vi ventet
+                if payload is None:
+                    payload = self._collect()
+                    self.stats["refreshes"] += 1
+                    with self._lock:
+                        self._payload = payload
+                        self._at = time.monotonic()
+        return dict(payload)
+_instance: Optional[NtpMonitor] = None
+_instance_lock = threading.Lock()
+def get_ntp_monitor() -> NtpMonitor:
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = NtpMonitor()
+    return _instance
+def set_ntp_monitor(monitor: Optional[NtpMonitor]) -> None:
+    """Bytt ut monitoren (tester)."""
+    global _instance
+    with _instance_lock:
+        _instance = monitor
+def ntp_status() -> Dict[str, Any]:
+    return get_ntp_monitor().status()
@@ -0,0 +1,108 @@
+# File: app/picsum.py
+"""
+Picsum auto-rotasjon: tilstand og valg av neste id (ren logikk, ingen IO).
+Brukes av scheduler.PicsumRotation (skriver) og /api/picsum/next (leser).
+"""
+from __future__ import annotations
+import random
+from typing import Any, Dict, List, Optional, Set, Tuple
+__all__ = ["catalog_ids", "served_ids", "rotation_state", "pick_next_id", "apply_rotation"]
+def _int_or_none(v: Any) -> Optional[int]:
+    if v in (None, ""):
+        return None
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+def catalog_ids(cfg: Dict[str, Any]) -> List[int]:
+    """Gyldige id-er i theme.picsum_catalog, i katalogrekkefølge."""
+    theme = (cfg or {}).get("theme") or {}
+    ids: List[int] = []
+    for x in theme.get("picsum_catalog") or []:
+        if isinstance(x, dict):
+            iv = _int_or_none(x.get("id"))
+            if iv is not None and iv > 0:
+                ids.append(iv)
+    return ids
+def served_ids(cfg: Dict[str, Any]) -> Set[int]:
+    """Id-er /media/picsum kan hente: katalogen og valgt bakgrunn, også i skjermprofiler."""
+    out: Set[int] = set()
+    for c in [cfg or {}, *((cfg or {}).get("displays") or {}).values()]:
+        if not isinstance(c, dict):
+            continue
+        out.update(catalog_ids(c))
+        pc = ((c.get("theme") or {}).get("background") or {}).get("picsum") or {}
+        iv = _int_or_none(pc.get("id")) if isinstance(pc, dict) else None
+        if iv is not None and iv > 0:
+            out.add(iv)
+    return out
+def rotation_state(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Oppsummer auto-rotasjon for config:
+    { active, enabled, interval_seconds, last_switch_ms, id, next_switch_ms }
+    - active: bakgrunnen viser picsum (mode 'picsum' eller dynamic.base_mode 'picsum')
+    - next_switch_ms: neste planlagte bytte, eller None når rotasjon ikke kjører
+      (av, ikke aktiv eller tom katalog).
+    """
+    theme = (cfg or {}).get("theme") or {}
+    bg_all = theme.get("background") or {}
+    bg = bg_all.get("picsum") or {}
+    ar = bg.get("auto_rotate") or {}
+    mode = str(bg_all.get("mode") or "").lower()
+    base_mode = str((bg_all.get("dynamic") or {}).get("base_mode") or "").lower()
+    active = mode == "picsum" or (mode == "dynamic" and base_mode == "picsum")
+    enabled = bool(ar.get("enabled", False))
+    interval = int(ar.get("interval_seconds") or 300)
+    last_switch_ms = int(ar.get("last_switch_ms") or 0)
+    runs = active and enabled and bool(catalog_ids(cfg))
+    return {
+        "active": active,
+        "enabled": enabled,
+        "interval_seconds": interval,
+        "last_switch_ms": last_switch_ms,
+        "id": bg.get("id") if isinstance(bg.get("id"), int) else None,
+        "next_switch_ms": (last_switch_ms + interval * 1000) if runs else None,
+    }
+def pick_next_id(cfg: Dict[str, Any]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Returner (next_id, next_index) gitt config, eller (None, None) hvis ikke mulig.
+    Bruker strategy: 'shuffle' eller 'sequential'. Unngår å returnere samme id hvis mulig.
+    """
+    ids = catalog_ids(cfg)
+    if not ids:
+        return None, None
+    bg = (((cfg or {}).get("theme") or {}).get("background") or {}).get("picsum") or {}
+    cur_id = bg.get("id") if isinstance(bg.get("id"), int) else None
+    ar = bg.get("auto_rotate") or {}
+    strategy = str(ar.get("strategy", "shuffle")).lower()
+    last_index = ar.get("last_index") if isinstance(ar.get("last_index"), int) else None
+    if strategy == "sequential":
+        idx = 0 if last_index is None else (last_index + 1) % len(ids)
+        nxt = ids[idx]
+        # unngå no-op hvis neste = cur_id
+        if len(ids) > 1 and nxt == cur_id:
+            idx = (idx + 1) % len(ids)
+            nxt = ids[idx]
+        return nxt, idx
+    # shuffle
+    if len(ids) == 1:
+        return ids[0], None
+    pool = [i for i in ids if i != cur_id] or ids
+    return random.choice(pool), None
+def apply_rotation(cfg: Dict[str, Any], now_ms: int) -> Optional[int]:
+    """
+    Bytt til neste id i cfg (muterer) hvis intervallet er passert.
+    Returnerer ny id, eller None når ingenting skal skje.
+    """
+    st = rotation_state(cfg)
+    if st["next_switch_ms"] is None or st["next_switch_ms"] > now_ms:
+        return None
+    nxt_id, nxt_index = pick_next_id(cfg)
+    if nxt_id is None:
+        return None
+    pc = cfg["theme"]["background"]["picsum"]
+    pc["id"] = int(nxt_id)
+    ar = pc.setdefault("auto_rotate", {})
+    ar["last_switch_ms"] = int(now_ms)
+    ar["last_index"] = int(nxt_index) if nxt_index is not None else None
+    return int(nxt_id)
@@ -0,0 +1,151 @@
+# File: app/recurrence.py
+"""
+Kalendermotor for mode 'calendar': ukentlige regler + unntak (helligdager).
+cfg["calendar"] = {
+  "rules": [{"days": ["mon", "wed"], "time": "19:15", "from": "2026-01-05", "until": ""}],
+  "exceptions": [{"date": "2026-12-24"}, {"date": "2026-12-31", "time": "17:00"}],
+}
+- Unntak uten time: ingen forekomster den dagen. Med time: erstatter dagens tider
+  (flere unntak på samme dato → flere tider).
+- Tidspunkt tolkes i settings.TZ pr. dato, så 23/25-timers døgn gir riktig UTC.
+  Klokkeslett i vårens hull (02:30) flyttes frem én time; tvetydige (høst) tar første.
+Oppslag: sortert indeks (ms) over HORIZON_DAYS dager, bygget lat ved første spørring
+og flyttet når spørringen faller utenfor vinduet; selve oppslaget er bisect (O(log n)).
+"""
+from __future__ import annotations
+import re
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from .settings import TZ
+__all__ = ["WEEKDAYS", "Calendar", "sanitize_calendar"]
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+HORIZON_DAYS = 62
+# Lengste søk etter neste/forrige forekomst før vi gir opp (regler med from/until)
+MAX_SEARCH_DAYS = 800
+_HHMM_RE = re.compile(r"^([01]\d|2[0-3]):([0-5]\d)$")
+def _hhmm(v: Any) -> Optional[str]:
+    s = str(v or "").strip()
+    return s if _HHMM_RE.match(s) else None
+def _date(v: Any) -> Optional[str]:
+    s = str(v or "").strip()
+    if not s:
+        return None
+    try:
+        return date.fromisoformat(s).isoformat()
+    except ValueError:
+        return None
+def _days(v: Any) -> List[str]:
+    out = set()
+    for d in v if isinstance(v, (list, tuple)) else []:
+        if isinstance(d, int) and not isinstance(d, bool) and 0 <= d <= 6:
+            out.add(WEEKDAYS[d])
+        elif isinstance(d, str) and d.strip().lower()[:3] in WEEKDAYS:
+            out.add(d.strip().lower()[:3])
+    return [d for d in WEEKDAYS if d in out]
+def sanitize_calendar(raw: Any) -> Dict[str, List[Dict[str, Any]]]:
+    """Normaliser cfg['calendar']; ugyldige regler/unntak droppes (som overlays)."""
+    raw = raw if isinstance(raw, dict) else {}
+    rules: List[Dict[str, Any]] = []
+    for r in raw.get("rules") or []:
+        if not isinstance(r, dict):
+            continue
+        days, t = _days(r.get("days")), _hhmm(r.get("time"))
+        if not days or t is None:
+            continue
+        rules.append({"days": days, "time": t, "from": _date(r.get("from")) or "", "until": _date(r.get("until")) or ""})
+    exceptions: List[Dict[str, Any]] = []
+    for e in raw.get("exceptions") or []:
+        if not isinstance(e, dict) or _date(e.get("date")) is None:
+            continue
+        item: Dict[str, Any] = {"date": _date(e.get("date"))}
+        if e.get("time"):
+            t = _hhmm(e.get("time"))
+            if t is None:
+                continue
+            item["time"] = t
+        exceptions.append(item)
+    return {"rules": rules, "exceptions": exceptions}
+def _ms_local(d: date, hh: int, mm: int) -> int:
+    return int(datetime(d.year, d.month, d.day, hh, mm, tzinfo=TZ).timestamp() * 1000)
+def _local_date(ms: int) -> date:
+    return datetime.fromtimestamp(ms / 1000, tz=TZ).date()
+def _split(hhmm: str) -> Tuple[int, int]:
+    return int(hhmm[:2]), int(hhmm[3:])
+class Calendar:
+    """Kompilert kalender (én pr. config-revisjon, se countdown.compile_schedule)."""
+    def __init__(self, cal: Any) -> None:
+        cal = sanitize_calendar(cal)
+        self._rules: List[Tuple[FrozenSet[int], Tuple[int, int], Optional[date], Optional[date]]] = []
+        for r in cal["rules"]:
+            self._rules.append(
+                (
+                    frozenset(WEEKDAYS.index(d) for d in r["days"]),
+                    _split(r["time"]),
+                    date.fromisoformat(r["from"]) if r["from"] else None,
+                    date.fromisoformat(r["until"]) if r["until"] else None,
+                )
+            )
+        self._override: Dict[date, List[Tuple[int, int]]] = {}
+        for e in cal["exceptions"]:
+            times = self._override.setdefault(date.fromisoformat(e["date"]), [])
+            if "time" in e:
+                times.append(_split(e["time"]))
+        # (første dag, dag etter siste, sorterte ms); byttes atomisk
+        self._index: Optional[Tuple[date, date, List[int]]] = None
+    @property
+    def empty(self) -> bool:
+        return not self._rules and not any(self._override.values())
+    def _times_on(self, d: date) -> List[Tuple[int, int]]:
+        if d in self._override:
+            return sorted(set(self._override[d]))
+        wd = d.weekday()
+        return sorted(
+            {
+                hm
+                for days, hm, first, last in self._rules
+                if wd in days and (first is None or d >= first) and (last is None or d <= last)
+            }
+        )
+    def _occurrences(self, first: date, days: int) -> List[int]:
+        occ = [_ms_local(d, hh, mm) for d in (first + timedelta(i) for i in range(days)) for hh, mm in self._times_on(d)]
+        occ.sort()  # vårens hull kan flytte en sen tid forbi neste
+        return occ
+    def _window(self, d: date) -> Tuple[date, date, List[int]]:
+        idx = self._index
+        if idx is None or not (idx[0] <= d < idx[1]):
+            first = d - timedelta(days=1)
+            idx = (first, first + timedelta(days=HORIZON_DAYS), self._occurrences(first, HORIZON_DAYS))
+            self._index = idx
+        return idx
+    def next_at_or_after(self, ms: int) -> Optional[int]:
+        """Første forekomst >= ms, eller None innen MAX_SEARCH_DAYS."""
+        if self.empty:
+            return None
+        d = _local_date(ms)
+        stop = d + timedelta(days=MAX_SEARCH_DAYS)
+        while d < stop:
+            _first, end, occ = self._window(d)
+            i = bisect_left(occ, ms)
+            if i < len(occ):
+                return occ[i]
+            d = end
+        return None
+    def prev_before(self, ms: int) -> Optional[int]:
+        """Siste forekomst < ms, eller None innen MAX_SEARCH_DAYS."""
+        if self.empty:
+            return None
+        first, _end, occ = self._window(_local_date(ms))
+        i = bisect_left(occ, ms)
+        if i > 0:
+            return occ[i - 1]
+        # Sjeldent (lange opphold): søk bakover uten å flytte hovedindeksen
+        d = first
+        limit = first - timedelta(days=MAX_SEARCH_DAYS)
+        while d > limit:
+            d -= timedelta(days=HORIZON_DAYS)
+            occ = self._occurrences(d, HORIZON_DAYS)
+            i = bisect_left(occ, ms)
+            if i > 0:
+                return occ[i - 1]
+        return None
@@ -1,23 +1,33 @@
 # File: app/routes/api.py
 from __future__ import annotations
-import os
-import re
-import subprocess
 import time
-import random
 from datetime import datetime
-from typing import Any, Dict, Tuple, cast
+from typing import Any, Dict, Tuple
 from flask import Blueprint, request, jsonify, Response, current_app
 from ..settings import TZ
 from ..countdown import compute_tick
-from ..auth import require_password
+from ..picsum import rotation_state
+from ..displays import resolve_display
+from ..sysinfo import (
+    get_sysinfo,
+    run_cmd as _run_cmd,
+    run_cmd_direct as _run_cmd_direct,
+    service_map as _svc_map,
+)
+from ..ntp import ntp_status
+from ..auth import TOKEN_TTL_S, auth_enabled, issue_token, require_password
 from ..storage import (
     load_config,
     save_config_patch,
-    set_mode,
+    update_config,
+    apply_mode,
+    apply_patch,
+    ConfigConflictError,
+    MODES,
     start_duration,
     clear_duration_and_switch_to_daily,
     get_defaults,
+    frozen_defaults,
     build_visual_reset_patch,
 )
 bp = Blueprint("api", __name__, url_prefix="/api")
@@ -61,57 +71,29 @@ def _coerce_positive_int(v: Any) -> int | None:
     except (TypeError, ValueError):
         iv = None
     return iv if (iv is not None and iv > 0) else None
-def _run_cmd(args, timeout: int = 8) -> Tuple[bool, str, str, int]:
-    """System-scope kommando; prøv sudo -n først, fall tilbake uten sudo."""
-    try:
-        r = subprocess.run(
-            ["sudo", "-n", *args], capture_output=True, text=True, timeout=timeout
-        )
-        if r.returncode == 0:
-            return (
-                True,
-                (r.stdout or "").strip(),
-                (r.stderr or "").strip(),
-                r.returncode,
-            )
-        r2 = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
-        return (
-            (r2.returncode == 0),
-            (r2.stdout or "").strip(),
-            (r2.stderr or "").strip(),
-            r2.returncode,
-        )
-    except Exception as e:
-        return False, "", str(e), -1
-def _run_cmd_direct(args, timeout: int = 8) -> Tuple[bool, str, str, int]:
-    """Kjør uten sudo (brukes for systemctl --user)."""
-    try:
-        r = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
-        return (
-            (r.returncode == 0),
-            (r.stdout or "").strip(),
-            (r.stderr or "").strip(),
-            r.returncode,
-        )
-    except Exception as e:
-        return False, "", str(e), -1
-def _parse_kv(text: str) -> dict:
-    d = {}
-    for line in (text or "").splitlines():
-        if "=" in line:
-            k, v = line.split("=", 1)
-            d[k.strip()] = v.strip()
-    return d
 # ── config/defaults ────────────────────────────────────────────────────────────
 @bp.get("/defaults")
 def api_defaults() -> Response:
     return _json_ok({"defaults": get_defaults()})
 @bp.get("/config")
 def api_get_config() -> Response:
+    """
+    Sterk ETag = config-revisjonen (innholdshash av config.json).
+    If-None-Match som treffer → 304 uten body; 'tick' i 200-svaret er bare et
+    øyeblikksbilde og inngår ikke i revisjonen (bruk /tick eller /events).
+    ?display=navn gir skjermprofilen lagt over felles config (egen ETag pr. profil).
+    """
     try:
-        cfg = load_config()
+        cfg, etag = resolve_display(request.args.get("display"))
+        if etag and request.if_none_match.contains(etag):
+            resp = Response(status=304)
+            resp.set_etag(etag)
+            return resp
         tick = compute_tick(cfg)
-        return _json_ok({"config": cfg, "tick": tick})
+        resp = _json_ok({"config": cfg, "tick": tick})
+        if etag:
+            resp.set_etag(etag)
+        return resp
     except Exception:
         current_app.logger.exception("GET /api/config failed")
         return _json_err("internal error", status=500, code="internal_error")
@@ -127,20 +109,16 @@ def api_post_config() -> Response:
         return _json_err(
             "payload must be a JSON object", status=400, code="bad_request"
         )
+    # CAS: '_version' i body og/eller If-Match (ETag fra GET /api/config)
+    expected_version = _coerce_int_or_none(data.get("_version"))
+    if_match = request.if_match
+    expected_etag = None
+    if if_match and not if_match.star_tag:
+        expected_etag = next(iter(if_match.as_set()), None)
     try:
-        if "mode" in data:
-            mode = str(data.get("mode") or "").strip().lower()
-            cfg = set_mode(
-                mode,
-                daily_time=str(data.get("daily_time") or ""),
-                once_at=str(data.get("once_at") or ""),
-                duration_minutes=_coerce_int_or_none(data.get("duration_minutes")),
-                clock=(
-                    data.get("clock") if isinstance(data.get("clock"), dict) else None
-                ),
-            )
-        else:
-            cfg = load_config()
+        mode = str(data.get("mode") or "").strip().lower() if "mode" in data else None
+        if mode is not None and mode not in MODES:
+            raise ValueError("Ugyldig mode")
         passthrough = (
             "message_primary",
             "message_secondary",
@@ -154,6 +132,9 @@ def api_post_config() -> Response:
             "daily_time",
             "once_at",
             "duration_minutes",
+            "calendar",
+            "instances",
+            "displays",
             "theme",
             "color_normal",
             "color_warn",
@@ -170,58 +151,42 @@ def api_post_config() -> Response:
             "overlays",
         )
         patch = {k: data[k] for k in passthrough if k in data}
-        if patch:
-            cfg = save_config_patch(patch)
+        def _apply(cfg: Dict[str, Any]) -> Dict[str, Any]:
+            # Hvorfor én mutator: mode + felter lagres atomisk i samme versjon
+            if mode is not None:
+                cfg = apply_mode(
+                    cfg,
+                    mode,
+                    daily_time=str(data.get("daily_time") or ""),
+                    once_at=str(data.get("once_at") or ""),
+                    duration_minutes=_coerce_int_or_none(data.get("duration_minutes")),
+                    clock=(
+                        data.get("clock") if isinstance(data.get("clock"), dict) else None
+                    ),
+                    calendar=(
+                        data.get("calendar")
+                        if isinstance(data.get("calendar"), dict)
+                        else None
+                    ),
+                )
+            return apply_patch(cfg, patch) if patch else cfg
+        if mode is not None or patch:
+            cfg = update_config(
+                _apply, expected_version=expected_version, expected_etag=expected_etag
+            )
+        else:
+            cfg = load_config()
         tick = compute_tick(cfg)
         return _json_ok({"config": cfg, "tick": tick})
+    except ConfigConflictError as e:
+        return _json_err(
+            str(e), status=409, code="conflict", extra={"version": e.current_version}
+        )
     except ValueError as e:
         return _json_err(str(e), status=400, code="validation_error")
     except Exception:
         current_app.logger.exception("POST /api/config failed")
         return _json_err("internal error", status=500, code="internal_error")
-def _pick_next_picsum_id(cfg: Dict[str, Any]) -> tuple[int | None, int | None]:
-    """
-    Returner (next_id, next_index) gitt config, eller (None, None) hvis ikke mulig.
-    Bruker strategy: 'shuffle' eller 'sequential'. Unngår å returnere samme id hvis mulig.
-    """
-    theme = (cfg or {}).get("theme") or {}
-    catalog = theme.get("picsum_catalog") or []
-    bg = (theme.get("background") or {}).get("picsum") or {}
-    cur_id = bg.get("id") if isinstance(bg.get("id"), int) else None
-    if not catalog:
-        return None, None
-    raw: list[Any] = theme.get("picsum_catalog") or []
-    ids: list[int] = []
-    for x in raw:
-        if isinstance(x, dict):
-            iv = _coerce_int_or_none(x.get("id"))
-            if iv is not None and iv > 0:
-                ids.append(int(iv))
-    if not ids:
-        return None, None
-    ar = bg.get("auto_rotate") or {}
-    strategy = str(ar.get("strategy", "shuffle")).lower()
-    last_index: int | None = (
-        ar.get("last_index") if isinstance(ar.get("last_index"), int) else None
-    )
-    if strategy == "sequential":
-        if last_index is None:
-            # start fra 0, men hvis samme som cur_id – hopp til neste
-            idx = 0
-        else:
-            idx = (cast(int, last_index) + 1) % len(ids)
-        nxt = ids[idx]
-        # unngå no-op hvis eneste element = cur_id
-        if len(ids) > 1 and nxt == cur_id:
-            idx = (idx + 1) % len(ids)
-            nxt = ids[idx]
-        return nxt, idx
-    # shuffle
-    if len(ids) == 1:
-        return (ids[0] if ids[0] != cur_id else ids[0]), None
-    # velg tilfeldig annet enn cur_id
-    pool = [i for i in ids if i != cur_id] or ids
-    return random.choice(pool), None
 # ── duration ───────────────────────────────────────────────────────────────────
 @bp.post("/start-duration")
 @require_password
@@ -263,6 +228,14 @@ def status() -> Response:
     except Exception:
         current_app.logger.exception("GET /api/status failed")
         return _json_err("internal error", status=500, code="internal_error")
+@bp.post("/auth/token")
+@require_password
+def auth_token() -> Response:
+    """Kortlivet sesjonstoken (X-Admin-Token) for klienter uten cookies."""
+    if not auth_enabled():
+        return _json_err("auth er ikke aktivert", status=400, code="auth_disabled")
+    token, exp = issue_token()
+    return _json_ok({"token": token, "expires_at": exp, "ttl_s": TOKEN_TTL_S})
 # ── meta ───────────────────────────────────────────────────────────────────────
 @bp.get("/_routes")
 def api_routes():
@@ -275,12 +248,6 @@ def api_routes():
         routes.append({"rule": str(r), "endpoint": r.endpoint, "methods": methods})
     return jsonify(ok=True, routes=routes)
 # ── system/services helpers ────────────────────────────────────────────────────
-def _svc_map() -> dict:
-    return {
-        "app": {"unit": "countdown.service", "scope": "user"},
-        "web": {"unit": "countdown.service", "scope": "user"},  # alias
-        "kiosk": {"unit": "kiosk-cog.service", "scope": "system"},
-    }
 def _run_user_systemctl(cmd: list[str], timeout: int = 8) -> Tuple[bool, str, str, int]:
     return _run_cmd_direct(["systemctl", "--user", *cmd], timeout=timeout)
 # ── sys/service ────────────────────────────────────────────────────────────────
@@ -386,211 +353,23 @@ def sys_shutdown():
     # Kjør whitelista helper (NOPASSWD i sudoers)
     ok, out, err, rc = _run_cmd(["/usr/local/sbin/cdown-shutdown"])
     return jsonify(ok=ok, rc=rc, stdout=out, stderr=err), (200 if ok else 500)
-# ── NTP utils/endpoints ───────────────────────────────────────────────────────
-def _ntp_last_sync_from_journal(max_lines: int = 500):
-    ok, out, err, rc = _run_cmd(
-        [
-            "journalctl",
-            "-u",
-            "systemd-timesyncd",
-            "--no-pager",
-            "-n",
-            str(max_lines),
-            "-o",
-            "short-unix",
-        ],
-        timeout=6,
-    )
-    if not ok or not out:
-        return None, None
-    lines = out.splitlines()
-    for line in reversed(lines):
-        m = re.match(r"^\s*([0-9]+(?:\.[0-9]+)?)\s+(.*)$", line)
-        if not m:
-            continue
-        ts_epoch = float(m.group(1))
-        msg = m.group(2)
-        if (
-            ("Initial clock synchronization" in msg)
-            or ("Synchronized to time server" in msg)
-            or ("Contacted time server" in msg)
-        ):
-            src = None
-            m2 = re.search(r"server\s+([0-9A-Za-z\.\-:]+)(?:[:\s]|$)", msg)
-            if m2:
-                src = m2.group(1)
-            return int(ts_epoch * 1000), src
-    return None, None
-def _extract_destination_ts(ntp_message: str) -> int | None:
-    if not ntp_message:
-        return None
-    m = re.search(
-        r"DestinationTimestamp=([A-Za-z]{3}\s+\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}\s+[A-Za-z]+)",
-        ntp_message,
-    )
-    if not m:
-        return None
-    try:
-        from ..settings import TZ as _TZ
-        dt = datetime.strptime(m.group(1), "%a %Y-%m-%d %H:%M:%S %Z").replace(
-            tzinfo=_TZ
-        )
-        return int(dt.timestamp() * 1000)
-    except Exception:
-        return None
-def _pick_last_contact(ts: dict, base: dict):
-    best_ms = None
-    src = None
-    try:
-        us = int(ts.get("LastSyncUSec") or 0)
-        if us > 0:
-            best_ms = us // 1000
-            src = "LastSyncUSec"
-    except Exception:
-        pass
-    ntpmsg = base.get("NTPMessage") or ts.get("NTPMessage")
-    dest_ms = _extract_destination_ts(ntpmsg or "")
-    if dest_ms and (best_ms is None or dest_ms > best_ms):
-        best_ms = dest_ms
-        src = "DestinationTimestamp"
-    return best_ms, src
-_NTP_CACHE = {"ts": 0.0, "payload": None}
-_NTP_TTL_SEC = 15.0
-def _compute_ntp_payload() -> dict:
-    now = time.monotonic()
-    if _NTP_CACHE["payload"] is not None and (now - _NTP_CACHE["ts"] < _NTP_TTL_SEC):
-        return _NTP_CACHE["payload"]
-    ok1, out1, _, _ = _run_cmd(["timedatectl", "show"])
-    ok2, out2, _, _ = _run_cmd(["timedatectl", "show-timesync"])
-    base = _parse_kv(out1) if ok1 else {}
-    ts = _parse_kv(out2) if ok2 else {}
-    def to_bool(s):
-        return str(s).lower() in {"1", "true", "yes"}
-    last_ms, src = _pick_last_contact(ts, base)
-    if not last_ms:
-        j_ms, j_src = _ntp_last_sync_from_journal()
-        if j_ms:
-            last_ms, src = j_ms, f"journal:{j_src or 'timesyncd'}"
-    payload = {
-        "NTPSynchronized": to_bool(base.get("NTPSynchronized")),
-        "SystemClockSynchronized": to_bool(base.get("SystemClockSynchronized")),
-        "ServerName": ts.get("ServerName"),
-        "ServerAddress": ts.get("ServerAddress"),
-        "LastSyncUSec": ts.get("LastSyncUSec"),
-        "LastContactMS": last_ms,
-        "LastContactISO": (
-            datetime.fromtimestamp(last_ms / 1000, tz=TZ).isoformat()
-            if last_ms
-            else None
-        ),
-        "LastContactSource": src,
-        "NTPMessage": base.get("NTPMessage"),
-        "PollIntervalUSec": ts.get("PollIntervalUSec"),
-    }
-    _NTP_CACHE["ts"] = now
-    _NTP_CACHE["payload"] = payload
-    return payload
+# ── NTP (se ntp.py) ────────────────────────────────────────────────────────────
 @bp.get("/sys/ntp-status")
 @require_password
 def sys_ntp_status():
     try:
-        return _json_ok({"ntp": _compute_ntp_payload()})
+        return _json_ok({"ntp": ntp_status()})
     except Exception:
         current_app.logger.exception("GET /api/sys/ntp-status failed")
         return _json_err("internal error", status=500, code="internal_error")
 @bp.get("/sys/about-status")
 @require_password
 def sys_about_status():
-    import platform
-    ver = (os.environ.get("COUNTDOWN_VERSION") or "").strip() or None
-    ok_git, out_git, _, _ = _run_cmd(["git", "rev-parse", "--short", "HEAD"])
-    commit = (
-        out_git
-        if ok_git and out_git
-        else (os.environ.get("COUNTDOWN_COMMIT") or "").strip() or None
-    )
-    uname = platform.uname()
-    os_name = f"{uname.system} {uname.release}"
-    kernel = uname.version
-    arch = uname.machine
-    os_pretty = None
-    try:
-        with open("/etc/os-release", "r", encoding="utf-8") as f:
-            kv = {}
-            for line in f:
-                line = line.strip()
-                if "=" in line:
-                    k, v = line.split("=", 1)
-                    kv[k] = v.strip().strip('"')
-            os_pretty = kv.get("PRETTY_NAME") or kv.get("NAME")
-    except Exception:
-        pass
-    model = None
-    try:
-        with open("/proc/device-tree/model", "rb") as f:
-            model = f.read().decode("utf-8", "ignore").strip("\x00\r\n ")
-    except Exception:
-        pass
-    services_map = _svc_map()
-    svc_status = {}
-    for name, meta in services_map.items():
-        unit = meta["unit"]
-        scope = meta["scope"]
-        if scope == "user":
-            ok_is, out_is, err_is, _ = _run_user_systemctl(["is-active", unit])
-            active = out_is.strip() == "active"
-            ok_show, out_show, err_show, _ = _run_user_systemctl(
-                [
-                    "show",
-                    unit,
-                    "--no-pager",
-                    "--property=ActiveState,SubState,ActiveEnterTimestamp,ExecMainStartTimestamp,Description",
-                ]
-            )
-        else:
-            ok_is, out_is, err_is, _ = _run_cmd(["systemctl", "is-active", unit])
-            active = out_is.strip() == "active"
-            ok_show, out_show, err_show, _ = _run_cmd(
-                [
-                    "systemctl",
-                    "show",
-                    unit,
-                    "--no-pager",
-                    "--property=ActiveState,SubState,ActiveEnterTimestamp,ExecMainStartTimestamp,Description",
-                ]
-            )
-        info = {}
-        if ok_show:
-            for line in out_show.splitlines():
-                if "=" in line:
-                    k, v = line.split("=", 1)
-                    info[k.strip()] = v.strip()
-        svc_status[name] = {
-            "unit": unit,
-            "scope": scope,
-            "active": active,
-            "substate": info.get("SubState"),
-            "since": info.get("ActiveEnterTimestamp"),
-            "exec_main_start": info.get("ExecMainStartTimestamp"),
-            "description": info.get("Description"),
-            "raw": (out_is or err_is or out_show or err_show),
-        }
-    ntp = _compute_ntp_payload()
-    return _json_ok(
-        {
-            "about": {
-                "version": ver or "unknown",
-                "commit": commit or "unknown",
-                "server_time": _now_iso(),
-                "os": os_pretty or os_name,
-                "kernel": kernel,
-                "arch": arch,
-                "model": model or "unknown",
-                "services": svc_status,
-                "ntp": ntp,
-            }
-        }
-    )
+    """Bufret øyeblikksbilde fra sysinfo (ingen subprosesser i forespørselen)."""
+    about = get_sysinfo().snapshot()
+    about["server_time"] = _now_iso()
+    about["ntp"] = ntp_status()
+    return _json_ok({"about": about})
 @bp.post("/reset-visual")
 @require_password
 def api_reset_visual() -> Response:
@@ -677,8 +456,7 @@ def api_reset_visual() -> Response:
     }
     opts = presets.get(profile, presets["visual"])
     try:
-        defaults = get_defaults()
-        patch = build_visual_reset_patch(defaults, **opts)
+        patch = build_visual_reset_patch(frozen_defaults(), **opts)
         cfg = save_config_patch(patch)
         tick = compute_tick(cfg)
         return _json_ok({"config": cfg, "tick": tick})
@@ -690,81 +468,27 @@ def api_reset_visual() -> Response:
 @bp.get("/picsum/next")
 def api_picsum_next() -> Response:
     """
-    Returnerer (og ev. oppdaterer) neste Picsum-ID basert på auto_rotate.
-    - Endrer kun config hvis:
-        * theme.background.mode == 'picsum'
-        * auto_rotate.enabled == True
-        * intervallet er passert
-        * det finnes en kuratert liste
-    Respons: { ok, id, enabled, interval_seconds, next_in_seconds, updated }
+    Ren lesing av Picsum auto-rotasjon (byttet gjøres av scheduler.PicsumRotation,
+    som også sender SSE 'picsum'). Config er cachet, så dette er billig.
+    Respons: { ok, id, enabled, interval_seconds, next_in_seconds, next_switch_ms, updated }
+    'updated' er alltid False (beholdt for eldre klienter).
     """
     try:
-        cfg = load_config()
-        theme = cfg.get("theme") or {}
-        bg_all = theme.get("background") or {}
-        bg = bg_all.get("picsum") or {}
-        ar = bg.get("auto_rotate") or {}
-        enabled = bool(ar.get("enabled", False))
-        interval = int(ar.get("interval_seconds") or 300)
-        last_switch_ms = int(ar.get("last_switch_ms") or 0)
-        now_ms = int(time.time() * 1000)
-        mode = (bg_all.get("mode") or "").lower()
-        dyn = bg_all.get("dynamic") or {}
-        base_mode = str(dyn.get("base_mode") or "").lower()
-        cur_id = bg.get("id") if isinstance(bg.get("id"), int) else None
-        # standard svar dersom vi ikke skal endre noe
-        payload = {
-            "id": cur_id,
-            "enabled": enabled,
-            "interval_seconds": interval,
-            "updated": False,
-            "next_in_seconds": None,
-        }
-        # Tillat også når dynamic.base_mode = "picsum"
-        is_picsum_active = (mode == "picsum") or (
-            mode == "dynamic" and base_mode == "picsum"
-        )
-        if (not is_picsum_active) or (not enabled):
-            payload["enabled"] = False
-            payload["next_in_seconds"] = None
-            return _json_ok(payload)
-        if not enabled:
-            # beholde dagens oppførsel når picsum er aktiv, men auto-rotate er av
-            return _json_ok(payload)
-        elapsed_ms = now_ms - last_switch_ms
-        if elapsed_ms < interval * 1000:
-            payload["next_in_seconds"] = max(0, interval - elapsed_ms // 1000)
-            return _json_ok(payload)
-        # finn neste id
-        nxt_id, nxt_index = _pick_next_picsum_id(cfg)
-        if nxt_id is None:
-            # Ingen kuratert liste – ikke gjør endringer
-            payload["next_in_seconds"] = max(0, interval - elapsed_ms // 1000)
-            return _json_ok(payload)
-        # Oppdater config (patch) – sett ny id og auto_rotate.last_switch_ms (+ ev. last_index)
-        patch = {
-            "theme": {
-                "background": {
-                    "picsum": {
-                        "id": int(nxt_id),
-                        "auto_rotate": {
-                            "enabled": True,
-                            "interval_seconds": int(interval),
-                            "strategy": str(ar.get("strategy", "shuffle")).lower(),
-                            "last_switch_ms": now_ms,
-                            "last_index": (
-                                int(nxt_index) if nxt_index is not None else None
-                            ),
-                        },
-                    }
-                }
+        st = rotation_state(load_config())
+        next_ms = st["next_switch_ms"]
+        next_in = None
+        if next_ms is not None:
+            next_in = max(0, (next_ms - int(time.time() * 1000)) // 1000)
+        return _json_ok(
+            {
+                "id": st["id"],
+                "enabled": bool(st["active"] and st["enabled"]),
+                "interval_seconds": st["interval_seconds"],
+                "updated": False,
+                "next_in_seconds": next_in,
+                "next_switch_ms": next_ms,
             }
-        }
-        cfg = save_config_patch(patch)
-        payload["id"] = int(nxt_id)
-        payload["updated"] = True
-        payload["next_in_seconds"] = int(interval)
-        return _json_ok(payload)
+        )
     except Exception:
         current_app.logger.exception("GET /api/picsum/next failed")
         return _json_err("internal error", status=500, code="internal_error")
@@ -0,0 +1,165 @@
+# File: app/routes/media.py
+"""
+Bilder via lokal diskcache.
+- /media/picsum/<id>/<w>x<h>[?grayscale=1&blur=N] – Picsum-originaler (app.media).
+- /media/bg/picsum/<id>/<w>x<h>, /media/bg/image/<w>x<h>?src=/static/…,
+  /media/bg/dynamic/<w>x<h> – ferdigrendrede bakgrunner (app.imaging; 501 uten Pillow).
+Hvorfor: hver skjerm og hvert rotasjonsbytte hentet bildet direkte fra picsum.photos;
+nå hentes hvert bilde én gang, serveres fra disk (ETag/304, lang max-age) og
+neste bilder i katalogen forhåndshentes i samme størrelse.
+Rutene er åpne (kiosken har ingen innlogging), så alt som styrer nedlasting og
+rendring er begrenset: størrelsen rundes av med media.snap_size(), Picsum-id må finnes
+i config (picsum.served_ids, ellers 404), og blur/tint/former rundes og klemmes.
+"""
+from __future__ import annotations
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+from flask import Blueprint, Response, jsonify, request, send_file
+from ..imaging import MAX_BLUR_PX, ImagingUnavailable, dynamic_variant, image_variant, parse_hex
+from ..media import MAX_SIDE, MediaError, get_cache, next_catalog_ids, snap_size
+from ..picsum import catalog_ids, served_ids
+from ..settings import PROJECT_ROOT
+from ..storage import load_config
+bp = Blueprint("media", __name__, url_prefix="/media")
+PREFETCH_AHEAD = 3
+_SIZE_RE = re.compile(r"^(\d{1,4})x(\d{1,4})$")
+_STATIC = (PROJECT_ROOT / "static").resolve()
+# Innholdet for en gitt URL endres aldri (parametrene er nøkkelen)
+_MAX_AGE_S = 7 * 24 * 3600
+# (rx_vmax, ry_vmax, pos_x_pct, pos_y_pct, stop_pct)
+_SHAPE_LIMITS = ((1, 200), (1, 200), (-100, 200), (-100, 200), (1, 100))
+class _BadRequest(ValueError):
+    pass
+class _NotFound(LookupError):
+    pass
+def _err(message: str, status: int) -> Response:
+    resp = jsonify({"ok": False, "error": message})
+    resp.status_code = status
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+def _flag(name: str) -> bool:
+    v = request.args.get(name)
+    if v is None:
+        return False
+    return v.strip().lower() in ("", "1", "true", "yes", "on")
+def _num(name: str, default: float, lo: float, hi: float) -> float:
+    raw = request.args.get(name)
+    if raw in (None, ""):
+        return default
+    try:
+        v = float(raw)
+    except ValueError:
+        raise _BadRequest(f"{name} må være et tall")
+    return max(lo, min(hi, v))
+def _size(size: str) -> Tuple[int, int]:
+    m = _SIZE_RE.match(size)
+    if not m:
+        raise _BadRequest("størrelse må være <bredde>x<høyde>")
+    w, h = int(m.group(1)), int(m.group(2))
+    if not (0 < w <= MAX_SIDE and 0 < h <= MAX_SIDE):
+        raise _BadRequest(f"bredde/høyde må være 1..{MAX_SIDE}")
+    return snap_size(w, h)
+def _blur() -> float:
+    return float(round(_num("blur", 0.0, 0.0, MAX_BLUR_PX)))
+def _tint() -> Tuple[Optional[Tuple[int, int, int]], float]:
+    # 0.05-trinn: samme utseende, langt færre varianter i cachen
+    return parse_hex(request.args.get("tint")), round(_num("tint_opacity", 0.0, 0.0, 1.0) * 20) / 20
+def _send(path: Path) -> Response:
+    mimetype = "image/png" if path.suffix == ".png" else "image/jpeg"
+    # ETag fra filnavnet: innholdet er uforanderlig, mens mtime flyttes ved hvert treff (LRU)
+    resp = send_file(path, mimetype=mimetype, conditional=True, etag=path.name, max_age=_MAX_AGE_S)
+    resp.headers["Cache-Control"] = f"public, max-age={_MAX_AGE_S}"
+    return resp
+def _picsum_source(pid: int, w: int, h: int) -> Path:
+    cfg = load_config()
+    if pid not in served_ids(cfg):
+        raise _NotFound("ukjent bilde-id")
+    grayscale = _flag("grayscale")
+    blur = int(_num("blur", 0, 0, 10))
+    cache = get_cache()
+    path = cache.get(pid, w, h, grayscale=grayscale, blur=blur)
+    try:
+        ids = next_catalog_ids(catalog_ids(cfg), pid, PREFETCH_AHEAD)
+        if ids:
+            cache.prefetch(ids, w, h, grayscale=grayscale, blur=blur)
+    except Exception:
+        pass  # forhåndshenting er best-effort
+    return path
+def _media_call(fn) -> Response:
+    try:
+        return _send(fn())
+    except (_BadRequest, ValueError) as e:
+        return _err(str(e), 400)
+    except _NotFound as e:
+        return _err(str(e), 404)
+    except ImagingUnavailable as e:
+        return _err(str(e), 501)
+    except MediaError as e:
+        return _err(f"kunne ikke hente bilde: {e}", 502)
+@bp.get("/picsum/<int:pid>/<size>")
+def picsum_image(pid: int, size: str):
+    def _run() -> Path:
+        w, h = _size(size)
+        return _picsum_source(pid, w, h)
+    return _media_call(_run)
+@bp.get("/bg/picsum/<int:pid>/<size>")
+def bg_picsum(pid: int, size: str):
+    def _run() -> Path:
+        w, h = _size(size)
+        src = _picsum_source(pid, w, h)
+        tint, tint_opacity = _tint()
+        if tint is None or tint_opacity <= 0:
+            return src  # grayscale/blur gjør Picsum selv; ingenting å bake inn
+        return image_variant(src, w, h, src_key=src.name, fit="cover", tint=tint, tint_opacity=tint_opacity)
+    return _media_call(_run)
+@bp.get("/bg/image/<size>")
+def bg_image(size: str):
+    def _run() -> Path:
+        w, h = _size(size)
+        raw = (request.args.get("src") or "").strip()
+        if not raw.startswith("/static/"):
+            raise _BadRequest("src må være en lokal /static/-sti")
+        src = (_STATIC / raw[len("/static/"):]).resolve()
+        if _STATIC not in src.parents or not src.is_file():
+            raise _BadRequest("ukjent src")
+        tint, tint_opacity = _tint()
+        fit = "contain" if (request.args.get("fit") or "").lower() == "contain" else "cover"
+        return image_variant(
+            src,
+            w,
+            h,
+            fit=fit,
+            grayscale=_flag("grayscale"),
+            blur=_blur(),
+            tint=tint,
+            tint_opacity=tint_opacity,
+        )
+    return _media_call(_run)
+def _shape(name: str, default: Tuple[float, ...]) -> Tuple[float, float, float, float, float]:
+    raw = request.args.get(name)
+    if not raw:
+        return default  # type: ignore[return-value]
+    try:
+        vals = tuple(float(x) for x in raw.split(","))
+    except ValueError:
+        raise _BadRequest(f"{name} må være fem tall")
+    if len(vals) != 5:
+        raise _BadRequest(f"{name} må være fem tall")
+    # Klemt (radius i vmax styrer lagets pikselstørrelse) og rundet til hele enheter
+    return tuple(float(round(max(lo, min(hi, v)))) for v, (lo, hi) in zip(vals, _SHAPE_LIMITS))  # type: ignore[return-value]
+@bp.get("/bg/dynamic/<size>")
+def bg_dynamic(size: str):
+    """?from=RRGGBB&to=RRGGBB&blur=px&s1=rx,ry,x,y,stop&s2=… (som theme.background.dynamic)."""
+    def _run() -> Path:
+        w, h = _size(size)
+        return dynamic_variant(
+            w,
+            h,
+            color_from=parse_hex(request.args.get("from")) or (0x16, 0x23, 0x3A),
+            color_to=parse_hex(request.args.get("to")) or (0x0E, 0x1A, 0x2F),
+            shape1=_shape("s1", (72, 54, 12, 10, 62)),
+            shape2=_shape("s2", (70, 52, 88, 12, 64)),
+            blur=_blur(),
+        )
+    return _media_call(_run)
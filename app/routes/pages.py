@@ -4,15 +4,34 @@ Sider + kompat-endepunkter + debug/selftest + view-heartbeat.
 Bevisst lettvekts—API-ansvar ligger i routes/api.py.
 """
 from __future__ import annotations
+import ipaddress
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 from flask import Blueprint, send_from_directory, jsonify, request, Response
 from ..settings import PROJECT_ROOT, TZ
-from ..storage import load_config, clear_duration_and_switch_to_daily, replace_config
-from ..countdown import compute_tick, compute_target_ms
+from ..storage import (
+    load_config,
+    load_config_versioned,
+    replace_config,
+    cache_stats,
+    runtime_state,
+)
+from ..countdown import compute_sync, compute_tick, compute_target_ms
+from ..events import ensure_watcher, state_event
+from ..instances import compute_ticks
+from ..displays import resolve_display
+from ..sse import sse_stream
+from ..timesource import get_timesource
+from ..metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render as render_metrics
+from ..auth import require_password
 bp = Blueprint("pages", __name__)
 _STATIC = (PROJECT_ROOT / "static").resolve()
-# Enkel in-memory heartbeat fra visningen (for Admin-synk)
+# Heartbeat fra visningen (for Admin-synk): i minnet pr. prosess, og i tilstandsloggen
+# (delt mellom workere) når rev/side endres eller minst hvert HEARTBEAT_PERSIST_S.
+# Hvorfor struping: visningen sender hvert 10. s; hver av dem skal ikke bli en skriving.
+HEARTBEAT_PERSIST_S = 60
 _LAST_VIEW_HEARTBEAT = {"rev": 0, "ts": None, "page": "view"}  # ts = aware datetime
+_HB_PERSISTED = {"rev": None, "page": None, "ts": None}
 def _json_nostore(payload, status: int = 200) -> Response:
     """Hvorfor: status-/debug-svar skal ikke caches av klient/proxy."""
     resp = jsonify(payload)
@@ -28,13 +47,30 @@ def view_hb_post():
     except Exception:
         rev = 0
         page = "view"
+    now = datetime.now(timezone.utc)
     _LAST_VIEW_HEARTBEAT["rev"] = rev
     _LAST_VIEW_HEARTBEAT["page"] = page
-    _LAST_VIEW_HEARTBEAT["ts"] = datetime.now(timezone.utc)
+    _LAST_VIEW_HEARTBEAT["ts"] = now
+    last = _HB_PERSISTED["ts"]
+    if (
+        last is None
+        or (rev, page) != (_HB_PERSISTED["rev"], _HB_PERSISTED["page"])
+        or (now - last).total_seconds() >= HEARTBEAT_PERSIST_S
+    ):
+        try:
+            runtime_state().append({"view_heartbeat": {"rev": rev, "page": page, "ts_ms": int(now.timestamp() * 1000)}})
+            _HB_PERSISTED.update(rev=rev, page=page, ts=now)
+        except OSError:
+            pass  # heartbeat er bare diagnostikk
     return _json_nostore({"ok": True})
 @bp.get("/debug/view-heartbeat")
 def view_hb_get():
     hb = dict(_LAST_VIEW_HEARTBEAT)
+    shared = runtime_state().get("view_heartbeat")
+    if isinstance(shared, dict) and shared.get("ts_ms"):
+        shared_ts = datetime.fromtimestamp(int(shared["ts_ms"]) / 1000, tz=timezone.utc)
+        if hb.get("ts") is None or shared_ts > hb["ts"]:  # nyere fra en annen worker
+            hb = {"rev": int(shared.get("rev") or 0), "ts": shared_ts, "page": str(shared.get("page") or "view")}
     ts = hb.get("ts")
     hb["ts_iso"] = ts.isoformat() if ts else None
     hb["age_seconds"] = (
@@ -58,12 +94,43 @@ def health():
     return _json_nostore({"ok": True})
 @bp.get("/tick")
 def tick():
-    cfg = load_config()
-    t = compute_tick(cfg)
-    if t["state"] == "ended" and cfg.get("mode") == "duration":
-        clear_duration_and_switch_to_daily()
+    """
+    Uten ids: tick for roten (som før), eller for skjermprofilen i ?display=.
+    Med ?ids=a,b,c (eller ids=*): alle instansene i ett svar med felles now_ms:
+    { now_ms, cfg_rev, cfg_etag, ticks: {id: tick}, missing }.
+    """
+    ids_arg = request.args.get("ids")
+    if ids_arg is not None:
+        cfg, etag = load_config_versioned()
+        ids = None if ids_arg.strip() == "*" else [i for i in (x.strip() for x in ids_arg.split(",")) if i]
+        now_ms, ticks, missing = compute_ticks(cfg, etag, ids)
+        return _json_nostore(
+            {
+                "now_ms": now_ms,
+                "cfg_rev": int(cfg.get("_updated_at", 0)),
+                "cfg_etag": etag,
+                "ticks": ticks,
+                "missing": missing,
+            }
+        )
+    cfg, etag = resolve_display(request.args.get("display"))
+    t = compute_tick(cfg)  # ren leser: utløp av 'duration' håndteres av scheduler.py
     t["cfg_rev"] = int(cfg.get("_updated_at", 0))
+    t["cfg_etag"] = etag
     return _json_nostore(t)
+@bp.get("/sync")
+def sync():
+    """Klientside-tick: target + terskler + now_ms; klienten regner fasene selv (?display=)."""
+    cfg, etag = resolve_display(request.args.get("display"))
+    s = compute_sync(cfg)
+    s["cfg_rev"] = int(cfg.get("_updated_at", 0))
+    s["cfg_etag"] = etag
+    return _json_nostore(s)
+@bp.get("/events")
+def events():
+    """SSE: 'state' ved overganger, 'config' ved lagring, 'ping' hvert 15. sek."""
+    ensure_watcher()
+    return sse_stream(initial=[state_event()])
 @bp.get("/state")
 def state_snapshot():
     cfg = load_config()
@@ -88,6 +155,29 @@ def dbg_whoami():
             "server_time": datetime.now(TZ).isoformat(),
         }
     )
+@bp.get("/debug/time")
+def dbg_time():
+    """Tidskilden bak tick: avvik mot systemklokka, drift og gjenstående slew."""
+    return _json_nostore({"ok": True, "time": get_timesource().stats()})
+def _metrics_response() -> Response:
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE, headers={"Cache-Control": "no-store"})
+@require_password
+def _metrics_authed() -> Response:
+    return _metrics_response()
+def _is_loopback(addr: Optional[str]) -> bool:
+    try:
+        return ipaddress.ip_address(addr or "").is_loopback
+    except ValueError:
+        return False
+@bp.get("/metrics")
+def metrics():
+    """
+    Prometheus-skrape: rute-latens, storage- og subprosess-tider (se app/metrics.py).
+    Åpen fra localhost (lokal Prometheus/agent); andre må autentisere som admin.
+    """
+    if _is_loopback(request.remote_addr):
+        return _metrics_response()
+    return _metrics_authed()
 @bp.get("/debug/config")
 def dbg_config():
     write_test = request.args.get("write_test") == "1"
@@ -107,6 +197,7 @@ def dbg_config():
             result["write_test_ok"] = False
             result["error"] = str(e)
     result["config"] = cfg
+    result["cache"] = cache_stats()
     return _json_nostore(result)
 @bp.get("/debug/selftest")
 def dbg_selftest():
@@ -0,0 +1,135 @@
+# File: app/scheduler.py
+"""
+Bakgrunnsplanlegger: tidsstyrte config-overganger uten at lese-endepunkter skriver.
+- DurationExpiry: når en 'duration'-nedtelling er ferdig (target + overrun), settes
+  mode tilbake til 'daily' – én gang, på beregnet tidspunkt.
+- PicsumRotation: bytter Picsum-bilde én gang pr. intervall og sender SSE 'picsum'.
+Hvorfor: /tick ryddet tidligere selv, og hver skjerm drev rotasjonen via
+GET /api/picsum/next, så pollere kappløp om samme skriving. Nå er /tick, /sync
+og /api/picsum/next rene lesere.
+Idempotent på tvers av gunicorn-workere: hver worker kjører sin egen tråd, men
+jobben sjekker betingelsen på nytt inne i storage.update_config (fil-lås), så
+bare den første faktisk skriver; de andre ser ny config og gjør ingenting.
+Tråden sover til neste frist, vekkes ved lokal lagring og sjekker ellers config
+hvert RECHECK_S (skrivinger fra andre workere sees via stat()).
+Av: COUNTDOWN_SCHEDULER=0 (brukes i tester).
+"""
+from __future__ import annotations
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+from . import countdown
+from .countdown import compute_target_ms
+from .picsum import apply_rotation, rotation_state
+from .storage import load_config, update_config
+__all__ = [
+    "Job",
+    "DurationExpiry",
+    "PicsumRotation",
+    "JOBS",
+    "run_due",
+    "ensure_scheduler",
+    "wake",
+]
+log = logging.getLogger(__name__)
+RECHECK_S = 5.0
+_FAIL_BACKOFF_S = 5.0
+class Job:
+    """Grensesnitt: next_due(cfg, now_ms) → ms eller None; run(now_ms) gjør jobben."""
+    name = "job"
+    def next_due(self, cfg: Dict[str, Any], now_ms: int) -> Optional[int]:
+        raise NotImplementedError
+    def run(self, now_ms: int) -> None:
+        raise NotImplementedError
+class DurationExpiry(Job):
+    name = "duration_expiry"
+    @staticmethod
+    def _end_ms(cfg: Dict[str, Any], now_ms: int) -> Optional[int]:
+        if cfg.get("mode") != "duration" or int(cfg.get("duration_started_ms") or 0) <= 0:
+            return None
+        target_ms = compute_target_ms(cfg, now_ms=now_ms)
+        if target_ms <= 0:
+            return None
+        # Samme grense som compute_schedule 'ended': første ms etter overrun-vinduet
+        return target_ms + int(cfg.get("overrun_minutes", 1)) * 60_000 + 1
+    def next_due(self, cfg: Dict[str, Any], now_ms: int) -> Optional[int]:
+        return self._end_ms(cfg, now_ms)
+    def run(self, now_ms: int) -> None:
+        def _expire(cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            end = self._end_ms(cfg, now_ms)
+            if end is None or end > now_ms:
+                return None  # allerede ryddet (annen worker) eller ny nedtelling startet
+            cfg["duration_started_ms"] = 0
+            cfg["mode"] = "daily"
+            return cfg
+        update_config(_expire)
+class PicsumRotation(Job):
+    name = "picsum_rotation"
+    def next_due(self, cfg: Dict[str, Any], now_ms: int) -> Optional[int]:
+        return rotation_state(cfg)["next_switch_ms"]
+    def run(self, now_ms: int) -> None:
+        rotated: Dict[str, int] = {}
+        def _rotate(cfg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            new_id = apply_rotation(cfg, now_ms)  # sjekkes på nytt under lås
+            if new_id is None:
+                return None
+            rotated["id"] = new_id
+            return cfg
+        cfg = update_config(_rotate)
+        if "id" in rotated:
+            from .events import notify_picsum_rotated  # lat: events trekker inn SSE
+            notify_picsum_rotated(rotated["id"], rotation_state(cfg)["next_switch_ms"])
+JOBS: List[Job] = [DurationExpiry(), PicsumRotation()]
+def run_due(now_ms: Optional[int] = None) -> List[str]:
+    """Kjør alle jobber som har forfalt nå. Returnerer navnene på jobbene som kjørte."""
+    now_ms = now_ms if now_ms is not None else countdown._now_ms()
+    cfg = load_config()
+    ran: List[str] = []
+    for job in JOBS:
+        due = job.next_due(cfg, now_ms)
+        if due is not None and due <= now_ms:
+            job.run(now_ms)
+            ran.append(job.name)
+    return ran
+def _next_wait_s() -> float:
+    now_ms = countdown._now_ms()
+    cfg = load_config()
+    wait_s = RECHECK_S
+    for job in JOBS:
+        due = job.next_due(cfg, now_ms)
+        if due is not None:
+            wait_s = min(wait_s, max(0.0, (due - now_ms) / 1000))
+    return wait_s
+_wake = threading.Event()
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"thread": None, "pid": None}
+def wake() -> None:
+    """Planlegg på nytt nå (kalles etter lokal lagring)."""
+    _wake.set()
+def _loop() -> None:
+    while True:
+        try:
+            run_due()
+            wait_s = _next_wait_s()
+        except Exception:
+            log.exception("planlegger: jobb feilet")
+            wait_s = _FAIL_BACKOFF_S
+        _wake.wait(wait_s)
+        _wake.clear()
+def ensure_scheduler() -> None:
+    """Start planleggeren i denne prosessen (én gang pr. pid; trygt etter fork)."""
+    if (os.environ.get("COUNTDOWN_SCHEDULER") or "1").strip() == "0":
+        return
+    pid = os.getpid()
+    th = _state["thread"]
+    if th is not None and _state["pid"] == pid and th.is_alive():
+        return
+    with _lock:
+        th = _state["thread"]
+        if th is not None and _state["pid"] == pid and th.is_alive():
+            return
+        th = threading.Thread(target=_loop, name="countdown-scheduler", daemon=True)
+        _state["thread"] = th
+        _state["pid"] = pid
+        th.start()
@@ -3,8 +3,35 @@
 Grunninnstillinger (baner og TZ).
 """
 from __future__ import annotations
+import logging
+import os
+import stat
+import tempfile
 from pathlib import Path
 from zoneinfo import ZoneInfo
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 CONFIG_PATH = PROJECT_ROOT / "config.json"
 TZ = ZoneInfo("Europe/Oslo")
+log = logging.getLogger(__name__)
+def private_run_dir(name: str) -> str:
+    """
+    Katalog for sockets/delte filer mellom workere: $XDG_RUNTIME_DIR/<name>, ellers
+    <tmp>/<name>-<uid> hvis den er vår og ikke skrivbar for andre, ellers .cache/<name>.
+    Hvorfor: /tmp er delt; en annen lokal bruker kan opprette katalogen først og
+    plante sockets eller filer der.
+    """
+    xdg = (os.environ.get("XDG_RUNTIME_DIR") or "").strip()
+    if xdg and os.path.isdir(xdg):
+        return os.path.join(xdg, name)
+    path = os.path.join(tempfile.gettempdir(), f"{name}-{os.getuid()}")
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+        if stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o022:
+            return path
+        log.warning("%s er ikke privat (eier/rettigheter) – bruker prosjektets .cache", path)
+    except OSError:
+        log.warning("kunne ikke opprette %s – bruker prosjektets .cache", path, exc_info=True)
+    fallback = PROJECT_ROOT / ".cache" / name
+    fallback.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return str(fallback)
@@ -4,28 +4,47 @@ Server-Sent Events (SSE) med robust subscriber-kø og periodisk ping.
 Hvorfor denne implementasjonen:
 - Unngå backpressure: hver klient har sin egen bounded Queue; ved overflow droppes
   kun den klientens kø (klienten reconnecter).
+- Serialiser én gang: publish() bygger ferdig wire-ramme (bytes) og legger samme
+  uforanderlige buffer i alle køer; generatorene gjør bare yield.
 - Tråd-sikkerhet: subscribers-set beskyttes av _sub_lock.
+- Fler-prosess: publish() går via en utbyttbar backend (se broker.py), slik at
+  hendelser når klienter på alle gunicorn-workere, ikke bare den som skrev.
 - Typestøy/Pylance: vi bruker stream_with_context på selve generator-objektet
   (ikke som dekorator på funksjonen) for å unngå "Expected 1 more positional argument".
 """
 from __future__ import annotations
 import json
+import logging
+import os
 import queue
 import threading
 import time
 from dataclasses import dataclass, field
-from typing import Dict, Iterator, Set
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
 from flask import Response, stream_with_context
-__all__ = ["publish", "sse_stream"]
+from .broker import Backend, InMemoryBackend, default_backend
+__all__ = [
+    "publish",
+    "sse_stream",
+    "subscribe",
+    "unsubscribe",
+    "subscriber_count",
+    "set_backend",
+    "encode_frame",
+]
+log = logging.getLogger(__name__)
 # --- intern global tilstand ---------------------------------------------------
-_subscribers: Set["SSEQueue"] = set()
+_subscribers: Set[Any] = set()
 _sub_lock = threading.Lock()
 _event_id = 0
-@dataclass
+_backend: Optional[Backend] = None
+_backend_pid = 0
+_backend_lock = threading.Lock()
+@dataclass(eq=False)  # hvorfor: må være hashbar (ligger i et set)
 class SSEQueue:
-    q: "queue.Queue[Dict]"
+    q: "queue.Queue[bytes]"
     created: float = field(default_factory=time.time)
-    def put_nowait(self, item: Dict) -> None:
+    def put_nowait(self, item: bytes) -> None:
         try:
             self.q.put_nowait(item)
         except queue.Full:
@@ -37,20 +56,62 @@ class SSEQueue:
                     self.q.get_nowait()
             except queue.Empty:
                 pass
+def subscribe(sub: Any) -> None:
+    """
+    Registrer en abonnent: alt med put_nowait(frame: bytes) som aldri blokkerer
+    (SSEQueue for WSGI-tråder, AsyncSubscriber i asgi.py for asyncio).
+    """
+    _get_backend()  # hvorfor: workeren må lytte på relayet før første hendelse
+    with _sub_lock:
+        _subscribers.add(sub)
+def unsubscribe(sub: Any) -> None:
+    with _sub_lock:
+        _subscribers.discard(sub)
 def _new_queue(maxsize: int = 100) -> "SSEQueue":
     sq = SSEQueue(queue.Queue(maxsize=maxsize))
-    with _sub_lock:
-        _subscribers.add(sq)
+    subscribe(sq)
     return sq
 def _remove_queue(sq: "SSEQueue") -> None:
+    unsubscribe(sq)
+# --- backend ------------------------------------------------------------------
+def _deliver_local(frame: bytes) -> None:
     with _sub_lock:
-        _subscribers.discard(sq)
+        targets = list(_subscribers)  # kopi for sikker iterasjon
+    for sub in targets:
+        sub.put_nowait(frame)
+def _get_backend() -> Backend:
+    """Lat init pr. prosess (gunicorn forker etter import ved --preload)."""
+    global _backend, _backend_pid
+    with _backend_lock:
+        if _backend is None or _backend_pid != os.getpid():
+            b = default_backend()
+            try:
+                b.start(_deliver_local)
+            except Exception:
+                log.warning("SSE-relay utilgjengelig – faller tilbake til in-memory", exc_info=True)
+                b = InMemoryBackend()
+                b.start(_deliver_local)
+            _backend, _backend_pid = b, os.getpid()
+        return _backend
+def set_backend(backend: Optional[Backend]) -> None:
+    """Bytt backend (tester). None → velg standard på nytt ved neste bruk."""
+    global _backend, _backend_pid
+    with _backend_lock:
+        old = _backend
+        _backend, _backend_pid = backend, os.getpid()
+        if backend is not None:
+            backend.start(_deliver_local)
+    if old is not None and old is not backend:
+        old.close()
 # --- public API ---------------------------------------------------------------
-def publish(event: Dict) -> None:
+def publish(event: Dict, *, broadcast: bool = True) -> None:
     """
     Publiser en hendelse til alle abonnenter.
     Forventer et dict med minst 'type' (streng).
     Legger til 'ts' (epoch sek) og auto-inkrementert 'id' på wire-formatet.
+    Rammen kodes til bytes én gang, uansett antall abonnenter.
+    broadcast=False leverer kun til denne workerens klienter (for hendelser
+    som hver worker uansett avleder selv, f.eks. tilstandsoverganger).
     """
     global _event_id
     etype = event.get("type") or "message"
@@ -59,40 +120,46 @@ def publish(event: Dict) -> None:
     with _sub_lock:
         _event_id += 1
         eid = _event_id
-        targets = list(_subscribers)  # kopi for sikker iterasjon
-    wire = {"id": eid, "type": etype, "data": payload}
-    for sub in targets:
-        sub.put_nowait(wire)
+    frame = encode_frame(eid, etype, payload)
+    if broadcast:
+        _get_backend().publish(frame)
+    else:
+        _deliver_local(frame)
+def subscriber_count() -> int:
+    with _sub_lock:
+        return len(_subscribers)
 # --- helpers ------------------------------------------------------------------
-def _format_sse(wire: Dict) -> str:
-    """Konverter internt event til SSE-linjer (event + JSON-data)."""
-    eid = wire.get("id", 0)
-    etype = wire.get("type", "message")
-    data = wire.get("data", {})
+def encode_frame(eid: int, etype: str, data: Any) -> bytes:
+    """Bygg én SSE-ramme (id + event + JSON-data) som UTF-8 bytes."""
     body = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
-    return f"id: {eid}\nevent: {etype}\ndata: {body}\n\n"
+    return f"id: {eid}\nevent: {etype}\ndata: {body}\n\n".encode("utf-8")
+RETRY_FRAME = b"retry: 15000\n\n"
+PING_INTERVAL_S = 15.0
 # --- stream endpoint ----------------------------------------------------------
-def sse_stream(ping_interval: float = 15.0) -> Response:
+def sse_stream(
+    ping_interval: float = PING_INTERVAL_S, initial: Optional[Iterable[Dict]] = None
+) -> Response:
     """
     Flask-respons som holder en SSE-strøm åpen.
-    Sender 'retry' først, så periodiske 'ping' for å holde forbindelsen varm.
+    Sender 'retry' først, deretter ev. `initial` (øyeblikksbilde til ny klient),
+    så periodiske 'ping' for å holde forbindelsen varm.
     """
-    def generate() -> Iterator[str]:
+    first = list(initial or [])
+    def generate() -> Iterator[bytes]:
         sq = _new_queue()
         try:
             # Hint til klient om re-tilkoblingsintervall
-            yield "retry: 15000\n\n"
+            yield RETRY_FRAME
+            for ev in first:
+                yield encode_frame(0, ev.get("type") or "message", ev)
             last_ping = time.time()
             while True:
                 timeout = max(0.1, ping_interval - (time.time() - last_ping))
                 try:
-                    wire = sq.q.get(timeout=timeout)
-                    yield _format_sse(wire)
+                    yield sq.q.get(timeout=timeout)
                 except queue.Empty:
                     last_ping = time.time()
-                    yield _format_sse(
-                        {"id": 0, "type": "ping", "data": {"ts": last_ping}}
-                    )
+                    yield encode_frame(0, "ping", {"ts": last_ping})
         except (GeneratorExit, BrokenPipeError, ConnectionError):
             # Klient koblet fra
             pass
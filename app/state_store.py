@@ -0,0 +1,182 @@
+# File: app/state_store.py
+"""
+Liten tilstandslogg for verdier som endres ofte under kjøring (duration-start,
+picsum-rotasjon, _updated_at, heartbeat fra visningen).
+Format: JSON lines ved siden av config.json (config.state.jsonl). Hver linje er et
+kompakt objekt med endrede nøkler ({"nøkkel": verdi}, null = slett); linjene leses
+i rekkefølge og siste verdi vinner.
+Hvorfor: før skrev hver rotasjon/start hele config.json (tema + katalog) med fsync.
+En append på noen titalls byte sliter langt mindre på SD-kortet; config.json
+skrives bare når admin faktisk endrer noe.
+- Append uten fsync som standard (durable=True gir fdatasync for verdier som ikke
+  bør gå tapt ved strømbrudd, f.eks. en startet nedtelling).
+- Lesing er inkrementell: bare bytes etter forrige posisjon parses (stat-treff = ingenting).
+- Etter COMPACT_LINES linjer skrives ett øyeblikksbilde (tmp + os.replace, fsync).
+- En halvskrevet siste linje (krasj) hoppes over; neste append starter på ny linje.
+- Kryssprosess: flock på <sti>.lock rundt append og komprimering.
+"""
+from __future__ import annotations
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - ikke-POSIX (utvikling på Windows)
+    fcntl = None  # type: ignore[assignment]
+__all__ = ["COMPACT_LINES", "StateLog", "state_path_for", "get_state_log"]
+COMPACT_LINES = 256
+Sig = Tuple[int, int, int]
+def state_path_for(config_path: Any) -> str:
+    """config.json → config.state.jsonl i samme katalog."""
+    root, _ext = os.path.splitext(str(config_path))
+    return root + ".state.jsonl"
+def _encode(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+class _FileLock:
+    """Eksklusiv flock på <sti>.lock (ingen lås der fcntl mangler)."""
+    def __init__(self, path: str) -> None:
+        self.path = path + ".lock"
+        self._fd: Optional[int] = None
+    def __enter__(self) -> "_FileLock":
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+    def __exit__(self, *exc: Any) -> None:
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+class StateLog:
+    """Nøkkel/verdi-tilstand i en append-only fil. Trådsikker; delt mellom prosesser."""
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, Any] = {}
+        self._sig: Optional[Sig] = None
+        self._ino: Optional[int] = None
+        self._pos = 0  # bytes lest og anvendt
+        self._size = 0  # filstørrelse ved siste stat (> _pos: halvskrevet linje)
+        self._lines = 0
+    def _reset(self) -> None:
+        self._data = {}
+        self._sig = None
+        self._ino = None
+        self._pos = self._size = self._lines = 0
+    def _apply(self, rec: Any) -> None:
+        if not isinstance(rec, dict):
+            return
+        for k, v in rec.items():
+            if v is None:
+                self._data.pop(k, None)
+            else:
+                self._data[k] = v
+    def _refresh_locked(self) -> Optional[Sig]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            return None
+        sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if sig == self._sig:
+            return sig
+        if st.st_ino != self._ino or st.st_size < self._pos:
+            self._reset()  # ny fil (komprimert eller erstattet): les fra start
+        try:
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                f.seek(self._pos)
+                chunk = f.read(st.st_size - self._pos)
+        except FileNotFoundError:
+            self._reset()
+            return None
+        end = chunk.rfind(b"\n") + 1  # bare hele linjer; resten kan være under skriving
+        for line in chunk[:end].splitlines():
+            if not line.strip():
+                continue
+            self._lines += 1
+            try:
+                self._apply(json.loads(line))
+            except ValueError:
+                continue  # halvskrevet linje fra et krasj
+        self._pos += end
+        self._size = st.st_size
+        self._ino = st.st_ino
+        self._sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+        return self._sig
+    def stat_sig(self) -> Optional[Sig]:
+        """Filens signatur (bare stat); endres ved hver append."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    def read(self) -> Tuple[Optional[Sig], Dict[str, Any]]:
+        """(signatur, tilstand). Verdiene deles og skal ikke muteres."""
+        with self._lock:
+            sig = self._refresh_locked()
+            return sig, dict(self._data)
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.read()[1].get(key, default)
+    def append(self, changes: Dict[str, Any], *, durable: bool = False) -> Tuple[Optional[Sig], Dict[str, Any]]:
+        """Skriv endringene (None = slett nøkkel) som én linje. Returnerer som read()."""
+        if not changes:
+            return self.read()
+        with self._lock, _FileLock(self.path):
+            self._refresh_locked()
+            if self._lines + 1 > COMPACT_LINES:
+                self._apply(changes)
+                self._compact_locked()
+                return self._sig, dict(self._data)
+            payload = _encode(changes)
+            if self._size > self._pos:
+                payload = b"\n" + payload  # avslutt en halvskrevet linje
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, payload)
+                if durable:
+                    getattr(os, "fdatasync", os.fsync)(fd)
+                st = os.fstat(fd)
+            finally:
+                os.close(fd)
+            self._apply(changes)
+            self._lines += 1
+            self._pos = self._size = st.st_size
+            self._ino = st.st_ino
+            self._sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+            return self._sig, dict(self._data)
+    def _compact_locked(self) -> None:
+        dirpath = os.path.dirname(self.path) or "."
+        os.makedirs(dirpath, exist_ok=True)
+        payload = _encode(self._data) if self._data else b""
+        fd, tmp = tempfile.mkstemp(prefix=".state.", dir=dirpath)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+                st = os.fstat(f.fileno())
+            os.replace(tmp, self.path)
+        finally:
+            try:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+            except Exception:
+                pass
+        self._lines = 1 if payload else 0
+        self._pos = self._size = st.st_size
+        self._ino = st.st_ino
+        self._sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+_logs: Dict[str, StateLog] = {}
+_logs_lock = threading.Lock()
+def get_state_log(path: str) -> StateLog:
+    """Én StateLog pr. sti i prosessen (inkrementell lesing deles)."""
+    log = _logs.get(path)
+    if log is None:
+        with _logs_lock:
+            log = _logs.setdefault(path, StateLog(path))
+    return log
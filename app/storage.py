@@ -1,22 +1,42 @@
 # File: app/storage.py
 # Purpose: Enkelt, moderne config-IO uten legacy. Kun size_vmin. Lager 'layer' i dynamic-bg.
 from __future__ import annotations
+import hashlib
 import json
 import os
+import re
 import tempfile
+import threading
 import time
-from typing import Any, Dict, Tuple, List, Optional, cast
+from typing import Any, Callable, Dict, Tuple, List, Optional, cast
 from datetime import datetime
 from .settings import CONFIG_PATH
+from .recurrence import sanitize_calendar
+from .state_store import StateLog, get_state_log, state_path_for
+from .metrics import STORAGE_LATENCY
 from collections import OrderedDict
+from types import MappingProxyType
 from typing import Mapping
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - ikke-POSIX (utvikling på Windows)
+    fcntl = None  # type: ignore[assignment]
 # ── defaults ──────────────────────────────────────────────────────────────────
+MODES = ("daily", "once", "duration", "calendar", "clock")
 _DEFAULTS: Dict[str, Any] = {
     "mode": "daily",
     "daily_time": "19:15",
     "once_at": "",
     "duration_minutes": 20,
     "duration_started_ms": 0,
+    # mode 'calendar': ukentlige regler + unntak (se recurrence.py)
+    "calendar": {"rules": [], "exceptions": []},
+    # Navngitte nedtellinger (rom): {id: {label?, mode?, daily_time?, ...}}; felter som
+    # mangler arves fra roten. Evalueres samlet av instances.compute_ticks (/tick?ids=)
+    "instances": {},
+    # Skjermprofiler (/?display=navn): tema/overlays/meldinger pr. skjerm over felles
+    # config, valgfritt bundet til en instans. Se displays.py
+    "displays": {},
     "show_target_time": True,
     "target_time_after": "secondary",
     "messages_position": "above",
@@ -119,6 +139,57 @@ _DEFAULTS: Dict[str, Any] = {
     "overlays": [],
     "admin_password": None,
 }
+# Frossen kopi av _DEFAULTS (MappingProxyType/tuple) som deles av alle kall.
+# Hvorfor: load_config/_coerce/save_config_patch bygde tidligere hele
+# defaults-treet på nytt (json.loads(json.dumps(...))) flere ganger pr. kall;
+# nå legges config over med _overlay og bare urørte deltrær kopieres.
+def _freeze(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+_MAP_TYPES = (dict, MappingProxyType)
+_SEQ_TYPES = (list, tuple)
+def _thaw(obj: Any) -> Any:
+    """Muterbar dyp kopi (dict/list) av et frosset eller vanlig JSON-tre."""
+    # Hvorfor type() og ikke isinstance(Mapping): ABC-sjekker er tregere enn
+    # selve kopien; skalarer returneres uten rekursivt kall.
+    t = type(obj)
+    if t in _MAP_TYPES:
+        return {
+            k: (_thaw(v) if type(v) in _MAP_TYPES or type(v) in _SEQ_TYPES else v)
+            for k, v in obj.items()
+        }
+    if t in _SEQ_TYPES:
+        return [_thaw(v) if type(v) in _MAP_TYPES or type(v) in _SEQ_TYPES else v for v in obj]
+    return obj
+def _overlay(base: Mapping[str, Any], src: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """
+    Som _deep_merge(_thaw(base), src), men uten å kopiere base først: nøkler fra
+    src tas by-reference (som _deep_merge), urørte deltrær av base tines.
+    Nøkkelrekkefølge: base først, deretter ekstra nøkler fra src.
+    """
+    if not src:
+        return _thaw(base)
+    out: Dict[str, Any] = {}
+    hits = 0
+    for k, bv in base.items():
+        if k in src:
+            hits += 1
+            sv = src[k]
+            if type(bv) is MappingProxyType and isinstance(sv, dict):
+                out[k] = _overlay(bv, sv)
+            else:
+                out[k] = sv
+        else:
+            out[k] = _thaw(bv)
+    if hits < len(src):
+        for k, sv in src.items():
+            if k not in out:
+                out[k] = sv
+    return out
+_FROZEN_DEFAULTS: Mapping[str, Any] = _freeze(_DEFAULTS)
 # --- compact JSON support for selected lists ---------------------------------
 class _CompactList(list):
     """Marker lister som skal skrives som ett objekt per linje."""
@@ -171,8 +242,10 @@ def build_visual_reset_patch(
 ) -> Dict[str, Any]:
     """
     Bygger en minimal PATCH basert på _DEFAULTS.
+    `defaults` kan være frosset (frozen_defaults()); bare delene som havner i
+    patchen kopieres (_thaw), så patchen er alltid trygg å mutere.
     """
-    d = json.loads(json.dumps(defaults))  # dyp kopi
+    d = defaults
     patch: Dict[str, Any] = {}
     # Top-level faser
     if phase_colors:
@@ -194,8 +267,8 @@ def build_visual_reset_patch(
     theme_patch: Dict[str, Any] = {}
     if theme_messages:
         theme_patch["messages"] = {
-            "primary": d["theme"]["messages"]["primary"],
-            "secondary": d["theme"]["messages"]["secondary"],
+            "primary": _thaw(d["theme"]["messages"]["primary"]),
+            "secondary": _thaw(d["theme"]["messages"]["secondary"]),
         }
     if digits:
         theme_patch["digits"] = {"size_vmin": d["theme"]["digits"]["size_vmin"]}
@@ -206,13 +279,13 @@ def build_visual_reset_patch(
         if bg_mode:
             bgp["mode"] = b["mode"]
         if bg_solid:
-            bgp["solid"] = b["solid"]
+            bgp["solid"] = _thaw(b["solid"])
         if bg_gradient:
-            bgp["gradient"] = b["gradient"]
+            bgp["gradient"] = _thaw(b["gradient"])
         if bg_image:
-            bgp["image"] = b["image"]
+            bgp["image"] = _thaw(b["image"])
         if bg_picsum:
-            picsum = dict(b.get("picsum") or {})
+            picsum = _thaw(b.get("picsum") or {})
             # VIKTIG: Nullstill id eksplisitt når flagget er True
             if bg_picsum_id:
                 picsum["id"] = None  # -> _coerce() fjerner den
@@ -221,7 +294,7 @@ def build_visual_reset_patch(
                 picsum.pop("id", None)
             bgp["picsum"] = picsum
         if bg_dynamic:
-            bgp["dynamic"] = b["dynamic"]
+            bgp["dynamic"] = _thaw(b["dynamic"])
         theme_patch["background"] = bgp
     if theme_patch:
         patch["theme"] = theme_patch
@@ -244,7 +317,10 @@ def build_visual_reset_patch(
     return patch
 # ── utils ─────────────────────────────────────────────────────────────────────
 def get_defaults() -> Dict[str, Any]:
-    return json.loads(json.dumps(_DEFAULTS))  # dyp kopi
+    return _thaw(_FROZEN_DEFAULTS)  # muterbar dyp kopi
+def frozen_defaults() -> Mapping[str, Any]:
+    """Skrivebeskyttet defaults-tre (delt, ingen kopi)."""
+    return _FROZEN_DEFAULTS
 def _order_like_defaults(
     defaults: Mapping[str, Any], data: Dict[str, Any]
 ) -> "OrderedDict[str, Any]":
@@ -273,81 +349,107 @@ def _order_like_defaults(
             ordered[key] = data_value
     return ordered
 # --- robust, stabil JSON-dumper med støtte for _CompactList -------------------
-def _write_json_value(fp, value: Any, indent: int, level: int) -> None:
-    """Skriver JSON-verdier deterministisk. Unngår private encoder-APIer."""
-    indent_current = " " * (indent * level)
-    indent_inner = " " * (indent * (level + 1))
-    if isinstance(value, dict) or isinstance(value, OrderedDict):
-        items = list(value.items())
-        if not items:
-            fp.write("{}")
+# Hvorfor: den gamle dumperen skrev hver nøkkel/skalar med egne fp.write + json.dumps;
+# med stor picsum_catalog dominerte det lagringstiden. Nå bygges én liste med biter
+# (C-koderne fra json for strenger/kompakte elementer) og skrives med én join.
+# Utdata er byte-identisk med før (samme som json.dumps(indent=2) + _CompactList).
+_enc_str = json.encoder.encode_basestring  # type: ignore[attr-defined]  # == json.dumps(str, ensure_ascii=False)
+_enc_line = json.JSONEncoder(ensure_ascii=False, separators=(",", ": ")).encode
+_enc_compact = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+def _encode_scalar(value: Any) -> str:
+    if isinstance(value, str):
+        return _enc_str(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if type(value) is int:
+        return int.__repr__(value)
+    return json.dumps(value, ensure_ascii=False)  # float (NaN/Infinity), tupler, subklasser
+def _encode_value(parts: List[str], value: Any, indent: int, level: int) -> None:
+    """Legger JSON-biter for value til parts (ingen skriving)."""
+    if isinstance(value, dict):
+        if not value:
+            parts.append("{}")
             return
-        fp.write("{\n")
-        for i, (k, v) in enumerate(items):
-            fp.write(f"{indent_inner}{json.dumps(k, ensure_ascii=False)}: ")
-            _write_json_value(fp, v, indent, level + 1)
-            if i < len(items) - 1:
-                fp.write(",\n")
-            else:
-                fp.write("\n")
-        fp.write(f"{indent_current}}}")
+        inner = "\n" + " " * (indent * (level + 1))
+        sep = "{"
+        for k, v in value.items():
+            parts.append(sep)
+            parts.append(inner)
+            parts.append(_enc_str(k) if isinstance(k, str) else json.dumps(k, ensure_ascii=False))
+            parts.append(": ")
+            _encode_value(parts, v, indent, level + 1)
+            sep = ","
+        parts.append("\n" + " " * (indent * level) + "}")
         return
     if isinstance(value, list):
-        # Kompakt én-linje-per-objekt for _CompactList
-        if isinstance(value, _CompactList):
-            if not value:
-                fp.write("[]")
-                return
-            fp.write("[\n")
-            lines = []
-            for item in value:
-                lines.append(
-                    f"{indent_inner}{json.dumps(item, ensure_ascii=False, separators=(',', ': '))}"
-                )
-            fp.write(",\n".join(lines))
-            fp.write(f"\n{indent_current}]")
-            return
-        # Vanlige lister: pent med indent
         if not value:
-            fp.write("[]")
+            parts.append("[]")
             return
-        fp.write("[\n")
-        for i, item in enumerate(value):
-            fp.write(indent_inner)
-            _write_json_value(fp, item, indent, level + 1)
-            if i < len(value) - 1:
-                fp.write(",\n")
-            else:
-                fp.write("\n")
-        fp.write(f"{indent_current}]")
+        inner = "\n" + " " * (indent * (level + 1))
+        if isinstance(value, _CompactList):
+            # Kompakt: ett element per linje
+            parts.append("[" + inner + ("," + inner).join(map(_enc_line, value)))
+        else:
+            sep = "["
+            for item in value:
+                parts.append(sep)
+                parts.append(inner)
+                _encode_value(parts, item, indent, level + 1)
+                sep = ","
+        parts.append("\n" + " " * (indent * level) + "]")
         return
-    # Skalarer
-    fp.write(json.dumps(value, ensure_ascii=False))
-def _dump_json_to_file(fp, obj: Any, indent: int = 2) -> None:
-    """Skriver `obj` til fp med ønsket layout og avsluttende linjeskift."""
-    _write_json_value(fp, obj, indent=indent, level=0)
-    fp.write("\n")
-def _atomic_write(path: str, data: Dict[str, Any]) -> None:
+    parts.append(_encode_scalar(value))
+def _encode_json(obj: Any, indent: int = 2, *, compact: bool = False) -> str:
+    """
+    Hele dokumentet som én streng med avsluttende linjeskift.
+    compact=True: én linje uten mellomrom (maskinlest tilstand, ikke for mennesker).
+    """
+    if compact:
+        return _enc_compact(obj) + "\n"
+    parts: List[str] = []
+    _encode_value(parts, obj, indent, 0)
+    parts.append("\n")
+    return "".join(parts)
+def _dump_json_to_file(fp, obj: Any, indent: int = 2, *, compact: bool = False) -> None:
+    """Skriver `obj` til fp med ønsket layout og avsluttende linjeskift (ett write-kall)."""
+    fp.write(_encode_json(obj, indent, compact=compact))
+def _atomic_write(path: str, data: Dict[str, Any]) -> Tuple[Tuple[int, int, int], str]:
     """
     Atomisk skriving til path.
     - Rekkefølgen styres av _DEFAULTS (rekursivt), ikke alfabetisk sortering.
     - Ekstra nøkler (ikke i defaults) plasseres etter defaults-seksjonen.
     - Lister som er merket med _CompactList skrives kompakt (ett element per linje).
+    Returnerer (stat-signatur, etag) for den skrevne filen (se _stat_sig/_etag_of).
     """
+    t0 = time.perf_counter()
+    try:
+        return _atomic_write_impl(path, data)
+    finally:
+        STORAGE_LATENCY.observe(time.perf_counter() - t0, "atomic_write")
+def _atomic_write_impl(path: str, data: Dict[str, Any]) -> Tuple[Tuple[int, int, int], str]:
     dirpath = os.path.dirname(path) or "."
     os.makedirs(dirpath, exist_ok=True)
     # 1) Kanoniser rekkefølge etter _DEFAULTS
     serializable = _order_like_defaults(_DEFAULTS, data)
     # 2) Merk lister som skal være kompakte (f.eks. "picsum_catalog")
     serializable = _mark_compact_lists(serializable)
-    # 3) Dump med robust egen-dumper (unngår private json internals)
+    # 3) Serialiser i én omgang (se _encode_json)
+    payload = _encode_json(serializable, indent=2).encode("utf-8")
     fd, tmp = tempfile.mkstemp(prefix=".config.", dir=dirpath)
     try:
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
-            _dump_json_to_file(f, serializable, indent=2)
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
             f.flush()
             os.fsync(f.fileno())
+            # Hvorfor fstat på tmp-fila: rename endrer verken inode, størrelse eller
+            # mtime, og vi unngår å lese signaturen til en annen workers skriving.
+            sig = _sig_of(os.fstat(f.fileno()))
         os.replace(tmp, path)
+        return sig, _etag_of(payload)
     finally:
         try:
             if os.path.exists(tmp):
@@ -403,6 +505,9 @@ def _coerce(cfg: Dict[str, Any]) -> Dict[str, Any]:
     for k in ("message_primary", "message_secondary", "daily_time", "once_at"):
         if cfg.get(k) is None:
             cfg[k] = ""
+    cfg["calendar"] = sanitize_calendar(cfg.get("calendar"))
+    cfg["instances"] = _sanitize_instances(cfg.get("instances"))
+    cfg["displays"] = _sanitize_displays(cfg.get("displays"))
     # bools
     for k, d in (
         ("show_message_primary", _DEFAULTS["show_message_primary"]),
@@ -423,7 +528,7 @@ def _coerce(cfg: Dict[str, Any]) -> Dict[str, Any]:
         if cfg.get(k) is None:
             cfg[k] = _DEFAULTS[k]
     # theme
-    th = _deep_merge(get_defaults()["theme"], cfg.get("theme") or {})
+    th = _overlay(_FROZEN_DEFAULTS["theme"], cfg.get("theme") or {})
     # digits: kun size_vmin
     dg = th.get("digits", {}) or {}
     try:
@@ -685,7 +790,7 @@ def _coerce(cfg: Dict[str, Any]) -> Dict[str, Any]:
     th["background"] = bg
     cfg["theme"] = th
     # clock
-    clk = _deep_merge(get_defaults()["clock"], cfg.get("clock") or {})
+    clk = _overlay(_FROZEN_DEFAULTS["clock"], cfg.get("clock") or {})
     clk["with_seconds"] = bool(clk.get("with_seconds", False))
     clk["use_clock_messages"] = bool(clk.get("use_clock_messages", False))
     if not isinstance(clk.get("color"), str) or not clk.get("color"):
@@ -727,8 +832,8 @@ def _coerce(cfg: Dict[str, Any]) -> Dict[str, Any]:
     return cfg
 def _validate(cfg: Dict[str, Any]) -> Tuple[bool, str]:
     m = cfg.get("mode")
-    if m not in ("daily", "once", "duration", "clock"):
-        return False, "mode må være daily|once|duration|clock"
+    if m not in MODES:
+        return False, "mode må være " + "|".join(MODES)
     if m == "daily":
         s = (cfg.get("daily_time") or "").strip()
         ok = (
@@ -748,6 +853,8 @@ def _validate(cfg: Dict[str, Any]) -> Tuple[bool, str]:
                 datetime.fromisoformat(s.replace("Z", "+00:00"))
             except Exception:
                 return False, "once_at må være ISO-8601 (YYYY-MM-DDTHH:MM[:SS][+TZ])"
+    if m == "calendar" and not (cfg.get("calendar") or {}).get("rules"):
+        return False, "calendar.rules må ha minst én gyldig regel (days + time HH:MM)"
     if m == "duration":
         try:
             dm = int(cfg.get("duration_minutes") or 0)
@@ -758,7 +865,7 @@ def _validate(cfg: Dict[str, Any]) -> Tuple[bool, str]:
     return True, ""
 def _clean_by_mode(cfg: Dict[str, Any]) -> Dict[str, Any]:
     m = cfg.get("mode")
-    if m == "daily":
+    if m in ("daily", "calendar"):
         cfg["once_at"] = ""
         cfg["duration_started_ms"] = 0
     elif m == "once":
@@ -769,6 +876,82 @@ def _clean_by_mode(cfg: Dict[str, Any]) -> Dict[str, Any]:
         cfg["once_at"] = ""
         cfg["duration_started_ms"] = 0
     return cfg
+# ── instanser ─────────────────────────────────────────────────────────────────
+_INSTANCE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_INSTANCE_INT_KEYS = (
+    "duration_started_ms",
+    "duration_minutes",
+    "warn_minutes",
+    "alert_minutes",
+    "blink_seconds",
+    "overrun_minutes",
+)
+_HHMM_RE = re.compile(r"^([01]\d|2[0-3]):[0-5]\d$")
+def _sanitize_instances(raw: Any) -> Dict[str, Dict[str, Any]]:
+    """Behold gyldige id-er og kjente felter; ugyldige verdier droppes (arves fra roten)."""
+    out: Dict[str, Dict[str, Any]] = {}
+    if not isinstance(raw, dict):
+        return out
+    for iid, inst in raw.items():
+        if not isinstance(iid, str) or not _INSTANCE_ID_RE.match(iid) or not isinstance(inst, dict):
+            continue  # None/ikke-dict = slett instansen (patch med {"id": null})
+        item: Dict[str, Any] = {}
+        if isinstance(inst.get("label"), str):
+            item["label"] = inst["label"][:120]
+        if inst.get("mode") in MODES:
+            item["mode"] = inst["mode"]
+        if _HHMM_RE.match(str(inst.get("daily_time") or "")):
+            item["daily_time"] = inst["daily_time"]
+        if isinstance(inst.get("once_at"), str):
+            try:
+                datetime.fromisoformat(inst["once_at"].replace("Z", "+00:00"))
+                item["once_at"] = inst["once_at"]
+            except ValueError:
+                pass
+        for k in _INSTANCE_INT_KEYS:
+            v = _i(inst.get(k))
+            if v is not None and v >= 0:
+                item[k] = v
+        if "calendar" in inst:
+            item["calendar"] = sanitize_calendar(inst.get("calendar"))
+        out[iid] = item
+    return out
+# ── skjermprofiler ────────────────────────────────────────────────────────────
+DISPLAY_KEYS = (
+    "theme",
+    "overlays",
+    "overlays_mode",
+    "clock",
+    "message_primary",
+    "message_secondary",
+    "show_message_primary",
+    "show_message_secondary",
+    "show_target_time",
+    "target_time_after",
+    "messages_position",
+    "color_normal",
+    "color_warn",
+    "color_alert",
+    "color_over",
+    "use_phase_colors",
+    "use_blink",
+)
+def _sanitize_displays(raw: Any) -> Dict[str, Dict[str, Any]]:
+    """Profiler: samme id-regler som instanser; bare DISPLAY_KEYS + label/instance beholdes."""
+    out: Dict[str, Dict[str, Any]] = {}
+    if not isinstance(raw, dict):
+        return out
+    for name, prof in raw.items():
+        if not isinstance(name, str) or not _INSTANCE_ID_RE.match(name) or not isinstance(prof, dict):
+            continue
+        item = {k: prof[k] for k in DISPLAY_KEYS if k in prof and prof[k] is not None}
+        if "overlays" in item:
+            item["overlays"] = _sanitize_overlays(item["overlays"])
+        for k in ("label", "instance"):
+            if isinstance(prof.get(k), str) and prof[k]:
+                item[k] = prof[k][:120]
+        out[name] = item
+    return out
 # ── overlays ──────────────────────────────────────────────────────────────────
 def _sanitize_overlays(seq: Any) -> List[Dict[str, Any]]:
     out: List[Dict[str, Any]] = []
@@ -854,26 +1037,203 @@ def _merge_overlays_by_id(
         n = {**n, "id": nid}
         by_id[nid] = n
     return list(by_id.values())
-# ── public API ────────────────────────────────────────────────────────────────
-def load_config() -> Dict[str, Any]:
-    path = str(CONFIG_PATH)
-    if not os.path.exists(path):
-        cfg = _coerce(get_defaults())
-        _atomic_write(path, cfg)
-        return cfg
+# ── config-cache ──────────────────────────────────────────────────────────────
+# /tick, /api/* og require_password leser config flere ganger i sekundet pr. skjerm.
+# Cachen holder ferdig coerced config og er nøkkelet på filens stat-signatur
+# (mtime_ns, size, inode). Skriving går alltid via os.replace (ny inode), så en
+# endring gjort av en annen gunicorn-worker oppdages ved neste kall.
+# 'etag' er en innholdshash av fila (config-revisjonen brukt av ETag/cfg_etag).
+# Kjøretilstand (RUNTIME_KEYS) ligger i tilstandsloggen (state_store.py) og legges
+# over config ved lesing; nøkkelen er da (config-signatur, logg-signatur) og etag får
+# et tillegg fra kjøreverdiene. 'base' er config.json alene, så en append i loggen
+# koster bare kopi + overlegg, ikke ny parsing.
+_CACHE_LOCK = threading.Lock()
+_CACHE: Dict[str, Any] = {"sig": None, "cfg": None, "etag": "", "base_sig": None, "base": None, "base_etag": ""}
+_CACHE_STATS = {"hits": 0, "misses": 0}
+def _sig_of(st: os.stat_result) -> Tuple[int, int, int]:
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+def _etag_of(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+def _stat_sig(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        return _sig_of(os.stat(path))
+    except OSError:
+        return None
+_clone = _thaw  # rask dyp kopi av JSON-lignende data (dict/list/skalarer)
+def _cache_put(sig: Any, etag: str, cfg: Dict[str, Any]) -> None:
+    if sig is None or sig[0] is None:
+        return
+    with _CACHE_LOCK:
+        _CACHE["sig"] = sig
+        _CACHE["etag"] = etag
+        _CACHE["cfg"] = _clone(cfg)
+def _base_put(sig: Optional[Tuple[int, int, int]], etag: str, base: Dict[str, Any]) -> None:
+    if sig is None:
+        return
+    with _CACHE_LOCK:
+        _CACHE["base_sig"] = sig
+        _CACHE["base_etag"] = etag
+        _CACHE["base"] = _clone(base)
+def invalidate_config_cache() -> None:
+    with _CACHE_LOCK:
+        _CACHE["sig"] = None
+        _CACHE["etag"] = ""
+        _CACHE["cfg"] = None
+        _CACHE["base_sig"] = None
+        _CACHE["base_etag"] = ""
+        _CACHE["base"] = None
+def cache_stats() -> Dict[str, int]:
+    with _CACHE_LOCK:
+        return dict(_CACHE_STATS)
+def _read_config_file(
+    path: str,
+) -> Tuple[Dict[str, Any], Optional[Tuple[int, int, int]], str]:
+    """Les rå config, signatur og etag for nøyaktig den fila som ble lest."""
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
+        with open(path, "rb") as f:
+            sig = _sig_of(os.fstat(f.fileno()))
+            data = f.read()
+    except FileNotFoundError:
+        raise
+    except Exception:
+        return {}, None, ""
+    try:
+        cfg = json.loads(data.decode("utf-8"))
     except Exception:
         cfg = {}
-    cfg = _deep_merge(get_defaults(), cfg or {})
+    return (cfg if isinstance(cfg, dict) else {}), sig, _etag_of(data)
+def _notify_written(cfg: Dict[str, Any], etag: str) -> None:
+    """Varsle /events-abonnenter og planleggeren. Lat import: storage skal ikke trenge Flask/SSE."""
+    try:
+        from .events import notify_config_written
+        notify_config_written(cfg, etag)
+    except Exception:
+        pass
+    try:
+        from .scheduler import wake
+        wake()
+    except Exception:
+        pass
+# ── kjøretilstand (tilstandslogg) ─────────────────────────────────────────────
+# Felter som endres under kjøring (start/utløp, rotasjon, revisjonstid). De skrives
+# til tilstandsloggen ved hver commit der de endres; config.json skrives bare når noe
+# annet endres (og får da gjeldende verdier med). Loggen vinner for disse feltene.
+# '_version' (CAS) øker bare ved skriving av config.json, så en picsum-rotasjon gir
+# ikke lenger 409 på en åpen admin-økt.
+# I loggen ligger alle verdiene samlet under _RUNTIME_LOG_KEY (None er en gyldig
+# verdi for picsum-id/indeks, og None betyr "slett" på toppnivå i loggen).
+_RUNTIME_LOG_KEY = "config"
+RUNTIME_KEYS = (
+    "duration_started_ms",
+    "theme.background.picsum.id",
+    "theme.background.picsum.auto_rotate.last_switch_ms",
+    "theme.background.picsum.auto_rotate.last_index",
+    "_updated_at",
+)
+_RUNTIME_PATHS = tuple((k, tuple(k.split("."))) for k in RUNTIME_KEYS)
+_ABSENT = object()
+def runtime_state() -> StateLog:
+    """Tilstandsloggen som hører til gjeldende CONFIG_PATH (også for heartbeat o.l.)."""
+    return get_state_log(state_path_for(CONFIG_PATH))
+def _runtime_values(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for key, path in _RUNTIME_PATHS:
+        node: Any = cfg
+        for part in path:
+            node = node.get(part, _ABSENT) if isinstance(node, dict) else _ABSENT
+        if node is not _ABSENT:
+            out[key] = node
+    return out
+def _apply_runtime(cfg: Dict[str, Any], values: Dict[str, Any]) -> None:
+    """Legg kjøreverdier inn i cfg (muterer); mellomnivåer opprettes ved behov."""
+    for key, path in _RUNTIME_PATHS:
+        if key not in values:
+            continue
+        node = cfg
+        for part in path[:-1]:
+            nxt = node.get(part)
+            if not isinstance(nxt, dict):
+                nxt = node[part] = {}
+            node = nxt
+        node[path[-1]] = values[key]
+def _mask_runtime(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """Grunn kopi langs kjørestiene uten kjørefeltene (for å se om noe annet endret seg)."""
+    out = dict(cfg)
+    for _key, path in _RUNTIME_PATHS:
+        node = out
+        for part in path[:-1]:
+            nxt = node.get(part)
+            if not isinstance(nxt, dict):
+                break
+            node[part] = nxt = dict(nxt)
+            node = nxt
+        else:
+            node.pop(path[-1], None)
+    return out
+def _runtime_etag(base_etag: str, runtime: Dict[str, Any]) -> str:
+    if not runtime:
+        return base_etag
+    data = json.dumps(runtime, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return f"{base_etag}-{_etag_of(data)[:8]}"
+# ── public API ────────────────────────────────────────────────────────────────
+def load_config() -> Dict[str, Any]:
+    return load_config_versioned()[0]
+def config_etag() -> str:
+    """Gjeldende revisjon uten å kopiere config (bare stat() ved cache-treff)."""
+    key = (_stat_sig(str(CONFIG_PATH)), runtime_state().stat_sig())
+    with _CACHE_LOCK:
+        if key[0] is not None and _CACHE["sig"] == key:
+            return _CACHE["etag"]
+    return load_config_versioned()[1]
+def _load_base(path: str) -> Tuple[Dict[str, Any], Optional[Tuple[int, int, int]], str]:
+    """config.json alene (coerced), med signatur og etag; cachet på filens signatur."""
+    sig = _stat_sig(path)
+    with _CACHE_LOCK:
+        if sig is not None and _CACHE["base_sig"] == sig:
+            return _clone(_CACHE["base"]), sig, _CACHE["base_etag"]
+    try:
+        raw, sig, etag = _read_config_file(path)
+    except FileNotFoundError:
+        cfg = _coerce(get_defaults())
+        sig, etag = _atomic_write(path, cfg)
+        _base_put(sig, etag, cfg)
+        return cfg, sig, etag
+    cfg = _overlay(_FROZEN_DEFAULTS, raw)
     cfg = _coerce(cfg)
     ok, _ = _validate(cfg)
     if not ok:
         cfg = _coerce(get_defaults())
-    return _clean_by_mode(cfg)
-def replace_config(new_cfg: Dict[str, Any]) -> Dict[str, Any]:
-    cfg_in = _deep_merge(get_defaults(), new_cfg or {})
+    cfg = _clean_by_mode(cfg)
+    _base_put(sig, etag, cfg)
+    return cfg, sig, etag
+def load_config_versioned() -> Tuple[Dict[str, Any], str]:
+    """Som load_config, men returnerer også config-revisjonen (etag)."""
+    t0 = time.perf_counter()
+    try:
+        return _load_config_versioned()
+    finally:
+        STORAGE_LATENCY.observe(time.perf_counter() - t0, "load_config")
+def _load_config_versioned() -> Tuple[Dict[str, Any], str]:
+    path = str(CONFIG_PATH)
+    state = runtime_state()
+    key = (_stat_sig(path), state.stat_sig())
+    with _CACHE_LOCK:
+        if key[0] is not None and _CACHE["sig"] == key:
+            _CACHE_STATS["hits"] += 1
+            return _clone(_CACHE["cfg"]), _CACHE["etag"]
+        _CACHE_STATS["misses"] += 1
+    cfg, sig, base_etag = _load_base(path)
+    ssig, values = state.read()
+    runtime = values.get(_RUNTIME_LOG_KEY) or {}
+    if runtime:
+        _apply_runtime(cfg, runtime)
+        cfg = _clean_by_mode(cfg)
+    etag = _runtime_etag(base_etag, runtime)
+    _cache_put((sig, ssig), etag, cfg)
+    return _clone(cfg), etag
+def _prepare(new_cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """Full config fra (del)config: defaults + coerce + validering. ValueError ved feil."""
+    cfg_in = _overlay(_FROZEN_DEFAULTS, new_cfg or {})
     if "overlays" in new_cfg:
         try:
             cfg_in["overlays"] = _sanitize_overlays(new_cfg.get("overlays"))
@@ -883,13 +1243,177 @@ def replace_config(new_cfg: Dict[str, Any]) -> Dict[str, Any]:
     ok, msg = _validate(cfg)
     if not ok:
         raise ValueError(msg)
-    cfg["_updated_at"] = int(time.time())
-    cfg = _clean_by_mode(cfg)
-    _atomic_write(str(CONFIG_PATH), cfg)
-    return cfg
-def save_config_patch(patch: Dict[str, Any]) -> Dict[str, Any]:
-    current = load_config()
-    merged = _deep_merge(get_defaults(), current)
+    return _clean_by_mode(cfg)
+# ── skriving: én skriver, CAS og gruppe-commit ────────────────────────────────
+# Alle endringer går via update_config(mutator). Hvorfor:
+# - Kryssprosess-lås (flock på config.json.lock): read-modify-write skjer alltid
+#   mot siste lagrede versjon, så to gunicorn-workere/admin-økter mister ikke
+#   hverandres endringer (tidligere last-writer-wins).
+# - '_version' øker for hver godtatt endring; expected_version/expected_etag gir
+#   compare-and-swap (ConfigConflictError → 409 i API-et).
+# - Patcher som kommer innen COALESCE_WINDOW_S i samme prosess slås sammen til
+#   én fsync'et skriving (færre skriv til SD-kortet ved autosave/rotasjon).
+COALESCE_WINDOW_S = 0.05
+class ConfigConflictError(RuntimeError):
+    """Config er endret siden klienten leste den (CAS feilet)."""
+    def __init__(self, current_version: int, current_etag: str = "") -> None:
+        super().__init__(f"config er endret (versjon {current_version})")
+        self.current_version = current_version
+        self.current_etag = current_etag
+class _PendingWrite:
+    __slots__ = ("mutator", "expected_version", "expected_etag", "done", "result", "error")
+    def __init__(self, mutator, expected_version, expected_etag) -> None:
+        self.mutator = mutator
+        self.expected_version = expected_version
+        self.expected_etag = expected_etag
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+_WRITE_LOCK = threading.Lock()  # beskytter _PENDING/_LEADER
+_COMMIT_LOCK = threading.Lock()  # én commit om gangen i prosessen (flock er pr. fil-handle)
+_PENDING: List[_PendingWrite] = []
+_LEADER = {"active": False}
+_WRITE_STATS = {"requests": 0, "commits": 0, "conflicts": 0, "state_appends": 0}
+class _ConfigFileLock:
+    """Eksklusiv flock på <config>.lock (ingen lås der fcntl mangler)."""
+    def __init__(self, path: str) -> None:
+        self.path = path + ".lock"
+        self._fd: Optional[int] = None
+    def __enter__(self) -> "_ConfigFileLock":
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+    def __exit__(self, *exc: Any) -> None:
+        if self._fd is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+def _current_version(cfg: Dict[str, Any]) -> int:
+    try:
+        return int(cfg.get("_version") or 0)
+    except (TypeError, ValueError):
+        return 0
+def _commit(batch: List[_PendingWrite]) -> None:
+    path = str(CONFIG_PATH)
+    with _COMMIT_LOCK, _ConfigFileLock(path):
+        try:
+            cfg, etag = load_config_versioned()  # under lås: siste versjon på disk
+        except Exception as e:
+            for op in batch:
+                op.error = e
+            return
+        version = _current_version(cfg)
+        before, before_rt = _mask_runtime(cfg), _runtime_values(cfg)
+        masked = before
+        applied = 0
+        # Hvorfor egen teller: rene kjøreverdi-endringer (picsum-rotasjon, start av
+        # varighet) skriver ikke config.json og skal verken øke _version eller gi 409
+        # til en admin-lagring i samme gruppe.
+        bumps = 0
+        for op in batch:
+            try:
+                if op.expected_version is not None and op.expected_version != version + bumps:
+                    raise ConfigConflictError(version + bumps, etag if not applied else "")
+                if op.expected_etag is not None and (applied or op.expected_etag != etag):
+                    raise ConfigConflictError(version + bumps, etag if not applied else "")
+                out = op.mutator(_clone(cfg))
+                if out is None:
+                    continue  # ingen endring (f.eks. betingelsen holdt ikke under lås)
+                cfg = _prepare(out)
+                applied += 1
+                now_masked = _mask_runtime(cfg)
+                if now_masked != masked:
+                    masked = now_masked
+                    bumps += 1
+            except ConfigConflictError as e:
+                with _WRITE_LOCK:
+                    _WRITE_STATS["conflicts"] += 1
+                op.error = e
+            except Exception as e:
+                op.error = e
+        if not applied:
+            for op in batch:
+                if op.error is None:
+                    op.result = _clone(cfg)
+            return
+        cfg["_updated_at"] = int(time.time())
+        runtime = _runtime_values(cfg)
+        if masked != before:
+            # Ekte endring: skriv config.json (med gjeldende kjøreverdier)
+            cfg["_version"] = version + bumps
+            sig, base_etag = _atomic_write(path, cfg)
+            _base_put(sig, base_etag, cfg)
+            _WRITE_STATS["commits"] += 1
+        else:
+            sig, base_etag = _load_base(path)[1:]  # uendret fil: bare loggen skrives
+        durable = runtime.get("duration_started_ms") != before_rt.get("duration_started_ms")
+        with STORAGE_LATENCY.time("state_append"):
+            ssig, _values = runtime_state().append({_RUNTIME_LOG_KEY: runtime}, durable=durable)
+        etag = _runtime_etag(base_etag, runtime)
+        _WRITE_STATS["state_appends"] += 1
+    _cache_put((sig, ssig), etag, cfg)
+    _notify_written(cfg, etag)
+    for op in batch:
+        if op.error is None:
+            op.result = _clone(cfg)
+def update_config(
+    mutator: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+    *,
+    expected_version: Optional[int] = None,
+    expected_etag: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Kjør mutator(cfg) → ny (del)config under skrivelåsen og lagre resultatet.
+    mutator får en egen kopi av siste lagrede config og kan returnere den endret,
+    eller None for "ingen endring" (da skrives ingenting).
+    Returnerer lagret config (inkl. ev. andre endringer i samme gruppe-commit).
+    Feil: ValueError (validering), ConfigConflictError (CAS).
+    """
+    op = _PendingWrite(mutator, expected_version, expected_etag)
+    with _WRITE_LOCK:
+        _WRITE_STATS["requests"] += 1
+        _PENDING.append(op)
+        lead = not _LEADER["active"]
+        _LEADER["active"] = True
+    if lead:
+        try:
+            if COALESCE_WINDOW_S > 0:
+                time.sleep(COALESCE_WINDOW_S)  # samle opp patcher fra andre tråder
+        finally:
+            with _WRITE_LOCK:
+                batch = _PENDING[:]
+                _PENDING.clear()
+                _LEADER["active"] = False
+        try:
+            _commit(batch)
+        finally:
+            for pending in batch:
+                pending.done.set()
+    op.done.wait()
+    if op.error is not None:
+        raise op.error
+    assert op.result is not None
+    return op.result
+def write_stats() -> Dict[str, int]:
+    with _WRITE_LOCK:
+        return dict(_WRITE_STATS)
+def replace_config(
+    new_cfg: Dict[str, Any],
+    *,
+    expected_version: Optional[int] = None,
+    expected_etag: Optional[str] = None,
+) -> Dict[str, Any]:
+    return update_config(
+        lambda _cur: new_cfg,
+        expected_version=expected_version,
+        expected_etag=expected_etag,
+    )
+def apply_patch(current: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Slå en PATCH inn i current (overlays: merge pr. id eller replace)."""
+    merged = _overlay(_FROZEN_DEFAULTS, current)
     overlays_mode = "merge"
     if isinstance(patch, dict):
         overlays_mode = str(patch.get("overlays_mode") or "merge").lower()
@@ -905,23 +1429,49 @@ def save_config_patch(patch: Dict[str, Any]) -> Dict[str, Any]:
         patch = dict(patch)
         patch.pop("overlays", None)
         patch.pop("overlays_mode", None)
-    _deep_merge(merged, patch or {})
-    return replace_config(merged)
-def set_mode(
+    _deep_merge(merged, _clone(patch or {}))
+    return merged
+def merge_profile(base: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ny config = base + profil (som apply_patch, overlays erstattes som standard), normalisert.
+    base endres ikke. Brukes av displays.resolve_display (cachet pr. revisjon).
+    """
+    patch = {k: profile[k] for k in DISPLAY_KEYS if k in profile}
+    if "overlays" in patch:
+        patch.setdefault("overlays_mode", "replace")
+    return _coerce(apply_patch(_thaw(base), patch))
+def save_config_patch(
+    patch: Dict[str, Any],
+    *,
+    expected_version: Optional[int] = None,
+    expected_etag: Optional[str] = None,
+) -> Dict[str, Any]:
+    return update_config(
+        lambda cur: apply_patch(cur, patch),
+        expected_version=expected_version,
+        expected_etag=expected_etag,
+    )
+def apply_mode(
+    cfg: Dict[str, Any],
     mode: str,
     *,
     daily_time: str = "",
     once_at: str = "",
     duration_minutes: int | None = None,
     clock: Dict[str, Any] | None = None,
+    calendar: Dict[str, Any] | None = None,
 ) -> Dict[str, Any]:
-    cfg = load_config()
     cfg["mode"] = mode
     if mode == "daily":
         if daily_time:
             cfg["daily_time"] = daily_time
         cfg["duration_started_ms"] = 0
         cfg["once_at"] = ""
+    elif mode == "calendar":
+        if calendar is not None:
+            cfg["calendar"] = sanitize_calendar(calendar)
+        cfg["duration_started_ms"] = 0
+        cfg["once_at"] = ""
     elif mode == "once":
         cfg["once_at"] = once_at or ""
         cfg["duration_started_ms"] = 0
@@ -930,23 +1480,46 @@ def set_mode(
             cfg["duration_minutes"] = int(duration_minutes)
     elif mode == "clock":
         if clock:
-            base = get_defaults()["clock"]
-            cfg["clock"] = _deep_merge(base, clock)
+            cfg["clock"] = _overlay(_FROZEN_DEFAULTS["clock"], clock)
     else:
         raise ValueError("Ugyldig mode")
-    return replace_config(cfg)
+    return cfg
+def set_mode(
+    mode: str,
+    *,
+    daily_time: str = "",
+    once_at: str = "",
+    duration_minutes: int | None = None,
+    clock: Dict[str, Any] | None = None,
+    calendar: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    if mode not in MODES:
+        raise ValueError("Ugyldig mode")
+    return update_config(
+        lambda cfg: apply_mode(
+            cfg,
+            mode,
+            daily_time=daily_time,
+            once_at=once_at,
+            duration_minutes=duration_minutes,
+            clock=clock,
+            calendar=calendar,
+        )
+    )
 def start_duration(minutes: int) -> Dict[str, Any]:
     if minutes <= 0:
         raise ValueError("minutes må være > 0")
     now_ms = int(time.time() * 1000)
-    cfg = load_config()
-    cfg["mode"] = "duration"
-    cfg["duration_minutes"] = int(minutes)
-    cfg["duration_started_ms"] = now_ms
-    cfg["once_at"] = ""
-    return replace_config(cfg)
+    def _start(cfg: Dict[str, Any]) -> Dict[str, Any]:
+        cfg["mode"] = "duration"
+        cfg["duration_minutes"] = int(minutes)
+        cfg["duration_started_ms"] = now_ms
+        cfg["once_at"] = ""
+        return cfg
+    return update_config(_start)
 def clear_duration_and_switch_to_daily() -> Dict[str, Any]:
-    cfg = load_config()
-    cfg["duration_started_ms"] = 0
-    cfg["mode"] = "daily"
-    return replace_config(cfg)
+    def _clear(cfg: Dict[str, Any]) -> Dict[str, Any]:
+        cfg["duration_started_ms"] = 0
+        cfg["mode"] = "daily"
+        return cfg
+    return update_config(_clear)
@@ -0,0 +1,258 @@
+# File: app/sysinfo.py
+"""
+Systemstatus for /api/sys/about-status (admin, diag, topp- og statuslinje).
+- Faste fakta (versjon, commit, OS, kjerne, arkitektur, modell) samles én gang pr. prosess.
+- Tjenestestatus (systemctl show) friskes opp hvert INTERVAL_S av en bakgrunnstråd
+  som bare lever mens noen spør (stopper etter IDLE_STOP_S uten lesere).
+- snapshot() svarer fra minnet; bare første kall i en kald prosess venter på innsamling.
+- Én innsamling om gangen: samtidige kall venter på samme kjøring i stedet for å
+  starte egne subprosesser.
+- Endret tjenestestatus publiseres som SSE-hendelse 'sys' (alle workere).
+Hvorfor: topbar.js og statusbar.js spurte hvert 10. s fra hver åpen side, og hvert
+svar kostet git + flere systemctl-kall og fil-lesing.
+Kommandohjelperne (run_cmd o.l.) brukes også av routes/api.py.
+"""
+from __future__ import annotations
+import logging
+import os
+import platform
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from .metrics import SUBPROCESS_FAILURES, SUBPROCESS_LATENCY
+__all__ = [
+    "run_cmd",
+    "run_cmd_direct",
+    "parse_kv",
+    "service_map",
+    "SysInfo",
+    "get_sysinfo",
+    "set_sysinfo",
+]
+log = logging.getLogger(__name__)
+INTERVAL_S = float(os.environ.get("COUNTDOWN_SYSINFO_INTERVAL_S", "5") or 5)
+IDLE_STOP_S = 60.0
+_SHOW_PROPS = "--property=ActiveState,SubState,ActiveEnterTimestamp,ExecMainStartTimestamp,Description"
+CmdResult = Tuple[bool, str, str, int]
+# ── kommandoer ────────────────────────────────────────────────────────────────
+def _timed(fn: Callable[..., CmdResult], args, timeout: int) -> CmdResult:
+    """Kjør og mål (countdown_subprocess_*); etikett er programnavnet, ikke argumentene."""
+    cmd = os.path.basename(str(args[0])) if args else "?"
+    t0 = time.perf_counter()
+    res = fn(args, timeout)
+    SUBPROCESS_LATENCY.observe(time.perf_counter() - t0, cmd)
+    if not res[0]:
+        SUBPROCESS_FAILURES.inc(cmd)
+    return res
+def run_cmd(args, timeout: int = 8) -> CmdResult:
+    """System-scope kommando; prøv sudo -n først, fall tilbake uten sudo."""
+    return _timed(_run_sudo_first, args, timeout)
+def _run_sudo_first(args, timeout: int) -> CmdResult:
+    try:
+        r = subprocess.run(
+            ["sudo", "-n", *args], capture_output=True, text=True, timeout=timeout
+        )
+        if r.returncode == 0:
+            return (
+                True,
+                (r.stdout or "").strip(),
+                (r.stderr or "").strip(),
+                r.returncode,
+            )
+        r2 = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+        return (
+            (r2.returncode == 0),
+            (r2.stdout or "").strip(),
+            (r2.stderr or "").strip(),
+            r2.returncode,
+        )
+    except Exception as e:
+        return False, "", str(e), -1
+def run_cmd_direct(args, timeout: int = 8) -> CmdResult:
+    """Kjør uten sudo (brukes for systemctl --user)."""
+    return _timed(_run_plain, args, timeout)
+def _run_plain(args, timeout: int) -> CmdResult:
+    try:
+        r = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+        return (
+            (r.returncode == 0),
+            (r.stdout or "").strip(),
+            (r.stderr or "").strip(),
+            r.returncode,
+        )
+    except Exception as e:
+        return False, "", str(e), -1
+def parse_kv(text: str) -> dict:
+    d = {}
+    for line in (text or "").splitlines():
+        if "=" in line:
+            k, v = line.split("=", 1)
+            d[k.strip()] = v.strip()
+    return d
+def service_map() -> dict:
+    return {
+        "app": {"unit": "countdown.service", "scope": "user"},
+        "web": {"unit": "countdown.service", "scope": "user"},  # alias
+        "kiosk": {"unit": "kiosk-cog.service", "scope": "system"},
+    }
+# ── innsamling ────────────────────────────────────────────────────────────────
+def _read_os_pretty() -> Optional[str]:
+    try:
+        with open("/etc/os-release", "r", encoding="utf-8") as f:
+            kv = {}
+            for line in f:
+                line = line.strip()
+                if "=" in line:
+                    k, v = line.split("=", 1)
+                    kv[k] = v.strip().strip('"')
+            return kv.get("PRETTY_NAME") or kv.get("NAME")
+    except Exception:
+        return None
+def _read_model() -> Optional[str]:
+    try:
+        with open("/proc/device-tree/model", "rb") as f:
+            return f.read().decode("utf-8", "ignore").strip("\x00\r\n ") or None
+    except Exception:
+        return None
+class SysInfo:
+    """Bufret systemstatus. runner/user_runner kan byttes ut (tester)."""
+    def __init__(
+        self,
+        runner: Callable[..., CmdResult] = run_cmd,
+        user_runner: Callable[..., CmdResult] = run_cmd_direct,
+        interval_s: float = INTERVAL_S,
+        publish: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        self.runner = runner
+        self.user_runner = user_runner
+        self.interval_s = interval_s
+        self._publish = publish
+        self._lock = threading.Lock()  # beskytter feltene under
+        self._collect_lock = threading.Lock()  # én innsamling om gangen
+        self._static: Optional[Dict[str, Any]] = None
+        self._services: Optional[Dict[str, Dict[str, Any]]] = None
+        self._services_at = 0.0  # monotonic
+        self._last_read = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"static_runs": 0, "service_runs": 0, "pushes": 0}
+    # -- faste fakta --
+    def _collect_static(self) -> Dict[str, Any]:
+        ver = (os.environ.get("COUNTDOWN_VERSION") or "").strip() or None
+        ok_git, out_git, _, _ = self.runner(["git", "rev-parse", "--short", "HEAD"])
+        commit = (
+            out_git
+            if ok_git and out_git
+            else (os.environ.get("COUNTDOWN_COMMIT") or "").strip() or None
+        )
+        uname = platform.uname()
+        return {
+            "version": ver or "unknown",
+            "commit": commit or "unknown",
+            "os": _read_os_pretty() or f"{uname.system} {uname.release}",
+            "kernel": uname.version,
+            "arch": uname.machine,
+            "model": _read_model() or "unknown",
+        }
+    # -- tjenester --
+    def _show(self, unit: str, scope: str) -> Dict[str, Any]:
+        if scope == "user":
+            ok, out, err, _ = self.user_runner(["systemctl", "--user", "show", unit, "--no-pager", _SHOW_PROPS])
+        else:
+            ok, out, err, _ = self.runner(["systemctl", "show", unit, "--no-pager", _SHOW_PROPS])
+        info = parse_kv(out) if ok else {}
+        return {
+            "unit": unit,
+            "scope": scope,
+            "active": info.get("ActiveState") == "active",
+            "substate": info.get("SubState"),
+            "since": info.get("ActiveEnterTimestamp"),
+            "exec_main_start": info.get("ExecMainStartTimestamp"),
+            "description": info.get("Description"),
+            "raw": info.get("ActiveState") or err or out,
+        }
+    def _collect_services(self) -> Dict[str, Dict[str, Any]]:
+        # Én 'systemctl show' pr. unit (alias som 'web' deler resultat med 'app')
+        by_unit: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        out: Dict[str, Dict[str, Any]] = {}
+        for name, meta in service_map().items():
+            key = (meta["unit"], meta["scope"])
+            if key not in by_unit:
+                by_unit[key] = self._show(*key)
+            out[name] = dict(by_unit[key])
+        return out
+    def refresh(self, *, force: bool = False) -> None:
+        """Samle inn nå (eller vent på en innsamling som allerede pågår)."""
+        with self._collect_lock:
+            with self._lock:
+                fresh = self._services is not None and time.monotonic() - self._services_at < self.interval_s / 2
+                need_static = self._static is None
+            if fresh and not force:
+                return  # en annen tråd samlet nettopp inn
+            if need_static:
+                static = self._collect_static()
+                self.stats["static_runs"] += 1
+                with self._lock:
+                    self._static = static
+            services = self._collect_services()
+            self.stats["service_runs"] += 1
+            with self._lock:
+                changed = self._services is not None and _summary(services) != _summary(self._services)
+                self._services = services
+                self._services_at = time.monotonic()
+        if changed:
+            self._push(services)
+    def _push(self, services: Dict[str, Dict[str, Any]]) -> None:
+        publish = self._publish
+        if publish is None:
+            from .sse import publish  # lat: sysinfo skal ikke kreve Flask
+        try:
+            publish({"type": "sys", "services": _summary(services)})
+            self.stats["pushes"] += 1
+        except Exception:
+            log.debug("sys-hendelse feilet", exc_info=True)
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.interval_s)
+            with self._lock:
+                if time.monotonic() - self._last_read > IDLE_STOP_S:
+                    self._thread = None
+                    return
+            try:
+                self.refresh()
+            except Exception:
+                log.exception("sysinfo: innsamling feilet")
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="countdown-sysinfo", daemon=True)
+            self._thread.start()
+    def snapshot(self, *, background: bool = True) -> Dict[str, Any]:
+        """Faste fakta + tjenester fra minnet ({version, commit, os, ..., services})."""
+        with self._lock:
+            self._last_read = time.monotonic()
+            ready = self._static is not None and self._services is not None
+        if not ready:
+            self.refresh()
+        if background:
+            self._ensure_thread()
+        with self._lock:
+            return {**(self._static or {}), "services": {k: dict(v) for k, v in (self._services or {}).items()}}
+def _summary(services: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Det klientene viser (endring her → 'sys'-hendelse)."""
+    return {k: {"active": v.get("active"), "substate": v.get("substate")} for k, v in services.items()}
+_instance: Optional[SysInfo] = None
+_instance_lock = threading.Lock()
+def get_sysinfo() -> SysInfo:
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = SysInfo()
+    return _instance
+def set_sysinfo(info: Optional[SysInfo]) -> None:
+    """Bytt ut innsamleren (tester)."""
+    global _instance
+    with _instance_lock:
+        _instance = info
@@ -0,0 +1,119 @@
+# File: app/timesource.py
+"""
+Tidskilde for tick-beregningene (countdown._now_ms).
+Monoton tid gir jevne tick, men før ble veggklokka ankret bare én gang ved import,
+så et NTP-steg etter oppstart ble aldri sett og skjermene drev fra hverandre.
+- Hvert REANCHOR_S sammenlignes egen tid med systemklokka (lat, i now_ms(); ingen tråd).
+- Avvik under STEP_MS slewes bort med høyst SLEW_RATE (ms pr. ms), så tiden aldri hopper
+  eller går baklengs; større avvik (typisk første NTP-synk etter boot) tas som ett steg.
+- Drift (ppm) mellom monoton tid og systemklokka estimeres fra avviket som gjenstår
+  etter slew, og kompenseres i farten (begrenset til ±MAX_DRIFT_PPM).
+- stats() gir tallene til /debug/time og /diag.
+Hot path er ett monotonic_ns()-kall + aritmetikk; ny ankring skjer under lås.
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+__all__ = ["REANCHOR_S", "STEP_MS", "SLEW_RATE", "TimeSource", "get_timesource", "set_timesource"]
+REANCHOR_S = 10.0
+STEP_MS = 1000.0
+SLEW_RATE = 0.02  # 20 ms korreksjon pr. sekund
+MAX_DRIFT_PPM = 500.0
+_DRIFT_GAIN = 0.5
+class _Anchor:
+    """Uforanderlig ankerpunkt; byttes atomisk, så lesere trenger ingen lås."""
+    __slots__ = ("mono_ns", "wall_ms", "rate", "slew_ms", "next_ns")
+    def __init__(self, mono_ns: int, wall_ms: float, rate: float, slew_ms: float, next_ns: int) -> None:
+        self.mono_ns = mono_ns
+        self.wall_ms = wall_ms
+        self.rate = rate  # 1 + drift
+        self.slew_ms = slew_ms  # korreksjon som skal fordeles fra dette ankeret
+        self.next_ns = next_ns
+    def value(self, mono_ns: int) -> float:
+        el = (mono_ns - self.mono_ns) / 1e6
+        s = self.slew_ms
+        applied = s if abs(s) <= SLEW_RATE * el else (SLEW_RATE * el if s > 0 else -SLEW_RATE * el)
+        return self.wall_ms + el * self.rate + applied
+    def applied(self, mono_ns: int) -> float:
+        return self.value(mono_ns) - (self.wall_ms + (mono_ns - self.mono_ns) / 1e6 * self.rate)
+class TimeSource:
+    """Veggklokke i ms som følger systemklokka uten hopp. wall/mono kan byttes ut (tester)."""
+    def __init__(
+        self,
+        wall_ns: Callable[[], int] = time.time_ns,
+        mono_ns: Callable[[], int] = time.monotonic_ns,
+        reanchor_s: float = REANCHOR_S,
+    ) -> None:
+        self._wall_ns = wall_ns
+        self._mono_ns = mono_ns
+        self._period_ns = int(reanchor_s * 1e9)
+        self._lock = threading.Lock()
+        m = mono_ns()
+        self._anchor = _Anchor(m, wall_ns() / 1e6, 1.0, 0.0, m + self._period_ns)
+        self._offset_ms = 0.0  # siste målte avvik (system − egen)
+        self._steps = 0
+        self._anchors = 0
+        self._max_abs_offset_ms = 0.0
+    def now_ms(self) -> int:
+        m = self._mono_ns()
+        a = self._anchor
+        if m >= a.next_ns:
+            a = self._reanchor(m)
+        return int(a.value(m))
+    def _reanchor(self, m: int) -> _Anchor:
+        with self._lock:
+            a = self._anchor
+            if m < a.next_ns:
+                return a  # en annen tråd ankret nettopp
+            ours = a.value(m)
+            offset = self._wall_ns() / 1e6 - ours
+            el_ms = (m - a.mono_ns) / 1e6
+            rate = a.rate
+            if abs(offset) > STEP_MS:
+                self._steps += 1
+                new = _Anchor(m, ours + offset, rate, 0.0, m + self._period_ns)
+            else:
+                # Det som gjenstår etter planlagt slew er frekvensfeil (drift)
+                residual = offset - (a.slew_ms - a.applied(m))
+                if el_ms > 0:
+                    drift = (rate - 1.0) + _DRIFT_GAIN * residual / el_ms
+                    lim = MAX_DRIFT_PPM * 1e-6
+                    rate = 1.0 + max(-lim, min(lim, drift))
+                new = _Anchor(m, ours, rate, offset, m + self._period_ns)
+            self._offset_ms = offset
+            self._max_abs_offset_ms = max(self._max_abs_offset_ms, abs(offset))
+            self._anchors += 1
+            self._anchor = new
+            return new
+    def stats(self) -> Dict[str, Any]:
+        m = self._mono_ns()
+        a = self._anchor
+        return {
+            "now_ms": int(a.value(m)),
+            "system_ms": self._wall_ns() // 1_000_000,
+            "offset_ms": round(self._offset_ms, 3),
+            "max_abs_offset_ms": round(self._max_abs_offset_ms, 3),
+            "slew_pending_ms": round(a.slew_ms - a.applied(m), 3),
+            "drift_ppm": round((a.rate - 1.0) * 1e6, 3),
+            "steps": self._steps,
+            "anchors": self._anchors,
+            "anchor_age_s": round((m - a.mono_ns) / 1e9, 3),
+            "reanchor_s": self._period_ns / 1e9,
+            "slew_rate": SLEW_RATE,
+            "step_ms": STEP_MS,
+        }
+_instance: Optional[TimeSource] = None
+_instance_lock = threading.Lock()
+def get_timesource() -> TimeSource:
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = TimeSource()
+    return _instance
+def set_timesource(ts: Optional[TimeSource]) -> None:
+    """Bytt ut tidskilden (tester)."""
+    global _instance
+    with _instance_lock:
+        _instance = ts
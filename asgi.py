@@ -0,0 +1,17 @@
+# file: asgi.py
+"""
+asgi.py – asynkron servermodus (SSE på asyncio, Flask via WSGI-bro).
+Krever en ASGI-server, f.eks.:
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker --workers 2
+"""
+from __future__ import annotations
+
+from app import create_app
+from app.asgi import create_asgi_app
+
+application = create_asgi_app(create_app())
+
+if __name__ == "__main__":
+    # Lokal dev: uvicorn om installert.
+    import uvicorn  # type: ignore[reportMissingImports]
+    uvicorn.run(application, host="0.0.0.0", port=5000)
@@ -98,7 +98,11 @@
       credentials: "same-origin",
     });
     const js = await r.json().catch(() => ({}));
-    if (!r.ok || js.ok === false) throw new Error(js.error || `HTTP ${r.status}`);
+    if (!r.ok || js.ok === false) {
+      const err = new Error(js.error || `HTTP ${r.status}`);
+      err.status = r.status;
+      throw err;
+    }
     return js;
   }
   // ==== State ================================================================
@@ -395,6 +399,16 @@
     pushPreview();
   }
   // ==== Build patch & save ===================================================
+  // Kalender redigeres som JSON: { rules: [{ days, time, from?, until? }], exceptions: [{ date, time? }] }
+  function readCalendar() {
+    const raw = (val("#calendar_json") || "").trim();
+    if (!raw) return lastCfg?.calendar || { rules: [], exceptions: [] };
+    try {
+      return JSON.parse(raw);
+    } catch (e) {
+      throw new Error(`Kalender er ikke gyldig JSON: ${e.message}`);
+    }
+  }
   function buildPatch() {
     const m = selMode();
     const clock = (() => {
@@ -427,6 +441,7 @@
       mode: m,
       daily_time: val("#daily_time"),
       once_at: val("#once_at"),
+      calendar: readCalendar(),
       overlays_mode: "replace",
       overlays: overlaysLocal,
       show_message_primary: !!$("#show_message_primary")?.checked,
@@ -559,6 +574,8 @@
   async function saveAll() {
     try {
       const body = buildPatch();
+      // CAS: serveren avviser (409) hvis config er endret siden vi lastet den
+      if (lastCfg && Number.isInteger(lastCfg._version)) body._version = lastCfg._version;
       await postJSON("/api/config", body);
       // VIKTIG: alltid les tilbake persistert config etter lagring,
       // så vi får med backend-normalisering (f.eks. auto-rotate OFF når mode != picsum).
@@ -568,6 +585,15 @@
       pushPreview();
     } catch (e) {
       console.error(e);
+      if (e?.status === 409) {
+        // Ikke mist skjemaet: la brukeren velge mellom å overskrive og å laste på nytt
+        if (confirm("Config er endret et annet sted siden siden ble lastet.\nOK = overskriv med skjemaet, Avbryt = last inn på nytt.")) {
+          if (lastCfg) delete lastCfg._version;
+          return saveAll();
+        }
+        await loadAll().catch(console.error);
+        return;
+      }
       showStatusToast(`Kunne ikke lagre: ${e.message}`, "error", 3500);
       alert("Lagring feilet:\n" + (e?.message || e));
     }
@@ -589,6 +615,7 @@
     if (modeRadio) modeRadio.checked = true;
     $("#daily_time") && ($("#daily_time").value = cfg.daily_time || "");
     $("#once_at") && ($("#once_at").value = (cfg.once_at || "").replace("Z", ""));
+    $("#calendar_json") && ($("#calendar_json").value = JSON.stringify(cfg.calendar || { rules: [], exceptions: [] }, null, 2));
     $("#active_mode") &&
       ($("#active_mode").textContent = `Aktiv modus: ${cfg.mode} · Fase: ${tick?.mode || "—"} (${tick?.state || "—"})`);
     $("#show_message_primary") && ($("#show_message_primary").checked = !!cfg.show_message_primary);
@@ -1039,7 +1066,7 @@
       const id = Number(it?.id);
       const label = String(it?.label || "");
       if (!Number.isFinite(id) || id <= 0) return;
-      const url = `https://picsum.photos/id/${id}/${W}/${H}`;
+      const url = `/media/picsum/${id}/${W}x${H}`;
       const tile = document.createElement("div");
       tile.className = "tile curated";
       tile.style.border = "1px solid #2a2f37";
@@ -1059,6 +1086,11 @@
       img.style.height = "100%";
       img.style.objectFit = "cover";
       img.style.display = "block";
+      // Serverens cache tar bare id-er som er lagret i config; ulagrede hentes direkte
+      img.onerror = () => {
+        img.onerror = null;
+        img.src = `https://picsum.photos/id/${id}/${W}/${H}`;
+      };
       // Badge (#id)
       const badge = document.createElement("div");
       badge.style.position = "absolute";
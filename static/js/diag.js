@@ -166,6 +166,14 @@
         `Sist kontakt: ${since}${n.LastContactISO ? ` (${new Date(lastMs).toLocaleString()})` : ""}`,
         `SystemClockSynchronized: ${n.SystemClockSynchronized ? "Ja" : "Nei"}`,
       ];
+      // Tidskilden bak tick (avvik mot systemklokka, drift, slew)
+      try {
+        const t = (await (await fetch("/debug/time", { cache: "no-store" })).json())?.time || {};
+        lines.push(
+          `Tick-avvik: ${t.offset_ms ?? "—"} ms (maks ${t.max_abs_offset_ms ?? "—"} ms)`,
+          `Drift: ${t.drift_ppm ?? "—"} ppm · slew igjen: ${t.slew_pending_ms ?? "—"} ms · steg: ${t.steps ?? 0}`
+        );
+      } catch {}
       writeNtp(tgt, lines);
     } catch (e) {
       writeNtp(tgt, `Feil: ${e.message}`);
@@ -234,11 +242,17 @@
     const pad = (n) => String(n).padStart(2, "0");
     return { mmss: `${sgn}${Math.floor(h * 60 + m)}:${pad(s)}`, hms: `${sgn}${h}:${pad(m)}:${pad(s)}` };
   };
+  // Live-visning fra /events (Live); /tick hentes bare for latency-måling
   async function pollLive() {
     const t0 = performance.now();
     const r = await fetch("/tick", { cache: "no-store" });
     const t = await r.json();
     const dt = performance.now() - t0;
+    qs("#lat") && (qs("#lat").textContent = `latency: ${dt.toFixed(0)} ms`);
+    renderLive(t);
+  }
+  function renderLive(t) {
+    if (!t) return;
     const both = fmtBoth(t.signed_display_ms);
     qs("#countdown") && (qs("#countdown").textContent = both.mmss);
     qs("#phase") && (qs("#phase").textContent = `fase: ${t.mode} · state: ${t.state}`);
@@ -246,8 +260,9 @@
       (qs("#meta").textContent =
         `mål: ${t.target_hhmm || t.target_ms} · nå: ${new Date(t.now_ms).toLocaleTimeString()}`);
     qs("#both") && (qs("#both").textContent = `format: ${both.hms} / ${both.mmss}`);
-    qs("#lat") && (qs("#lat").textContent = `latency: ${dt.toFixed(0)} ms`);
-    qs("#live") && (qs("#live").textContent = JSON.stringify(t, null, 2));
+    const si = window.Live && window.Live.syncInfo();
+    const extra = si ? { sync_offset_ms: Math.round(si.offsetMs), sync_rtt_ms: si.rttMs && Math.round(si.rttMs) } : {};
+    qs("#live") && (qs("#live").textContent = JSON.stringify({ ...t, ...extra }, null, 2));
   }
   async function runSelftest() {
     const r = await fetch("/debug/selftest", { cache: "no-store" });
@@ -286,7 +301,13 @@
       .querySelectorAll("[data-dump]")
       .forEach((btn) => btn.addEventListener("click", () => dump(btn.dataset.dump).catch(console.error)));
     pollLive().catch(console.error);
-    setInterval(pollLive, 1000);
+    if (window.Live) {
+      window.Live.on("state", renderLive);
+      setInterval(() => renderLive(window.Live.tick()), 250);
+      setInterval(() => pollLive().catch(() => {}), 10_000);
+    } else {
+      setInterval(pollLive, 1000);
+    }
     // Eksponer for Topbar
     window.__runSelftest = runSelftest;
   }
@@ -0,0 +1,229 @@
+// static/js/live.js
+// Felles live-kanal for alle sider.
+// - /sync   → target + terskler + server-now; state/fase/blink regnes lokalt (compute()).
+//             Offset/RTT NTP-stil: offset = server_now − midtpunkt, beste (laveste RTT)
+//             av de siste prøvene. Resync ved config-revisjon, rollover og hvert RESYNC_MS.
+// - /events → 'state' (server-overgang) og 'config' (lagring) utløser resync; ingen 1 Hz /tick.
+//             'picsum' (ny id fra server-rotasjonen) og 'sys' (endret tjenestestatus,
+//             se app/sysinfo.py) videresendes som de er.
+// Faller tilbake til /sync-polling (FALLBACK_MS) bare når EventSource ikke finnes eller feiler.
+// Bruk: Live.on("state" | "config" | "picsum" | "sys", fn), Live.onFrame(fn), Live.tick()
+(function () {
+  "use strict";
+  if (window.Live) return;
+  const RESYNC_MS = 60_000;
+  const FALLBACK_MS = 15_000;
+  const MAX_ERRORS_BEFORE_POLL = 3;
+  const MAX_SAMPLES = 5;
+  // Skjermprofil (/?display=lobby): /sync svarer med profilens plan
+  const DISPLAY = new URLSearchParams(location.search).get("display");
+  const SYNC_URL = DISPLAY ? `/sync?display=${encodeURIComponent(DISPLAY)}` : "/sync";
+  const handlers = { state: [], config: [], picsum: [], sys: [] };
+  const frameFns = [];
+  const st = {
+    es: null,
+    sync: null, // siste /sync-svar
+    samples: [], // [{ offset, rtt }]
+    offsetMs: 0, // server_now - Date.now()
+    rttMs: null,
+    lastSyncAt: 0,
+    syncing: null,
+    cfgRev: null,
+    stateKey: "",
+    rolloverFor: null,
+    errors: 0,
+    pollTimer: null,
+    started: false,
+  };
+  function emit(type, data) {
+    (handlers[type] || []).forEach((fn) => {
+      try {
+        fn(data);
+      } catch (e) {
+        console.error(e);
+      }
+    });
+  }
+  function serverNow() {
+    return Date.now() + st.offsetMs;
+  }
+  // NTP-stil: anta symmetrisk vei, stol mest på prøven med lavest RTT
+  function addSample(serverMs, wallMid, rtt) {
+    if (!Number.isFinite(serverMs) || serverMs <= 0) return;
+    st.samples.push({ offset: serverMs - wallMid, rtt });
+    if (st.samples.length > MAX_SAMPLES) st.samples.shift();
+    const best = st.samples.reduce((a, b) => (b.rtt < a.rtt ? b : a));
+    st.offsetMs = best.offset;
+    st.rttMs = best.rtt;
+  }
+  function sync() {
+    if (st.syncing) return st.syncing;
+    st.syncing = (async () => {
+      try {
+        const wall0 = Date.now();
+        const p0 = performance.now();
+        const r = await fetch(SYNC_URL, { cache: "no-store" });
+        const rtt = performance.now() - p0;
+        const s = await r.json();
+        addSample(Number(s.now_ms), wall0 + rtt / 2, rtt);
+        acceptSync(s);
+      } catch {
+      } finally {
+        st.syncing = null;
+      }
+    })();
+    return st.syncing;
+  }
+  function acceptSync(s) {
+    if (!s || typeof s !== "object") return;
+    st.sync = s;
+    st.lastSyncAt = Date.now();
+    // etag (innholdshash) er den presise revisjonen; cfg_rev er reserve for eldre server
+    const rev = s.cfg_etag ?? s.cfg_rev ?? null;
+    const revChanged = st.cfgRev !== null && rev !== null && rev !== st.cfgRev;
+    if (rev !== null) st.cfgRev = rev;
+    st.stateKey = ""; // nye parametre → send 'state' ved neste frame
+    if (revChanged) emit("config", { rev: s.cfg_rev, etag: s.cfg_etag });
+  }
+  // Samme regler som countdown.compute_tick, med parametre fra /sync
+  function compute(now) {
+    const s = st.sync;
+    if (!s) return null;
+    const base = {
+      now_ms: now,
+      target_ms: s.target_ms,
+      target_hhmm: s.target_hhmm,
+      warn_ms: s.warn_ms,
+      alert_ms: s.alert_ms,
+      overrun_ms: s.overrun_ms,
+      cfg_rev: s.cfg_rev,
+      cfg_etag: s.cfg_etag,
+    };
+    if (s.clock) return { ...base, display_ms: 0, signed_display_ms: 0, state: "clock", mode: "clock", blink: false };
+    if (!(s.target_ms > 0)) return { ...base, display_ms: 0, signed_display_ms: 0, state: "idle", mode: "ended", blink: false };
+    const signed = s.target_ms - now;
+    if (signed > 0) {
+      const mode = signed <= s.alert_ms ? "alert" : signed <= s.warn_ms ? "warn" : "normal";
+      return { ...base, display_ms: signed, signed_display_ms: signed, state: "countdown", mode, blink: signed <= s.blink_ms };
+    }
+    if (-signed <= s.overrun_ms) {
+      const display = Math.max(0, s.overrun_ms + signed);
+      return { ...base, display_ms: display, signed_display_ms: signed, state: "overrun", mode: "over", blink: false };
+    }
+    return { ...base, display_ms: 0, signed_display_ms: signed, state: "ended", mode: "ended", blink: false };
+  }
+  function tick() {
+    return compute(serverNow());
+  }
+  function frame() {
+    const t = tick();
+    if (t) {
+      const key = `${t.state}|${t.mode}|${t.blink}|${t.target_ms}`;
+      if (key !== st.stateKey) {
+        st.stateKey = key;
+        emit("state", t);
+      }
+      // Rollover (daily → neste dag, duration → rydding): serveren vet neste target
+      if (t.state === "ended" && t.target_ms > 0 && st.rolloverFor !== t.target_ms) {
+        st.rolloverFor = t.target_ms;
+        sync();
+      }
+      frameFns.forEach((fn) => {
+        try {
+          fn(t);
+        } catch (e) {
+          console.error(e);
+        }
+      });
+    }
+    requestAnimationFrame(frame);
+  }
+  function startPolling() {
+    if (st.pollTimer) return;
+    sync();
+    st.pollTimer = setInterval(sync, FALLBACK_MS);
+  }
+  function stopPolling() {
+    clearInterval(st.pollTimer);
+    st.pollTimer = null;
+  }
+  function connect() {
+    if (!window.EventSource) {
+      startPolling();
+      return;
+    }
+    const es = new EventSource("/events");
+    st.es = es;
+    es.addEventListener("open", () => {
+      st.errors = 0;
+      stopPolling();
+    });
+    // Serveren melder overganger den ser; lokalt regnes de uansett. Resync bare
+    // når parametrene avviker (ny target/revisjon, f.eks. duration startet).
+    es.addEventListener("state", (ev) => {
+      let t = null;
+      try {
+        t = JSON.parse(ev.data);
+      } catch {}
+      const s = st.sync;
+      if (!t || !s) return;
+      if (t.target_ms !== s.target_ms || (t.cfg_etag ?? null) !== (s.cfg_etag ?? null)) sync();
+    });
+    es.addEventListener("config", (ev) => {
+      let data = {};
+      try {
+        data = JSON.parse(ev.data);
+      } catch {}
+      const rev = data.etag ?? data.rev;
+      if (rev !== undefined) st.cfgRev = rev;
+      emit("config", data);
+      sync();
+    });
+    es.addEventListener("picsum", (ev) => {
+      try {
+        emit("picsum", JSON.parse(ev.data));
+      } catch {}
+    });
+    es.addEventListener("sys", (ev) => {
+      try {
+        emit("sys", JSON.parse(ev.data));
+      } catch {}
+    });
+    es.addEventListener("error", () => {
+      st.errors += 1;
+      // EventSource reconnecter selv; poll bare mens den er nede
+      if (st.errors >= MAX_ERRORS_BEFORE_POLL || es.readyState === EventSource.CLOSED) startPolling();
+      if (es.readyState === EventSource.CLOSED) setTimeout(connect, 15000);
+    });
+  }
+  function start() {
+    if (st.started) return;
+    st.started = true;
+    sync();
+    connect();
+    setInterval(() => {
+      if (Date.now() - st.lastSyncAt >= RESYNC_MS - 1000) sync();
+    }, RESYNC_MS);
+    requestAnimationFrame(frame);
+  }
+  function on(type, fn) {
+    (handlers[type] = handlers[type] || []).push(fn);
+    start();
+    if (type === "state" && st.sync) fn(tick());
+  }
+  // Kalles hver animasjonsframe med ferdig beregnet tick (pauser når fanen er skjult)
+  function onFrame(fn) {
+    frameFns.push(fn);
+    start();
+  }
+  window.Live = {
+    on,
+    onFrame,
+    tick,
+    serverNow,
+    sync,
+    start,
+    isPolling: () => !!st.pollTimer,
+    syncInfo: () => ({ offsetMs: st.offsetMs, rttMs: st.rttMs, lastSyncAt: st.lastSyncAt }),
+  };
+})();
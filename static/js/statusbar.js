@@ -66,10 +66,31 @@
   function init() {
     // Ingen hard avhengighet til markup; gjør kun det som er mulig på siden
     startClock();
-    pollTick();
-    setInterval(pollTick, 1000);
+    if (window.Live && qs("#sb_cd")) {
+      let lastCd = "";
+      const renderTick = (t) => {
+        const txt = fmtMMSS(t.signed_display_ms);
+        if (txt === lastCd) return;
+        lastCd = txt;
+        qs("#sb_cd").textContent = txt;
+      };
+      window.Live.onFrame(renderTick);
+    } else {
+      pollTick();
+      setInterval(pollTick, 1000);
+    }
     pollServices();
-    setInterval(pollServices, 10000);
+    if (window.Live && qs(".sb-services")) {
+      // Endringer kommer som 'sys' over /events; polling er bare en sjelden kontroll
+      window.Live.on("sys", (ev) => {
+        const s = ev.services || {};
+        setDot("app", !!s.app?.active);
+        setDot("kiosk", !!s.kiosk?.active);
+      });
+      setInterval(pollServices, 60000);
+    } else {
+      setInterval(pollServices, 10000);
+    }
   }
   if (document.readyState === "loading") {
     document.addEventListener("DOMContentLoaded", init, { once: true });
@@ -111,8 +111,20 @@ export const Topbar = (() => {
         qs("#tb_cd", root).textContent = fmtMMSS(t.signed_display_ms);
       } catch {}
     }
-    pollTick();
-    setInterval(pollTick, 1000);
+    // Live (lokal beregning pr. frame) når tilgjengelig; ellers egen 1 Hz polling
+    let lastCd = "";
+    const renderTick = (t) => {
+      const txt = fmtMMSS(t.signed_display_ms);
+      if (txt === lastCd) return;
+      lastCd = txt;
+      qs("#tb_cd", root).textContent = txt;
+    };
+    if (window.Live) {
+      window.Live.onFrame(renderTick);
+    } else {
+      pollTick();
+      setInterval(pollTick, 1000);
+    }
     async function pollSvcs() {
       try {
         const r = await fetch("/api/sys/about-status", { headers: authHeaders() });
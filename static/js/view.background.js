@@ -35,7 +35,8 @@
       vw = side;
       vh = side;
     }
-    return { vw, vh };
+    // Picsum (og /media-cachen) leverer maks 5000 px pr. side
+    return { vw: Math.min(vw, 5000), vh: Math.min(vh, 5000) };
   }
   // Bygg nøyaktig Picsum-URL fra bakgrunnskonfig (brukes også for preloading)
   function buildPicsumUrlFromBg(bg) {
@@ -45,7 +46,8 @@
     let base;
     const idNum = Number(pc.id ?? 0);
     if (Number.isFinite(idNum) && idNum > 0) {
-      base = `https://picsum.photos/id/${idNum}/${vw}/${vh}`;
+      // Fast id → via serverens diskcache (hentes én gang, neste i katalogen forhåndshentes)
+      base = `/media/picsum/${idNum}/${vw}x${vh}`;
     } else if (pc.lock_seed && (pc.seed || "").trim()) {
       base = `https://picsum.photos/seed/${encodeURIComponent(pc.seed.trim())}/${vw}/${vh}`;
     } else {
@@ -55,8 +57,35 @@
     if (pc.grayscale) params.push("grayscale");
     const blurN = Math.max(0, Math.min(10, Number(pc.blur || 0) || 0));
     if (blurN > 0) params.push(`blur=${blurN}`);
+    // Tint bakes inn på serveren (én bitmap, ingen gradient-lag over bildet)
+    const tintQ = bakedTintQuery(pc.tint);
+    if (tintQ && base.startsWith("/media/picsum/")) {
+      base = base.replace("/media/picsum/", "/media/bg/picsum/");
+      params.push(tintQ);
+    }
     return params.length ? `${base}?${params.join("&")}` : base;
   }
+  // Ferdigrendrede varianter (/media/bg/*, krever Pillow på serveren). Slås av for
+  // resten av økten ved første feil (501 uten Pillow) → CSS-filter/tint-lag som før.
+  let variantsOk = true;
+  const DYN_SCALE = 4; // dynamic-laget er blurret; 1/4 oppløsning skaleres opp
+  function bakedTintQuery(tint) {
+    if (!variantsOk || !tint?.color || !(Number(tint.opacity) > 0)) return "";
+    const hex = String(tint.color).replace(/^#/, "");
+    return `tint=${encodeURIComponent(hex)}&tint_opacity=${clamp(Number(tint.opacity), 0, 1)}`;
+  }
+  function isBaked(url) {
+    return String(url || "").startsWith("/media/bg/");
+  }
+  // Sjekk varianten i bakgrunnen; ved feil: husk det og tegn klassisk på nytt
+  function probeVariant(el, url, fallback) {
+    const probe = new Image();
+    probe.onerror = () => {
+      variantsOk = false;
+      if (el.isConnected && String(el.style.backgroundImage || el.style.background).includes(url)) fallback();
+    };
+    probe.src = url;
+  }
   // Enkelt preloader; løses når bildet er lastet (timeout → reject)
   function preloadImage(url, timeoutMs = 30000) {
     return new Promise((resolve, reject) => {
@@ -166,12 +195,26 @@
       return;
     }
     const fit = (bg?.image?.fit || "cover").toLowerCase();
+    const tintQ = url.startsWith("/static/") ? bakedTintQuery(bg?.image?.tint) : "";
+    if (tintQ) {
+      const { vw, vh } = viewportPxForPicsum(fit);
+      const baked = `/media/bg/image/${vw}x${vh}?src=${encodeURIComponent(url)}&fit=${fit}&${tintQ}`;
+      applyBaseImageLayers(el, fit, baked, null);
+      probeVariant(el, baked, () => applyBgImage(el, bg));
+      return;
+    }
     applyBaseImageLayers(el, fit, url, bg?.image?.tint);
   }
   function applyBgPicsum(el, bg) {
     const url = buildPicsumUrlFromBg(bg);
     const pc = bg?.picsum || {};
-    applyBaseImageLayers(el, (pc.fit || "cover").toLowerCase(), url, pc.tint);
+    const fit = (pc.fit || "cover").toLowerCase();
+    if (isBaked(url)) {
+      applyBaseImageLayers(el, fit, url, null);
+      probeVariant(el, url, () => applyBgPicsum(el, bg));
+      return;
+    }
+    applyBaseImageLayers(el, fit, url, pc.tint);
   }
   window.ViewBg = { applyBackground, viewportPxForPicsum, buildPicsumUrlFromBg, preloadImage };
   function applyBgDynamic(rootEl, bg) {
@@ -212,17 +255,26 @@
     // Signatur for å unngå unødvendig restart av animasjonen
     const sig = JSON.stringify({ from, to, rotateS, blurPx, opacity, layerPos, s1, s2, cdeg, zUnder, zOver });
     const prevSig = layer.dataset.dynsig || "";
-    // Oppdater statiske stiler
+    // Oppdater statiske stiler. Foretrekk forhåndsblurret bitmap (ingen filter pr. frame).
+    const hex = (c) => encodeURIComponent(String(c).replace(/^#/, ""));
+    const dw = Math.max(1, Math.ceil((window.innerWidth || 1280) / DYN_SCALE));
+    const dh = Math.max(1, Math.ceil((window.innerHeight || 720) / DYN_SCALE));
+    const baked = variantsOk
+      ? `/media/bg/dynamic/${dw}x${dh}?from=${hex(from)}&to=${hex(to)}&blur=${blurPx / DYN_SCALE}` +
+        `&s1=${[s1x, s1y, p1x, p1y, st1].join(",")}&s2=${[s2x, s2y, p2x, p2y, st2].join(",")}`
+      : "";
     Object.assign(layer.style, {
       zIndex,
-      filter: `blur(${blurPx}px)`,
+      filter: baked ? "none" : `blur(${blurPx}px)`,
       opacity: String(opacity),
       // bakgrunnsmønster basert på config
-      background:
-        `radial-gradient(${s1x}vmax ${s1y}vmax at ${p1x}% ${p1y}%, ${from} 0%, transparent ${st1}%),` +
-        `radial-gradient(${s2x}vmax ${s2y}vmax at ${p2x}% ${p2y}%, ${to} 0%, transparent ${st2}%),` +
-        `conic-gradient(from ${cdeg}deg at 50% 50%, #0000 0%, #0000 100%)`,
+      background: baked
+        ? `url("${baked}") center / 100% 100% no-repeat`
+        : `radial-gradient(${s1x}vmax ${s1y}vmax at ${p1x}% ${p1y}%, ${from} 0%, transparent ${st1}%),` +
+          `radial-gradient(${s2x}vmax ${s2y}vmax at ${p2x}% ${p2y}%, ${to} 0%, transparent ${st2}%),` +
+          `conic-gradient(from ${cdeg}deg at 50% 50%, #0000 0%, #0000 100%)`,
     });
+    if (baked) probeVariant(layer, baked, () => applyBgDynamic(rootEl, bg));
     // Anim-skala via CSS-variabel (endringer krever ikke restart)
     layer.style.setProperty("--dynbg-scale", String(animScale));
     // Restart kun når signatur endres (inkl. rotate_s, blur, posisjoner, osv.)
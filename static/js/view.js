@@ -1,6 +1,6 @@
 // static/js/view.js
-// Wire-up: state, rendering, polling, fullscreen, preview.
-// Forutsetter at view.background.js og view.overlays.js lastes først.
+// Wire-up: state, rendering, live-oppdatering (/events), fullscreen, preview.
+// Forutsetter at live.js, view.background.js og view.overlays.js lastes først.
 (function () {
   "use strict";
   const $ = (s, r) => (r || document).querySelector(s);
@@ -9,11 +9,16 @@
     cfg: null,
     tick: null,
     lastCfgRev: 0,
+    cfgEtag: "",
+    lastTickKey: "",
     clockTimer: null,
     isPreview: new URLSearchParams(location.search).get("preview") === "1",
-    picsum: { id: null, pollTimer: null },
+    display: new URLSearchParams(location.search).get("display") || "",
+    picsum: { id: null, pending: null },
   };
   if (state.isPreview) document.documentElement.classList.add("is-preview");
+  // Skjermprofil: samme query på config- og tick-kall (egen ETag pr. profil)
+  const displayQuery = state.display ? `?display=${encodeURIComponent(state.display)}` : "";
   const clamp = (n, lo, hi) => Math.max(lo, Math.min(hi, n));
   const fmtMMSS = (ms) => {
     const neg = ms < 0 ? "-" : "";
@@ -69,10 +74,9 @@
   // HARD teardown når vi ikke er i picsum-modus
   function picsumTearDownIfInactive() {
     if (picsumShouldRun()) return;
-    // 1) Stopp videre polling
-    clearTimeout(state.picsum.pollTimer);
-    state.picsum.pollTimer = null;
+    // 1) Glem gjeldende/ventende bilde
     state.picsum.id = null;
+    state.picsum.pending = null;
     // 2) Fjern ev. eldre hooks (om vi skulle ha dem i fremtiden)
     try {
       if (window.ViewBg?.clearPicsum) window.ViewBg.clearPicsum();
@@ -89,81 +93,32 @@
       el.style.backgroundPosition = "";
     }
   }
-  function picsumSchedule(ms) {
-    clearTimeout(state.picsum.pollTimer);
-    state.picsum.pollTimer = setTimeout(picsumPoll, Math.max(750, Math.min(ms || 5000, 24 * 60 * 60 * 1000)));
-  }
-  async function picsumPoll() {
+  // Rotasjonen gjøres på serveren (scheduler); her byttes bildet bare når ny id
+  // kommer (SSE 'picsum' eller ny config), med forhåndslasting + crossfade.
+  async function picsumApply(id) {
+    if (!picsumShouldRun() || !Number.isFinite(id) || id <= 0) return;
+    if (id === state.picsum.id || id === state.picsum.pending) return;
+    state.picsum.pending = id;
+    const curBg = state.cfg?.theme?.background || {};
+    const nextBg = JSON.parse(JSON.stringify(curBg));
+    nextBg.picsum = nextBg.picsum || {};
+    nextBg.picsum.id = id;
     try {
-      if (!picsumShouldRun()) {
-        picsumSchedule(5000);
-        return;
-      }
-      const r = await fetch("/api/picsum/next", { cache: "no-store" });
-      const js = await r.json();
-      // Forventet: { ok, id, enabled, interval_seconds, next_in_seconds, updated }
-      if (!js || js.ok === false || js.enabled === false) {
-        picsumSchedule(5000);
-        return;
-      }
-      // Oppdatér bakgrunn straks når backend sier “updated”
-      if (js.updated && Number.isFinite(js.id) && js.id > 0) {
-        const curBg = state.cfg?.theme?.background || {};
-        const nextBg = JSON.parse(JSON.stringify(curBg));
-        nextBg.picsum = nextBg.picsum || {};
-        nextBg.picsum.id = js.id;
-        // Prøv å forhåndslaste – men UANSETT: bytt etterpå, så vi ikke “stivner”.
-        let applied = false;
-try {
-  const url = window.ViewBg.buildPicsumUrlFromBg(nextBg);
-  await window.ViewBg.preloadImage(url, 30000);
-  window.ViewBg.applyBackground(document.body, nextBg, { durationMs: 1000 });
-  applied = true;
-} catch {
-  // Behold nåværende bakgrunn; vi forsøker på nytt ved neste poll
-}
-if (applied) {
-  state.picsum.id = js.id;
-  state.cfg.theme = state.cfg.theme || {};
-  state.cfg.theme.background = nextBg;
-  ensureForeground();
-}
-
-        let wait = clamp((parseInt(js.interval_seconds, 10) || 60), 5, 3600);
-if (!applied) wait = Math.min(wait, 5);
-picsumSchedule(wait * 1000);
-
-        return;
-      }
-      // Ikke bytte ennå → poll hurtigere nær slutten
-      const nextIn = clamp(parseInt(js.next_in_seconds, 10) || 0, 0, 24 * 60 * 60);
-      picsumSchedule(nextIn > 3 ? 5000 : 1000);
-      // Første oppstart: ta id selv om updated=false
-      if (!state.picsum.id && Number.isFinite(js.id) && js.id > 0) {
-        const curBg = state.cfg?.theme?.background || {};
-        const nextBg = JSON.parse(JSON.stringify(curBg));
-        nextBg.picsum = nextBg.picsum || {};
-        nextBg.picsum.id = js.id;
-        let applied = false;
-try {
-  const url = window.ViewBg.buildPicsumUrlFromBg(nextBg);
-  await window.ViewBg.preloadImage(url, 15000);
-  window.ViewBg.applyBackground(document.body, nextBg, { durationMs: 1000 });
-  applied = true;
-} catch {
-  // hopp over bytte nå; prøv igjen ved neste poll
-}
-if (applied) {
-  state.picsum.id = js.id;
-  state.cfg.theme.background = nextBg;
-  ensureForeground();
-}
-
-      }
+      const url = window.ViewBg.buildPicsumUrlFromBg(nextBg);
+      await window.ViewBg.preloadImage(url, 30000);
+      if (state.picsum.pending !== id || !picsumShouldRun()) return; // nyere id/ny modus kom imens
+      // Bygg på config slik den er nå (kan ha blitt hentet på nytt under lastingen)
+      const bgNow = JSON.parse(JSON.stringify(state.cfg.theme.background));
+      bgNow.picsum = bgNow.picsum || {};
+      bgNow.picsum.id = id;
+      window.ViewBg.applyBackground(document.body, bgNow, { durationMs: 1000 });
+      state.picsum.id = id;
+      state.cfg.theme.background = bgNow;
+      ensureForeground();
     } catch {
-let wait = clamp((parseInt(js.interval_seconds, 10) || 60), 5, 3600);
-if (!applied) wait = Math.min(wait, 5);
-picsumSchedule(wait * 1000);
+      // Behold nåværende bakgrunn; neste rotasjon prøver igjen
+    } finally {
+      if (state.picsum.pending === id) state.picsum.pending = null;
     }
   }
   // ---------- Sørg for at innhold alltid ligger foran bakgrunnslag ----------
@@ -344,45 +299,58 @@ picsumSchedule(wait * 1000);
     else renderCountdown();
   }
   // Data
+  // Betinget GET: 304 når config-revisjonen (ETag) er uendret → ingen body/parse/render.
+  // Returnerer true når ny config ble lastet.
   async function fetchConfig() {
-    const r = await fetch("/api/config");
+    const headers = state.cfg && state.cfgEtag ? { "If-None-Match": `"${state.cfgEtag}"` } : {};
+    const r = await fetch(`/api/config${displayQuery}`, { headers, cache: "no-store" });
+    if (r.status === 304) return false;
     const js = await r.json();
     state.cfg = js.config;
     state.lastCfgRev = js.config._updated_at || 0;
+    state.cfgEtag = (r.headers.get("ETag") || "").replace(/^W\//, "").replace(/"/g, "");
     sendHeartbeat();
+    return true;
   }
   async function firstLoad() {
-    await fetchConfig();
-    const r = await fetch("/tick");
-    state.tick = await r.json();
+    await Promise.all([fetchConfig(), window.Live.sync()]);
+    state.tick = window.Live.tick();
+    if (!state.tick) {
+      const r = await fetch(`/tick${displayQuery}`);
+      state.tick = await r.json();
+    }
     render();
     sendHeartbeat();
-    // Start unified picsum-polling (kjører kun når bg.mode === "picsum")
-    picsumSchedule(200);
+    if (picsumShouldRun()) state.picsum.id = state.cfg?.theme?.background?.picsum?.id ?? null;
+    // Fasene regnes lokalt hver frame (Live, /sync); /events utløser bare resync
+    window.Live.onFrame(refreshTick);
+    window.Live.on("config", onConfigChanged);
+    window.Live.on("picsum", (ev) => picsumApply(Number(ev?.id)));
   }
-  async function pollTick() {
-    const r = await fetch("/tick");
-    const t = await r.json();
+  // Render kun når noe synlig endres (sekund, state, fase, blink)
+  function refreshTick(t) {
+    if (!t) return;
     state.tick = t;
-    if ((t.cfg_rev || 0) !== state.lastCfgRev) await fetchConfig();
+    const key = `${t.state}|${t.mode}|${t.blink}|${t.target_ms}|${Math.floor((t.signed_display_ms || 0) / 1000)}`;
+    if (key === state.lastTickKey) return;
+    state.lastTickKey = key;
     render();
   }
-  async function pollConfig() {
+  async function onConfigChanged(ev) {
     try {
-      const r = await fetch("/api/config", { cache: "no-store" });
-      if (!r.ok) return;
-      const js = await r.json();
-      const cfg = js.config || {};
-      const rev = cfg._updated_at || 0;
-      if (rev !== state.lastCfgRev) {
-        state.cfg = cfg;
-        state.lastCfgRev = rev;
-        if ((cfg?.theme?.background?.mode || "").toLowerCase() !== "picsum") {
-          // viktig: bryt picsum-kjede straks config sier vi ikke er i picsum
-          picsumTearDownIfInactive();
-        }
-        render();
+      if (ev && ev.etag && ev.etag === state.cfgEtag) return; // egen/duplikat revisjon
+      const shownId = state.picsum.id;
+      if (!(await fetchConfig())) return;
+      // Ny picsum-id i config (rotasjon): vis gjeldende bilde til det nye er lastet
+      const pc = state.cfg?.theme?.background?.picsum;
+      if (picsumShouldRun() && shownId && pc?.id && pc.id !== shownId) {
+        const nextId = pc.id;
+        pc.id = shownId;
+        picsumApply(nextId);
       }
+      // viktig: bryt picsum-kjede straks config sier vi ikke er i picsum
+      picsumTearDownIfInactive();
+      render();
     } catch {}
   }
   // Heartbeat
@@ -442,8 +410,6 @@ picsumSchedule(wait * 1000);
   // Preview
   if (!state.isPreview) {
     firstLoad().catch(console.error);
-    setInterval(pollTick, 1000);
-    setInterval(pollConfig, 3000);
   } else {
     window.addEventListener("message", (ev) => {
       const d = ev.data;
@@ -3,3 +3,19 @@ import os, sys
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
+# SSE-relay over unix-sockets trengs ikke i tester
+os.environ.setdefault("COUNTDOWN_SSE_BACKEND", "memory")
+# Planleggeren kjøres eksplisitt (scheduler.run_due) i tester, ikke som tråd
+os.environ.setdefault("COUNTDOWN_SCHEDULER", "0")
+# Metrikker deles ikke via fil mellom testprosesser (test_metrics slår det på selv)
+os.environ.setdefault("COUNTDOWN_METRICS_SHARED", "0")
+import pytest  # noqa: E402
+import app.storage as storage  # noqa: E402
+@pytest.fixture
+def cfg_path(tmp_path, monkeypatch):
+    """Egen config.json pr. test; lagringer skrives med en gang (ingen samlevindu)."""
+    path = tmp_path / "config.json"
+    monkeypatch.setattr(storage, "CONFIG_PATH", path)
+    monkeypatch.setattr(storage, "COALESCE_WINDOW_S", 0)
+    storage.invalidate_config_cache()
+    return path
@@ -0,0 +1,30 @@
+"""
+Pytest: betinget GET av /api/config (ETag / If-None-Match) og cfg_etag i /tick.
+"""
+import app.storage as storage
+from app import create_app
+
+
+def test_matching_etag_returns_304(cfg_path):
+    client = create_app().test_client()
+    first = client.get("/api/config")
+    assert first.status_code == 200
+    etag, _ = first.get_etag()
+    assert etag
+    again = client.get("/api/config", headers={"If-None-Match": f'"{etag}"'})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.get_etag()[0] == etag
+    assert client.get("/tick").get_json()["cfg_etag"] == etag
+
+
+def test_etag_changes_after_save(cfg_path):
+    client = create_app().test_client()
+    etag, _ = client.get("/api/config").get_etag()
+    storage.save_config_patch({"message_primary": "Hei"})
+    resp = client.get("/api/config", headers={"If-None-Match": f'"{etag}"'})
+    assert resp.status_code == 200
+    assert resp.get_etag()[0] != etag
+    # Revisjonen er innholdet på disk: kald lesing gir samme etag som skrivingen
+    storage.invalidate_config_cache()
+    assert storage.load_config_versioned()[1] == resp.get_etag()[0]
@@ -0,0 +1,104 @@
+"""
+Pytest: ASGI-modus (/events på asyncio + WSGI-bro), uten ekstern server.
+"""
+import asyncio
+import json
+
+import pytest
+
+import app.sse as sse
+from app import create_app
+from app.asgi import create_asgi_app
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _scope(path, method="GET", query=b""):
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": query,
+        "headers": [(b"host", b"localhost")],
+        "server": ("localhost", 5000),
+        "client": ("127.0.0.1", 1234),
+    }
+
+
+def test_wsgi_bridge_serves_flask_routes(cfg_path):
+    app = create_asgi_app(create_app())
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(msg):
+        sent.append(msg)
+
+    _run(app(_scope("/tick"), receive, send))
+    assert sent[0]["status"] == 200
+    body = json.loads(sent[1]["body"])
+    assert "state" in body and "cfg_rev" in body
+
+
+def test_events_stream_delivers_published_frames(cfg_path):
+    app = create_asgi_app(create_app(), ping_interval=5.0)
+    bodies = []
+
+    async def main():
+        disconnect = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(msg):
+            if msg["type"] == "http.response.body":
+                bodies.append(msg["body"])
+                if len(bodies) == 1:
+                    # publiser fra en annen tråd, slik WSGI-ruter gjør
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, sse.publish, {"type": "config", "rev": 9}
+                    )
+                elif len(bodies) == 2:
+                    disconnect.set()
+
+        await asyncio.wait_for(app(_scope("/events"), receive, send), timeout=5)
+
+    before = sse.subscriber_count()
+    _run(main())
+    assert bodies[0].startswith(sse.RETRY_FRAME)
+    assert b"event: state\n" in bodies[0]
+    assert b"event: config\n" in bodies[1] and b'"rev":9' in bodies[1]
+    assert sse.subscriber_count() == before  # avmeldt etter disconnect
+
+
+def test_events_cancellation_propagates_after_cleanup(cfg_path):
+    app = create_asgi_app(create_app(), ping_interval=5.0)
+    before = sse.subscriber_count()
+
+    async def main():
+        first = asyncio.Event()
+
+        async def receive():
+            await asyncio.Event().wait()  # klienten kobler aldri fra selv
+
+        async def send(msg):
+            if msg["type"] == "http.response.body":
+                first.set()
+
+        task = asyncio.ensure_future(app(_scope("/events"), receive, send))
+        await asyncio.wait_for(first.wait(), timeout=5)
+        await asyncio.sleep(0)
+        assert sse.subscriber_count() == before + 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    _run(main())
+    assert sse.subscriber_count() == before  # ryddet i finally
@@ -0,0 +1,85 @@
+"""
+Pytest: require_password med hashet passord pr. revisjon og sesjonstoken.
+"""
+import pytest
+
+import app.auth as auth
+import app.storage as storage
+from app import create_app
+
+
+@pytest.fixture
+def cfg_path(cfg_path, monkeypatch):
+    monkeypatch.delenv("COUNTDOWN_DISABLE_AUTH", raising=False)
+    return cfg_path
+
+
+@pytest.fixture
+def client(cfg_path):
+    app = create_app()
+    app.testing = True
+    return app.test_client()
+
+
+def test_password_then_cookie_token_skips_config_load(client, cfg_path, monkeypatch):
+    assert client.post("/api/stop").status_code == 200  # uten passord: åpent
+    storage.save_config_patch({"admin_password": "hemmelig"})
+    assert client.post("/api/stop").status_code == 401
+    assert client.post("/api/stop", headers={"X-Admin-Password": "feil"}).status_code == 401
+    r = client.post("/api/stop", headers={"X-Admin-Password": "hemmelig"})
+    assert r.status_code == 200 and auth.TOKEN_COOKIE in r.headers.get("Set-Cookie", "")
+    calls = []
+    real = storage.load_config
+    monkeypatch.setattr(storage, "load_config", lambda: calls.append(1) or real())
+    assert client.get("/api/sys/ntp-status").status_code != 401  # cookien holder
+    assert calls == []  # samme revisjon: ingen config-lesing i auth
+
+
+def test_tokens_expire_and_die_with_password_change(client, cfg_path):
+    storage.save_config_patch({"admin_password": "a"})
+    token, exp = auth.issue_token()
+    assert auth.verify_token(token) == exp
+    assert auth.verify_token(token, now=exp) is None
+    assert auth.verify_token(token[:-1] + ("0" if token[-1] != "0" else "1")) is None
+    r = client.post("/api/auth/token", headers={"X-Admin-Password": "a"})
+    assert r.status_code == 200 and auth.verify_token(r.get_json()["token"])
+    client.delete_cookie(auth.TOKEN_COOKIE)
+    assert client.post("/api/stop", headers={"X-Admin-Token": token}).status_code == 200
+    storage.save_config_patch({"admin_password": "b"})
+    assert auth.verify_token(token) is None
+    client.delete_cookie(auth.TOKEN_COOKIE)
+    assert client.post("/api/stop", headers={"X-Admin-Token": token}).status_code == 401
+
+
+def test_random_secret_is_created_once_with_private_mode(client, cfg_path, monkeypatch):
+    monkeypatch.delenv("COUNTDOWN_SECRET_KEY", raising=False)
+    storage.save_config_patch({"admin_password": "a"})
+    token, _exp = auth.issue_token()
+    secret = auth.secret_path_for(cfg_path)
+    assert secret.exists() and (secret.stat().st_mode & 0o777) == 0o600
+    auth._secrets.clear()
+    assert auth.verify_token(token)  # samme fil etter "omstart"
+    monkeypatch.setenv("COUNTDOWN_SECRET_KEY", "overstyrt")
+    monkeypatch.setattr(auth, "_cred", (None, None, b""))
+    assert auth.verify_token(token) is None  # miljøvariabelen vinner
+
+
+def test_cookie_writes_need_same_origin_json(client, cfg_path):
+    storage.save_config_patch({"admin_password": "a"})
+    assert client.post("/api/stop", headers={"X-Admin-Password": "a"}).status_code == 200  # gir cookie
+    assert client.post("/api/stop").status_code == 403  # skjema-lignende: ingen JSON
+    assert client.post("/api/stop", json={}, headers={"Origin": "https://evil.example"}).status_code == 403
+    assert client.post("/api/stop", json={}, headers={"Origin": "http://localhost"}).status_code == 200
+    assert client.post("/api/stop", headers={"X-Requested-With": "fetch"}).status_code == 200
+    assert client.get("/api/sys/ntp-status").status_code != 403
+
+
+def test_runtime_revisions_reuse_the_token_key(client, cfg_path):
+    storage.save_config_patch({"admin_password": "a", "mode": "duration", "duration_minutes": 5})
+    auth._credential()
+    etag, _digest, key = auth._cred
+    misses = auth._token_key.cache_info().misses
+    storage.start_duration(5)  # bare kjøreverdi: ny etag, samme passord
+    auth._credential()
+    assert auth._cred[0] != etag and auth._cred[2] == key
+    assert auth._token_key.cache_info().misses == misses
@@ -0,0 +1,122 @@
+"""
+Pytest: SSE-backends (in-memory og unix-datagram-relay mellom "workere").
+"""
+import os
+import queue
+import socket
+import stat
+import tempfile
+import threading
+
+import pytest
+
+import app.settings as settings
+import app.sse as sse
+from app.broker import InMemoryBackend, UnixDatagramBackend, default_backend
+
+
+def test_frame_is_encoded_once_and_shared():
+    sse.set_backend(InMemoryBackend())
+    queues = [sse._new_queue() for _ in range(3)]
+    try:
+        sse.publish({"type": "state", "state": "countdown"})
+        frames = [sq.q.get_nowait() for sq in queues]
+        assert all(f is frames[0] for f in frames)
+    finally:
+        for sq in queues:
+            sse._remove_queue(sq)
+        sse.set_backend(None)
+
+
+def test_in_memory_backend_reaches_local_subscribers():
+    sse.set_backend(InMemoryBackend())
+    sq = sse._new_queue()
+    try:
+        sse.publish({"type": "config", "rev": 7})
+        frame = sq.q.get_nowait()
+        assert b"event: config\n" in frame
+        assert b'"rev":7' in frame
+    finally:
+        sse._remove_queue(sq)
+        sse.set_backend(None)
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="krever AF_UNIX")
+def test_unix_relay_fans_out_to_other_worker(tmp_path):
+    got_a: "queue.Queue[bytes]" = queue.Queue()
+    got_b: "queue.Queue[bytes]" = queue.Queue()
+    a = UnixDatagramBackend(str(tmp_path))
+    b = UnixDatagramBackend(str(tmp_path))
+    a.start(got_a.put)
+    b.start(got_b.put)
+    try:
+        frame = sse.encode_frame(1, "config", {"rev": 42})
+        a.publish(frame)
+        assert got_a.get(timeout=1) is frame  # lokal levering, samme buffer
+        assert got_b.get(timeout=1) == frame  # via relay, byte-identisk
+        assert got_a.empty()  # ingen ekko til avsender
+    finally:
+        a.close()
+        b.close()
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="krever AF_UNIX")
+def test_unix_relay_removes_dead_peer(tmp_path):
+    a = UnixDatagramBackend(str(tmp_path))
+    a.start(lambda w: None)
+    dead = tmp_path / "999999-dead.sock"
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    s.bind(str(dead))
+    s.close()  # socket-fila blir liggende uten mottaker
+    try:
+        a.publish(sse.encode_frame(1, "ping", {}))
+        assert not dead.exists()
+    finally:
+        a.close()
+
+
+@pytest.mark.skipif(not hasattr(socket, "MSG_DONTWAIT"), reason="krever MSG_DONTWAIT")
+def test_unix_relay_does_not_block_on_stalled_peer(tmp_path):
+    a = UnixDatagramBackend(str(tmp_path))
+    a.start(lambda w: None)
+    stalled = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    stalled.bind(str(tmp_path / "999999-stalled.sock"))  # leser aldri
+    frame = sse.encode_frame(1, "config", {"pad": "x" * 8000})
+    done = threading.Event()
+
+    def flood():
+        for _ in range(2000):  # langt mer enn mottaksbufferet rommer
+            a.publish(frame)
+        done.set()
+
+    t = threading.Thread(target=flood, daemon=True)
+    try:
+        t.start()
+        assert done.wait(timeout=10), "publish blokkerte på en peer som ikke leser"
+        assert (tmp_path / "999999-stalled.sock").exists()  # tregt er ikke dødt
+    finally:
+        a.close()
+        stalled.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="krever POSIX-eierskap")
+def test_run_dir_in_shared_tmp_must_be_private(tmp_path, monkeypatch):
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.delenv("COUNTDOWN_SSE_DIR", raising=False)
+    monkeypatch.delenv("COUNTDOWN_SSE_BACKEND", raising=False)
+    monkeypatch.setattr(tempfile, "gettempdir", lambda: str(tmp_path / "tmp"))
+    monkeypatch.setattr(settings, "PROJECT_ROOT", tmp_path / "proj")
+    (tmp_path / "tmp").mkdir()
+    shared = tmp_path / "tmp" / f"countdown-sse-{os.getuid()}"
+    fallback = str(tmp_path / "proj" / ".cache" / "countdown-sse")
+
+    assert default_backend().run_dir == str(shared)  # ny katalog: vår og 0700
+    assert stat.S_IMODE(os.lstat(shared).st_mode) & 0o077 == 0
+
+    shared.chmod(0o777)  # plantet av noen andre: skrivbar for alle
+    assert default_backend().run_dir == fallback
+
+    shared.rmdir()
+    (tmp_path / "elsewhere").mkdir(mode=0o700)
+    shared.symlink_to(tmp_path / "elsewhere")  # symlenke følges ikke
+    assert default_backend().run_dir == fallback
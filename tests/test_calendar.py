@@ -0,0 +1,86 @@
+"""
+Pytest: kalendermotor (recurrence.Calendar) og mode 'calendar'.
+"""
+from datetime import datetime
+
+import pytest
+
+import app.countdown as countdown
+import app.storage as storage
+from app.recurrence import Calendar, sanitize_calendar
+
+TZ = countdown.TZ
+
+
+def ms(dt):
+    return int(dt.timestamp() * 1000)
+
+
+def local(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, tz=TZ).strftime("%a %Y-%m-%d %H:%M")
+
+
+CAL = {
+    "rules": [
+        {"days": ["mon", "wed"], "time": "19:15"},
+        {"days": ["sun"], "time": "11:00"},
+        {"days": ["sun"], "time": "17:30", "from": "2026-06-01"},
+    ],
+    "exceptions": [
+        {"date": "2026-05-17"},  # helligdag: ingenting
+        {"date": "2026-05-20", "time": "18:00"},  # flyttet
+    ],
+}
+
+
+def test_next_occurrence_with_rules_and_exceptions():
+    cal = Calendar(CAL)
+    t = ms(datetime(2026, 5, 12, 12, 0, tzinfo=TZ))  # tirsdag
+    seen = []
+    for _ in range(6):
+        t = cal.next_at_or_after(t + 1)
+        seen.append(local(t))
+    assert seen == [
+        "Wed 2026-05-13 19:15",
+        "Mon 2026-05-18 19:15",  # søndag 17. mai hoppes over
+        "Wed 2026-05-20 18:00",
+        "Sun 2026-05-24 11:00",
+        "Mon 2026-05-25 19:15",
+        "Wed 2026-05-27 19:15",
+    ]
+    assert local(cal.prev_before(ms(datetime(2026, 5, 18, 0, 0, tzinfo=TZ)))) == "Wed 2026-05-13 19:15"
+    assert local(cal.next_at_or_after(ms(datetime(2026, 6, 7, 12, 0, tzinfo=TZ)))) == "Sun 2026-06-07 17:30"
+    assert Calendar({"rules": []}).next_at_or_after(t) is None
+
+
+def test_occurrences_follow_local_time_across_dst():
+    cal = Calendar({"rules": [{"days": [5, 6], "time": "09:00"}]})  # lør/søn
+    sat = cal.next_at_or_after(ms(datetime(2026, 10, 24, 0, 0, tzinfo=TZ)))
+    sun = cal.next_at_or_after(sat + 1)
+    assert local(sat) == "Sat 2026-10-24 09:00" and local(sun) == "Sun 2026-10-25 09:00"
+    assert sun - sat == 25 * 3_600_000  # høst: 25-timers døgn
+    gap = Calendar({"rules": [{"days": ["sun"], "time": "02:30"}]})
+    assert local(gap.next_at_or_after(ms(datetime(2026, 3, 29, 0, 0, tzinfo=TZ)))) == "Sun 2026-03-29 03:30"
+
+
+def test_calendar_mode_ticks_and_rolls_over():
+    cfg = {"mode": "calendar", "calendar": CAL, "overrun_minutes": 5, "warn_minutes": 4, "alert_minutes": 2, "blink_seconds": 10}
+    wed = ms(datetime(2026, 5, 13, 19, 15, tzinfo=TZ))
+    plan = countdown.compile_schedule(cfg)
+    assert plan.tick(wed - 60_000)["mode"] == "alert"
+    assert plan.tick(wed + 60_000)["state"] == "overrun"
+    assert plan.target(wed + 5 * 60_000 + 1) == ms(datetime(2026, 5, 18, 19, 15, tzinfo=TZ))
+    assert countdown.compute_schedule(cfg, now_ms=wed)[-1] == (wed + 5 * 60_000 + 1, "rollover")
+
+
+def test_storage_sanitizes_and_validates_calendar(cfg_path):
+    assert sanitize_calendar({"rules": [{"days": ["xx"], "time": "19:15"}, {"days": ["Monday", 2], "time": "7:5"}]}) == {
+        "rules": [],
+        "exceptions": [],
+    }
+    with pytest.raises(ValueError):
+        storage.set_mode("calendar", calendar={"rules": []})
+    cfg = storage.set_mode("calendar", calendar={"rules": [{"days": ["Monday", 2], "time": "07:05"}]})
+    assert cfg["mode"] == "calendar"
+    assert cfg["calendar"]["rules"] == [{"days": ["mon", "wed"], "time": "07:05", "from": "", "until": ""}]
+    assert storage.load_config()["calendar"] == cfg["calendar"]
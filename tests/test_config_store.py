@@ -0,0 +1,72 @@
+"""
+Pytest: skrivesti for config (versjon/CAS, gruppe-commit, 409 i API-et).
+"""
+import threading
+
+import pytest
+
+import app.storage as storage
+from app import create_app
+
+
+def test_version_increments_and_cas_conflicts(cfg_path):
+    v0 = storage.load_config().get("_version", 0)
+    cfg = storage.save_config_patch({"message_primary": "A"}, expected_version=v0)
+    assert cfg["_version"] == v0 + 1
+    with pytest.raises(storage.ConfigConflictError) as exc:
+        storage.save_config_patch({"message_primary": "B"}, expected_version=v0)
+    assert exc.value.current_version == v0 + 1
+    assert storage.load_config()["message_primary"] == "A"
+    _, etag = storage.load_config_versioned()
+    storage.save_config_patch({"message_secondary": "C"}, expected_etag=etag)
+    with pytest.raises(storage.ConfigConflictError):
+        storage.save_config_patch({"message_secondary": "D"}, expected_etag=etag)
+
+
+def test_concurrent_patches_are_coalesced_without_lost_updates(cfg_path, monkeypatch):
+    monkeypatch.setattr(storage, "COALESCE_WINDOW_S", 0.2)
+    storage.load_config()
+    before = storage.write_stats()
+    barrier = threading.Barrier(8)
+
+    def worker(i):
+        barrier.wait()
+        storage.save_config_patch({"overlays": [{"id": f"o{i}", "type": "image", "url": "https://example.org/a.png"}]})
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    after = storage.write_stats()
+    cfg = storage.load_config()
+    assert {o["id"] for o in cfg["overlays"]} == {f"o{i}" for i in range(8)}
+    assert after["requests"] - before["requests"] == 8
+    assert after["commits"] - before["commits"] < 8
+    assert cfg["_version"] == 8
+
+
+def test_post_config_with_stale_version_returns_409(cfg_path):
+    client = create_app().test_client()
+    v0 = client.get("/api/config").get_json()["config"].get("_version", 0)
+    ok = client.post("/api/config", json={"message_primary": "A", "_version": v0})
+    assert ok.status_code == 200
+    stale = client.post("/api/config", json={"message_primary": "B", "_version": v0})
+    assert stale.status_code == 409
+    assert stale.get_json()["code"] == "conflict"
+
+
+def test_runtime_op_in_same_batch_does_not_break_version_cas(cfg_path):
+    v0 = storage.save_config_patch({"message_primary": "A", "mode": "duration", "duration_minutes": 5})["_version"]
+    runtime = storage._PendingWrite(lambda c: {**c, "duration_started_ms": 123}, None, None)
+    admin = storage._PendingWrite(lambda c: {**c, "message_primary": "B"}, v0, None)
+    second = storage._PendingWrite(lambda c: {**c, "message_secondary": "C"}, v0 + 1, None)
+    storage._commit([runtime, admin, second])  # én gruppe: kjøreverdi + to ekte endringer
+    assert runtime.error is None and admin.error is None and second.error is None
+    storage.invalidate_config_cache()
+    cfg = storage.load_config()
+    assert cfg["message_primary"] == "B" and cfg["message_secondary"] == "C"
+    assert cfg["duration_started_ms"] == 123
+    assert cfg["_version"] == v0 + 2  # kjøreverdien teller ikke
+    storage._commit([storage._PendingWrite(lambda c: {**c, "duration_started_ms": 456}, None, None)])
+    assert storage.load_config()["_version"] == v0 + 2
@@ -139,3 +139,90 @@ def test_tick_overrun_then_ended(monkeypatch) -> None:
     t2 = countdown.compute_tick(cfg)
     assert t2["state"] == "ended"
     assert t2["display_ms"] == 0
+
+
+def test_sync_matches_tick_parameters(monkeypatch) -> None:
+    tz = countdown.TZ
+    base = datetime.now(tz).replace(second=0, microsecond=0)
+    now_ms = fixed_now_ms(base)
+    monkeypatch.setattr(countdown, "_now_ms", lambda: now_ms)
+    cfg = base_cfg(mode="once", once_at=(base + timedelta(minutes=5)).isoformat())
+
+    s = countdown.compute_sync(cfg)
+    t = countdown.compute_tick(cfg)
+    assert s["now_ms"] == t["now_ms"]
+    assert s["target_ms"] == t["target_ms"]
+    assert s["target_hhmm"] == t["target_hhmm"]
+    for key in ("warn_ms", "alert_ms", "overrun_ms"):
+        assert s[key] == t[key]
+    assert s["blink_ms"] == 10_000
+    assert s["clock"] is False
+
+    assert countdown.compute_sync(base_cfg(mode="clock"))["clock"] is True
+
+
+def test_schedule_lists_upcoming_boundaries(monkeypatch) -> None:
+    tz = countdown.TZ
+    base = datetime.now(tz).replace(second=0, microsecond=0)
+    now_ms = fixed_now_ms(base)
+    target_ms = now_ms + ms(5)
+    cfg = base_cfg(mode="once", once_at=(base + timedelta(minutes=5)).isoformat())
+
+    sched = countdown.compute_schedule(cfg, now_ms=now_ms)
+    assert sched == [
+        (target_ms - ms(4), "warn"),
+        (target_ms - ms(2), "alert"),
+        (target_ms - 10_000, "blink"),
+        (target_ms, "target"),
+        (target_ms + ms(2) + 1, "ended"),
+    ]
+    # Hver grense er første ms der compute_tick gir ny fase
+    seen = []
+    for ts, _name in sched:
+        monkeypatch.setattr(countdown, "_now_ms", lambda ts=ts: ts - 1)
+        before = countdown.compute_tick(cfg)
+        monkeypatch.setattr(countdown, "_now_ms", lambda ts=ts: ts)
+        after = countdown.compute_tick(cfg)
+        seen.append((before["state"], before["mode"], before["blink"]) != (after["state"], after["mode"], after["blink"]))
+    assert all(seen)
+
+    # Etter target gjenstår bare slutten; daily kaller den rollover
+    assert [n for _, n in countdown.compute_schedule(cfg, now_ms=target_ms)] == ["ended"]
+    daily = base_cfg(daily_time=(base + timedelta(minutes=5)).strftime("%H:%M"))
+    assert countdown.compute_schedule(daily, now_ms=now_ms)[-1][1] == "rollover"
+    assert countdown.compute_schedule(base_cfg(mode="clock"), now_ms=now_ms) == []
+
+
+def test_compiled_schedule_is_reused_and_rolls_daily_window() -> None:
+    tz = countdown.TZ
+    cfg = base_cfg(daily_time="09:00", overrun_minutes=2)
+    plan = countdown.compile_schedule(cfg)
+    assert countdown.compile_schedule(dict(cfg)) is plan
+    assert countdown.compile_schedule(base_cfg(daily_time="09:01")) is not plan
+
+    day = datetime(2026, 5, 4, tzinfo=tz)
+    t9 = fixed_now_ms(day.replace(hour=9))
+    # Innenfor overrun: samme mål; rett etter: neste dag (samme klokkeslett)
+    assert plan.target(t9 + ms(2)) == t9
+    next_day = fixed_now_ms((day + timedelta(days=1)).replace(hour=9))
+    assert plan.target(t9 + ms(2) + 1) == next_day
+    assert plan.tick(t9 - 5_000)["target_hhmm"] == "09:00"
+    # Tilbake i tid regnes vinduet på nytt
+    assert plan.target(t9 - ms(60)) == t9
+    # Offentlig vindu: grensene ligger ved forrige og neste overrun-slutt
+    prev_day = fixed_now_ms((day - timedelta(days=1)).replace(hour=9))
+    assert plan.window(t9) == (prev_day + ms(2), t9 + ms(2), t9, "09:00")
+
+
+def test_daily_target_across_dst_changes() -> None:
+    tz = countdown.TZ
+    cfg = base_cfg(daily_time="09:00")
+    # Natt til siste søndag i mars: 23-timers døgn, men målet er fortsatt 09:00 lokal tid
+    sat = datetime(2026, 3, 28, 12, 0, tzinfo=tz)
+    target = countdown.compute_target_ms(cfg, now_ms=fixed_now_ms(sat))
+    assert datetime.fromtimestamp(target / 1000, tz=tz).strftime("%d %H:%M") == "29 09:00"
+    assert target - fixed_now_ms(sat) == ms(20 * 60)
+    # Klokkeslett som ikke finnes (02:30 om våren) flyttes frem i stedet for å hoppe over dagen
+    gap = base_cfg(daily_time="02:30", overrun_minutes=1)
+    t = countdown.compute_target_ms(gap, now_ms=fixed_now_ms(datetime(2026, 3, 29, 1, 0, tzinfo=tz)))
+    assert datetime.fromtimestamp(t / 1000, tz=tz).strftime("%d %H:%M") == "29 03:30"
@@ -0,0 +1,78 @@
+"""
+Pytest: skjermprofiler (cfg['displays']) og ?display= på /api/config, /sync og /tick.
+"""
+import pytest
+
+import app.displays as displays
+import app.storage as storage
+from app import create_app
+
+
+@pytest.fixture
+def cfg_path(cfg_path):
+    displays._CACHE.clear()
+    return cfg_path
+
+
+@pytest.fixture
+def client(cfg_path):
+    app = create_app()
+    app.testing = True
+    return app.test_client()
+
+
+PROFILES = {
+    "lobby": {
+        "label": "Lobby",
+        "theme": {"background": {"mode": "solid", "solid": {"color": "#112233"}}},
+        "message_primary": "Velkommen",
+        "overlays": [],
+        "instance": "sal-a",
+        "daily_time": "03:00",  # planfelt hører ikke hjemme i en profil
+    },
+    "scene": {"use_blink": False},
+}
+
+
+def _seed():
+    return storage.save_config_patch(
+        {
+            "daily_time": "19:15",
+            "message_primary": "Felles",
+            "instances": {"sal-a": {"daily_time": "10:00"}},
+            "displays": PROFILES,
+        }
+    )
+
+
+def test_profile_overlays_base_and_is_cached_per_revision(cfg_path):
+    base = _seed()
+    assert "daily_time" not in base["displays"]["lobby"]
+    cfg, etag = displays.resolve_display("lobby")
+    assert cfg["message_primary"] == "Velkommen" and cfg["overlays"] == []
+    assert cfg["theme"]["background"]["solid"]["color"] == "#112233"
+    assert cfg["daily_time"] == "10:00"  # planen kommer fra instansen
+    assert cfg["_display"] == "lobby" and etag.endswith(".lobby")
+    assert displays.resolve_display("lobby")[0] is cfg  # samme revisjon → ingen ny fletting
+    assert displays.resolve_display("scene")[0]["use_blink"] is False
+    # Ukjent profil og ingen profil gir felles config
+    assert displays.resolve_display("nope")[0]["message_primary"] == "Felles"
+    assert displays.resolve_display(None)[1] == storage.load_config_versioned()[1]
+    storage.save_config_patch({"displays": {"lobby": {"message_primary": "Hei"}}})
+    cfg2, etag2 = displays.resolve_display("lobby")
+    assert cfg2 is not cfg and etag2 != etag and cfg2["message_primary"] == "Hei"
+    assert storage.load_config()["message_primary"] == "Felles"
+
+
+def test_endpoints_accept_display(client, cfg_path):
+    _seed()
+    r = client.get("/api/config?display=lobby")
+    assert r.status_code == 200 and r.get_json()["config"]["message_primary"] == "Velkommen"
+    etag = r.headers["ETag"].strip('"')
+    assert etag.endswith(".lobby")
+    assert client.get("/api/config?display=lobby", headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+    assert client.get("/api/config", headers={"If-None-Match": f'"{etag}"'}).status_code == 200
+    s = client.get("/sync?display=lobby").get_json()
+    assert s["cfg_etag"] == etag and s["target_hhmm"] == "10:00"
+    assert client.get("/tick?display=lobby").get_json()["cfg_etag"] == etag
+    assert client.get("/sync").get_json()["target_hhmm"] == "19:15"
@@ -0,0 +1,39 @@
+"""
+Pytest: /events (SSE) og domenehendelser.
+"""
+import json
+
+import app.sse as sse
+import app.storage as storage
+from app import create_app
+
+
+def _frames(chunks):
+    for chunk in chunks:
+        text = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        if text.startswith("retry:"):
+            continue
+        lines = dict(l.split(": ", 1) for l in text.strip().splitlines())
+        yield lines["event"], json.loads(lines["data"])
+
+
+def test_events_stream_starts_with_state_snapshot(cfg_path):
+    client = create_app().test_client()
+    resp = client.get("/events", buffered=False)
+    assert resp.mimetype == "text/event-stream"
+    etype, data = next(_frames(iter(resp.response)))
+    assert etype == "state"
+    assert data["state"] in ("countdown", "overrun", "ended", "idle", "clock")
+    assert "cfg_rev" in data
+    resp.close()
+
+
+def test_replace_config_publishes_config_event(cfg_path):
+    sq = sse._new_queue()
+    try:
+        cfg = storage.save_config_patch({"message_primary": "Hei"})
+        etype, data = next(_frames([sq.q.get_nowait()]))
+        assert etype == "config"
+        assert data["rev"] == cfg["_updated_at"]
+    finally:
+        sse._remove_queue(sq)
@@ -0,0 +1,110 @@
+"""
+Pytest: ferdigrendrede bakgrunner (app.imaging + /media/bg/*). Krever Pillow.
+"""
+import io
+import threading
+
+import pytest
+
+PIL_Image = pytest.importorskip("PIL.Image")
+
+import app.imaging as imaging
+import app.media as media
+import app.routes.media as media_routes
+from app import create_app
+
+
+@pytest.fixture
+def variants(tmp_path):
+    cache = media.DiskLRU(tmp_path / "variants", max_bytes=10_000_000)
+    media.set_cache(None, cache)
+    yield cache
+    media.set_cache(None)
+
+
+@pytest.fixture
+def client(cfg_path, tmp_path, monkeypatch, variants):
+    static = tmp_path / "static"
+    (static / "img").mkdir(parents=True)
+    PIL_Image.new("RGB", (400, 200), (255, 255, 255)).save(static / "img" / "white.png")
+    monkeypatch.setattr(media_routes, "_STATIC", static.resolve())
+    app = create_app()
+    app.testing = True
+    return app.test_client()
+
+
+def _open(data):
+    return PIL_Image.open(io.BytesIO(data))
+
+
+def test_image_tint_is_baked_in(tmp_path):
+    src = tmp_path / "white.png"
+    PIL_Image.new("RGB", (400, 200), (255, 255, 255)).save(src)
+    data, ext = imaging.render_image(src, 100, 100, tint=(0, 0, 0), tint_opacity=0.5)
+    im = _open(data)
+    assert ext == "jpg" and im.size == (100, 100)
+    assert abs(im.getpixel((50, 50))[0] - 128) <= 3
+    data, ext = imaging.render_image(src, 100, 100, fit="contain", tint=(0, 0, 0), tint_opacity=0.5)
+    im = _open(data)
+    assert ext == "png" and im.mode == "RGBA"
+    assert abs(im.getpixel((50, 0))[3] - 128) <= 1  # tom kant: bare tint-laget
+    assert im.getpixel((50, 50))[3] == 255
+
+
+def test_dynamic_layer_matches_css_geometry():
+    data = imaging.render_dynamic(
+        200,
+        100,
+        color_from=(255, 0, 0),
+        color_to=(0, 0, 255),
+        shape1=(20, 20, 25, 50, 100),
+        shape2=(20, 20, 75, 50, 100),
+    )
+    im = _open(data)
+    assert im.getpixel((50, 50))[:3] == (255, 0, 0) and im.getpixel((50, 50))[3] > 240
+    assert im.getpixel((150, 50))[:3] == (0, 0, 255)
+    assert im.getpixel((100, 0))[3] == 0  # utenfor begge ellipsene
+
+
+def test_bg_routes_render_once_and_cache(client, variants):
+    url = "/media/bg/image/64x32?src=/static/img/white.png&tint=000000&tint_opacity=0.25"
+    r1 = client.get(url)
+    assert r1.status_code == 200 and r1.mimetype == "image/jpeg"
+    r2 = client.get(url)
+    assert r2.data == r1.data
+    assert variants.stats["misses"] == 1 and variants.stats["hits"] == 1
+    r = client.get("/media/bg/dynamic/80x45?from=%2316233a&to=0e1a2f&blur=6&s1=72,54,12,10,62")
+    assert r.status_code == 200 and r.mimetype == "image/png"
+    assert _open(r.data).size == (256, 144)  # rundet av med media.snap_size
+    assert client.get("/media/bg/image/64x32?src=/static/../app/__init__.py").status_code == 400
+    assert client.get("/media/bg/dynamic/80x45?s1=1,2").status_code == 400
+
+
+def test_without_pillow_returns_501(client, monkeypatch):
+    monkeypatch.setattr(imaging, "HAVE_PIL", False)
+    r = client.get("/media/bg/dynamic/80x45")
+    assert r.status_code == 501
+
+
+def test_render_params_are_rounded_capped_and_single_flight(client, variants, monkeypatch):
+    calls = []
+    real = imaging.render_dynamic
+
+    def slow_render(*args, **kwargs):
+        calls.append(kwargs["blur"])
+        threading.Event().wait(0.2)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(imaging, "render_dynamic", slow_render)
+    urls = [f"/media/bg/dynamic/480x270?blur={b}&s1=72.2,54,12,10,62" for b in ("500", "41", "40.3")]
+    results = []
+    threads = [threading.Thread(target=lambda u=u: results.append(client.get(u).status_code)) for u in urls * 2]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [200] * 6
+    assert calls == [40.0]  # samme nøkkel etter avrunding: én rendring, blur klemt til 40
+    r = client.get("/media/bg/image/64x32?src=/static/img/white.png&tint=000000&tint_opacity=0.26")
+    r2 = client.get("/media/bg/image/64x32?src=/static/img/white.png&tint=000000&tint_opacity=0.24")
+    assert r.data == r2.data  # tint_opacity i 0.05-trinn
@@ -0,0 +1,56 @@
+"""
+Pytest: navngitte nedtellinger (instances) og /tick?ids=.
+"""
+import pytest
+
+import app.instances as instances
+import app.storage as storage
+from app import create_app
+
+
+@pytest.fixture
+def client(cfg_path):
+    app = create_app()
+    app.testing = True
+    return app.test_client()
+
+
+ROOMS = {
+    "sal-a": {"label": "Sal A", "daily_time": "10:00"},
+    "sal-b": {"mode": "once", "once_at": "2030-01-01T12:00", "warn_minutes": 9},
+    "kafe": {"mode": "clock"},
+    "bad id!": {"mode": "clock"},
+    "sal-c": {"daily_time": "25:00", "overrun_minutes": "x"},
+}
+
+
+def test_instances_are_sanitized_and_inherit_from_root(cfg_path):
+    cfg = storage.save_config_patch({"daily_time": "19:15", "warn_minutes": 3, "instances": ROOMS})
+    assert sorted(cfg["instances"]) == ["kafe", "sal-a", "sal-b", "sal-c"]
+    assert cfg["instances"]["sal-c"] == {}  # ugyldige felter droppes → arver alt
+    etag = storage.load_config_versioned()[1]
+    now_ms, ticks, missing = instances.compute_ticks(cfg, etag, ["sal-a", "sal-b", "kafe", "sal-c", "default", "nope"])
+    assert missing == ["nope"]
+    assert all(t["now_ms"] == now_ms for t in ticks.values())
+    assert ticks["sal-a"]["target_hhmm"] == "10:00" and ticks["sal-a"]["warn_ms"] == 3 * 60_000
+    assert ticks["sal-b"]["warn_ms"] == 9 * 60_000 and ticks["sal-b"]["state"] == "countdown"
+    assert ticks["kafe"]["state"] == "clock"
+    assert ticks["sal-c"]["target_hhmm"] == ticks["default"]["target_hhmm"] == "19:15"
+    # Samme revisjon → samme kompilerte planer; ny revisjon → nye
+    plans = instances.instance_plans(cfg, etag)
+    assert instances.instance_plans(cfg, etag) is plans
+    cfg = storage.save_config_patch({"instances": {"sal-a": None}})
+    assert "sal-a" not in cfg["instances"] and "sal-b" in cfg["instances"]
+    assert "sal-a" not in instances.instance_plans(cfg, storage.load_config_versioned()[1])
+
+
+def test_tick_endpoint_batches_ids(client, cfg_path):
+    storage.save_config_patch({"instances": ROOMS})
+    r = client.get("/tick?ids=sal-a,kafe,nope")
+    data = r.get_json()
+    assert r.status_code == 200
+    assert set(data["ticks"]) == {"sal-a", "kafe"}
+    assert data["missing"] == ["nope"]
+    assert data["cfg_etag"] == storage.load_config_versioned()[1]
+    assert set(client.get("/tick?ids=*").get_json()["ticks"]) == {"default", "kafe", "sal-a", "sal-b", "sal-c"}
+    assert "state" in client.get("/tick").get_json()  # uten ids: som før
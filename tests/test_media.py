@@ -0,0 +1,163 @@
+"""
+Pytest: Picsum-diskcachen (/media/picsum) mot en lokal stand-in for picsum.photos.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app.media as media
+import app.storage as storage
+from app import create_app
+
+
+class _Upstream:
+    def __init__(self):
+        self.hits = []
+        self.online = True
+        hits = self.hits
+        up = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                hits.append(self.path)
+                if not up.online:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                body = ("JPEG:" + self.path).encode().ljust(1000, b"x")
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    up = _Upstream()
+    yield up
+    up.close()
+
+
+@pytest.fixture
+def cache(tmp_path, upstream):
+    c = media.PicsumCache(tmp_path / "media", max_bytes=10_000, base_url=upstream.url)
+    media.set_cache(c)
+    yield c
+    media.set_cache(None)
+
+
+@pytest.fixture
+def client(cfg_path, cache):
+    app = create_app()
+    app.testing = True
+    return app.test_client()
+
+
+def _catalog(*ids):
+    storage.save_config_patch({"theme": {"picsum_catalog": [{"id": i} for i in ids]}})
+
+
+def test_served_from_disk_after_first_fetch(client, cache, upstream):
+    _catalog(10)
+    r1 = client.get("/media/picsum/10/320x200?grayscale=1&blur=2")
+    assert r1.status_code == 200
+    assert r1.mimetype == "image/jpeg"
+    assert r1.data.startswith(b"JPEG:/id/10/384/240?grayscale&blur=2")  # rundet til 16:10-trinn
+    assert "max-age" in r1.headers["Cache-Control"]
+    r2 = client.get("/media/picsum/10/320x200?grayscale=1&blur=2")
+    assert r2.data == r1.data
+    assert len(upstream.hits) == 1
+    r3 = client.get("/media/picsum/10/320x200?grayscale=1&blur=2", headers={"If-None-Match": r1.headers["ETag"]})
+    assert r3.status_code == 304
+    assert client.get("/media/picsum/10/abc").status_code == 400
+
+
+def test_lru_evicts_least_recently_used(cache, upstream):
+    for pid in (1, 2, 3, 4):
+        cache.get(pid, 100, 100)
+    cache.get(1, 100, 100)  # 1 er nå nyest brukt
+    for pid in range(5, 12):
+        cache.get(pid, 100, 100)  # 11 × 1000 B > tak på 10 000 B
+    files = [p for p in cache.root.iterdir() if not p.name.startswith(".")]  # uten låsefiler
+    names = {p.name for p in files}
+    assert sum(p.stat().st_size for p in files) <= cache.max_bytes
+    assert "1_100x100.jpg" in names
+    assert "2_100x100.jpg" not in names
+    assert cache.stats["evictions"] >= 1
+
+
+def test_prefetches_next_catalog_entries(client, cache, upstream):
+    _catalog(5, 6, 7, 8, 9)
+    assert client.get("/media/picsum/8/64x64").status_code == 200
+    assert cache.wait_prefetch(5)
+    fetched = sorted(h for h in upstream.hits if h != "/id/8/256/256")
+    assert fetched == ["/id/5/256/256", "/id/6/256/256", "/id/9/256/256"]
+
+
+def test_offline_falls_back_to_cached_variant(client, cache, upstream):
+    # 4 er valgt bakgrunn, ikke i katalogen: tillatt, men forhåndshentes ikke
+    storage.save_config_patch(
+        {"theme": {"picsum_catalog": [{"id": 3}], "background": {"mode": "picsum", "picsum": {"id": 4}}}}
+    )
+    assert client.get("/media/picsum/3/800x600").status_code == 200
+    upstream.online = False
+    r = client.get("/media/picsum/3/400x300")
+    assert r.status_code == 200
+    assert r.data.startswith(b"JPEG:/id/3/800/600")
+    assert client.get("/media/picsum/4/400x300").status_code == 502
+
+
+def test_only_configured_ids_and_snapped_sizes_are_fetched(client, cache, upstream):
+    storage.save_config_patch({"theme": {"background": {"mode": "picsum", "picsum": {"id": 12}}}})
+    assert client.get("/media/picsum/13/640x360").status_code == 404
+    assert upstream.hits == []
+    for size in ("1900x1070", "1910x1075", "1920x1080"):
+        assert client.get(f"/media/picsum/12/{size}").status_code == 200
+    assert upstream.hits == ["/id/12/1920/1080"]
+    assert media.snap_size(5000, 5000) == (3840, 3840)
+    assert media.snap_size(1080, 1920) == (1080, 1920)
+
+
+def test_size_cap_holds_across_workers(tmp_path):
+    # To prosesser = to DiskLRU-instanser mot samme katalog, hver med egen tilstand
+    a = media.DiskLRU(tmp_path / "shared", max_bytes=5_000)
+    b = media.DiskLRU(tmp_path / "shared", max_bytes=5_000)
+    for i in range(8):
+        (a if i % 2 else b).produce(f"{i}.jpg", lambda: b"x" * 1000)
+    total = sum(p.stat().st_size for p in (tmp_path / "shared").iterdir() if p.is_file() and not p.name.startswith("."))
+    assert total <= 5_000
+
+
+def test_originals_and_variants_share_one_disk_cap(tmp_path, monkeypatch):
+    cap = 20_000
+    monkeypatch.setenv("COUNTDOWN_MEDIA_DIR", str(tmp_path / "media"))
+    monkeypatch.setenv("COUNTDOWN_MEDIA_MAX_MB", str(cap / (1024 * 1024)))
+    media.set_cache(None)
+    try:
+        originals, variants = media.get_cache(), media.get_variant_cache()
+        for i in range(30):
+            originals.produce(f"{i}_256x144.jpg", lambda: b"o" * 1500)
+            variants.produce(f"v{i}.png", lambda: b"v" * 1500)
+        used = sum(
+            p.stat().st_size
+            for p in (tmp_path / "media").rglob("*")
+            if p.is_file() and not any(part.startswith(".") for part in p.relative_to(tmp_path / "media").parts)
+        )
+        assert 0 < used <= cap
+        assert originals.max_bytes + variants.max_bytes <= cap
+        assert originals.stats["evictions"] and variants.stats["evictions"]
+    finally:
+        media.set_cache(None)
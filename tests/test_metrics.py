@@ -0,0 +1,115 @@
+"""
+Pytest: metrikker (app/metrics.py) – shards pr. tråd, histogram-format og /metrics.
+"""
+import json
+import os
+import re
+import threading
+
+import pytest
+
+import app.metrics as metrics
+import app.storage as storage
+import app.sysinfo as sysinfo
+from app import create_app
+
+
+@pytest.fixture
+def cfg_path(cfg_path):
+    metrics.reset()
+    return cfg_path
+
+
+@pytest.fixture
+def client(cfg_path):
+    app = create_app()
+    app.testing = True
+    return app.test_client()
+
+
+def _value(text, sample):
+    m = re.search(r"^" + re.escape(sample) + r" (\S+)$", text, re.M)
+    return float(m.group(1)) if m else None
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics.reset()
+    h = metrics.histogram("test_latency_seconds", "Test.", ("op",))
+    for v in (0.0002, 0.003, 0.003, 7.0, 42.0):
+        h.observe(v, "x")
+    text = metrics.render()
+    assert "# TYPE test_latency_seconds histogram" in text
+    assert _value(text, 'test_latency_seconds_bucket{op="x",le="0.00025"}') == 1
+    assert _value(text, 'test_latency_seconds_bucket{op="x",le="0.005"}') == 3
+    assert _value(text, 'test_latency_seconds_bucket{op="x",le="10"}') == 4
+    assert _value(text, 'test_latency_seconds_bucket{op="x",le="+Inf"}') == 5
+    assert _value(text, 'test_latency_seconds_count{op="x"}') == 5
+    assert _value(text, 'test_latency_seconds_sum{op="x"}') == pytest.approx(49.0062)
+
+
+def test_counters_sum_across_threads_and_survive_thread_exit():
+    metrics.reset()
+    c = metrics.counter("test_hits_total", "Test.", ("kind",))
+
+    def work():
+        for _ in range(1000):
+            c.inc('a"b')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Trådene er døde: shardene deres slås inn i resten, og tallene består
+    assert _value(metrics.render(), 'test_hits_total{kind="a\\"b"}') == 8000
+    assert _value(metrics.render(), 'test_hits_total{kind="a\\"b"}') == 8000
+
+
+def test_subprocess_timing_labels_program_only(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(sysinfo, "_run_plain", lambda args, timeout: (False, "", "nei", 1))
+    sysinfo.run_cmd_direct(["/usr/bin/systemctl", "--user", "show", "x"])
+    text = metrics.render()
+    assert _value(text, 'countdown_subprocess_duration_seconds_count{cmd="systemctl"}') == 1
+    assert _value(text, 'countdown_subprocess_failures_total{cmd="systemctl"}') == 1
+
+
+def test_metrics_endpoint_reports_routes_and_storage(client, cfg_path):
+    for _ in range(3):
+        assert client.get("/tick").status_code == 200
+    client.get("/finnes-ikke")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = resp.get_data(as_text=True)
+    assert _value(text, 'countdown_http_requests_total{route="/tick",method="GET",status="200"}') == 3
+    assert _value(text, 'countdown_http_request_duration_seconds_count{route="/tick",method="GET"}') == 3
+    assert _value(text, 'countdown_http_requests_total{route="unmatched",method="GET",status="404"}') == 1
+    assert _value(text, 'countdown_storage_duration_seconds_count{op="load_config"}') >= 3
+
+
+def test_metrics_from_other_hosts_need_admin_auth(client, cfg_path):
+    storage.save_config_patch({"admin_password": "a"})
+    remote = {"REMOTE_ADDR": "10.0.0.5"}
+    assert client.get("/metrics").status_code == 200  # localhost
+    assert client.get("/metrics", environ_base=remote).status_code == 401
+    assert client.get("/metrics", environ_base=remote, headers={"X-Admin-Password": "a"}).status_code == 200
+
+
+def test_workers_are_summed_and_dead_workers_retired(tmp_path, monkeypatch):
+    monkeypatch.setenv("COUNTDOWN_METRICS_SHARED", "1")
+    monkeypatch.setenv("COUNTDOWN_METRICS_DIR", str(tmp_path))
+    metrics.reset()
+    c = metrics.counter("test_shared_total", "Test.", ("kind",))
+    c.inc("a", n=2)
+    sample = 'test_shared_total{kind="a"}'
+    other = [["test_shared_total", ["a"], [5]]]
+    (tmp_path / f"{os.getppid()}.json").write_text(json.dumps(other))  # levende worker
+    dead_pid = 2**22 + 7  # over pid_max: finnes ikke
+    (tmp_path / f"{dead_pid}.json").write_text(json.dumps([["test_shared_total", ["a"], [10]]]))
+    assert _value(metrics.render(), sample) == 17
+    assert not (tmp_path / f"{dead_pid}.json").exists()
+    assert (tmp_path / "retired.json").exists() and (tmp_path / f"{os.getpid()}.json").exists()
+    assert _value(metrics.render(), sample) == 17  # ikke talt to ganger etter innslåing
+    c.inc("a")
+    assert _value(metrics.render(), sample) == 18
@@ -0,0 +1,77 @@
+"""
+Pytest: NTP-monitor (ntp.py) med inkrementell journal-lesing fra innspilte utdrag.
+"""
+import threading
+import time
+from pathlib import Path
+
+from app.ntp import NtpMonitor
+
+FIXTURES = Path(__file__).parent / "fixtures"
+TIMEDATECTL = "NTPSynchronized=yes\nSystemClockSynchronized=yes\nNTPMessage="
+SHOW_TIMESYNC = "ServerName=2.debian.pool.ntp.org\nServerAddress=194.58.202.20\nPollIntervalUSec=34min 8s"
+
+
+class FakeJournal:
+    """Svarer som timedatectl/journalctl; journalen kommer fra fixtures i rekkefølge."""
+
+    def __init__(self, chunks, timesync=SHOW_TIMESYNC):
+        self.chunks = list(chunks)
+        self.timesync = timesync
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, args, timeout=8):
+        with self.lock:
+            self.calls.append(list(args))
+        time.sleep(0.01)
+        if args[:2] == ["timedatectl", "show"]:
+            return True, TIMEDATECTL, "", 0
+        if args[:2] == ["timedatectl", "show-timesync"]:
+            return True, self.timesync, "", 0
+        if any(a.startswith("--after-cursor=") for a in args) and "bad" in args[-1]:
+            return False, "", "Failed to seek to cursor: Invalid argument", 1
+        return True, (self.chunks.pop(0) if self.chunks else ""), "", 0
+
+    def journal_calls(self):
+        return [c for c in self.calls if c[0] == "journalctl"]
+
+
+def _fixture(name):
+    return (FIXTURES / name).read_text(encoding="utf-8").strip()
+
+
+def test_journal_is_read_incrementally_from_cursor():
+    fake = FakeJournal([_fixture("timesyncd_tail.txt"), "", _fixture("timesyncd_after_cursor.txt")])
+    mon = NtpMonitor(runner=fake, ttl_s=0)
+    first = mon.status()
+    assert first["LastContactMS"] == 1760747712318
+    assert first["LastContactSource"] == "journal:194.58.202.20:123"
+    assert first["NTPSynchronized"] is True and first["ServerName"] == "2.debian.pool.ntp.org"
+    assert mon.status()["LastContactMS"] == 1760747712318  # ingen nye linjer: funnet beholdes
+    assert mon.status()["LastContactMS"] == 1760752002117
+    calls = fake.journal_calls()
+    assert "-n" in calls[0] and not any(a.startswith("--after-cursor") for a in calls[0])
+    assert calls[1][-1] == "--after-cursor=s=7d0c5b4a1f2e4c3db0e8a9f6c2d1e0ab;i=1a3f;b=2f9e8d7c6b5a49382716f5e4d3c2b1a0;m=5f3b2c1d;t=641693a2c4d0c;x=9c2e4f1a6b3d8e07"
+    assert calls[2][-1] == calls[1][-1]  # tom lesing flytter ikke cursoren
+    mon._cursor = "bad"
+    mon.status()
+    assert mon._cursor is None and mon.status()["LastContactMS"] == 1760752002117
+    assert "-n" in fake.journal_calls()[-1]
+
+
+def test_concurrent_refreshes_run_once_and_timesync_skips_journal():
+    fake = FakeJournal([_fixture("timesyncd_tail.txt")])
+    mon = NtpMonitor(runner=fake, ttl_s=60)
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(mon.status())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(out) == 8 and mon.stats["refreshes"] == 1
+    assert len(fake.calls) == 3  # timedatectl x2 + én journal-lesing
+    fake.timesync = SHOW_TIMESYNC + "\nLastSyncUSec=1760760000000000"
+    fresh = NtpMonitor(runner=fake, ttl_s=60).status()
+    assert fresh["LastContactMS"] == 1760760000000 and fresh["LastContactSource"] == "LastSyncUSec"
+    assert len(fake.journal_calls()) == 1
@@ -0,0 +1,102 @@
+"""
+Pytest: planleggeren (duration-utløp) og at /tick er en ren leser.
+"""
+import time
+
+import app.scheduler as scheduler
+import app.storage as storage
+from app import create_app
+
+
+def _ended_duration():
+    started = int(time.time() * 1000) - 10 * 60_000
+    return storage.save_config_patch(
+        {
+            "mode": "duration",
+            "duration_minutes": 1,
+            "duration_started_ms": started,
+            "overrun_minutes": 1,
+        }
+    )
+
+
+def test_tick_is_read_only_after_duration_ends(cfg_path):
+    cfg = _ended_duration()
+    client = create_app().test_client()
+    for _ in range(3):
+        assert client.get("/tick").get_json()["state"] == "ended"
+        client.get("/sync")
+    after = storage.load_config()
+    assert after["mode"] == "duration"
+    assert after["_version"] == cfg["_version"]
+
+
+def test_duration_expiry_runs_exactly_once(cfg_path):
+    cfg = _ended_duration()
+    assert scheduler.run_due() == ["duration_expiry"]
+    after = storage.load_config()
+    assert after["mode"] == "daily"
+    assert after["duration_started_ms"] == 0
+    assert after["_version"] == cfg["_version"] + 1
+    # En "annen worker" som planla samme frist gjør ingenting
+    scheduler.DurationExpiry().run(int(time.time() * 1000))
+    assert scheduler.run_due() == []
+    assert storage.load_config()["_version"] == after["_version"]
+
+
+def test_running_duration_is_not_due(cfg_path):
+    storage.start_duration(5)
+    assert scheduler.run_due() == []
+    assert storage.load_config()["mode"] == "duration"
+
+
+def _rotating_picsum(strategy="sequential"):
+    return storage.save_config_patch(
+        {
+            "theme": {
+                "picsum_catalog": [{"id": 10}, {"id": 20}, {"id": 30}],
+                "background": {
+                    "mode": "picsum",
+                    "picsum": {
+                        "id": 10,
+                        "auto_rotate": {
+                            "enabled": True,
+                            "interval_seconds": 60,
+                            "strategy": strategy,
+                            "last_switch_ms": 0,
+                        },
+                    },
+                },
+            }
+        }
+    )
+
+
+def test_picsum_rotates_once_per_interval_and_publishes(cfg_path):
+    import app.sse as sse
+
+    _rotating_picsum()
+    sq = sse._new_queue()
+    try:
+        assert scheduler.run_due() == ["picsum_rotation"]
+        assert scheduler.run_due() == []
+        frames = []
+        while not sq.q.empty():
+            frames.append(sq.q.get_nowait().decode("utf-8"))
+    finally:
+        sse._remove_queue(sq)
+    pc = storage.load_config()["theme"]["background"]["picsum"]
+    assert pc["id"] == 20
+    assert pc["auto_rotate"]["last_index"] == 1
+    assert pc["auto_rotate"]["last_switch_ms"] > 0
+    assert any("event: picsum" in f and '"id":20' in f for f in frames)
+
+
+def test_picsum_next_is_a_pure_read(cfg_path):
+    cfg = _rotating_picsum()
+    client = create_app().test_client()
+    js = client.get("/api/picsum/next").get_json()
+    assert js["enabled"] is True
+    assert js["updated"] is False
+    assert js["next_in_seconds"] == 0
+    assert storage.load_config()["_version"] == cfg["_version"]
@@ -0,0 +1,69 @@
+"""
+Pytest: tilstandsloggen (state_store) og at kjøretilstand ikke skriver config.json.
+"""
+import os
+import time
+
+import app.scheduler as scheduler
+import app.state_store as state_store
+import app.storage as storage
+from app import create_app
+
+
+def test_log_appends_replays_and_compacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(state_store, "COMPACT_LINES", 5)
+    path = str(tmp_path / "x.state.jsonl")
+    log = state_store.StateLog(path)
+    log.append({"a": 1, "b": {"x": None}})
+    log.append({"a": 2})
+    log.append({"b": None})
+    with open(path, "ab") as f:
+        f.write(b'{"a": 3')  # halvskrevet linje (krasj)
+    other = state_store.StateLog(path)  # "annen prosess"
+    assert other.read()[1] == {"a": 2}
+    other.append({"c": True})
+    assert log.read()[1] == {"a": 2, "c": True}
+    ino = os.stat(path).st_ino
+    for i in range(4):
+        log.append({"n": i})
+    assert os.stat(path).st_ino != ino  # komprimert til ett øyeblikksbilde
+    assert sum(1 for _ in open(path, "rb")) < 5
+    assert state_store.StateLog(path).read()[1] == {"a": 2, "c": True, "n": 3}
+
+
+def test_runtime_changes_do_not_rewrite_config(cfg_path):
+    cfg = storage.save_config_patch(
+        {
+            "theme": {
+                "picsum_catalog": [{"id": 10}, {"id": 20}],
+                "background": {
+                    "mode": "picsum",
+                    "picsum": {"id": 10, "auto_rotate": {"enabled": True, "interval_seconds": 60, "strategy": "sequential"}},
+                },
+            }
+        }
+    )
+    st0 = os.stat(cfg_path)
+    etag0 = storage.load_config_versioned()[1]
+    assert scheduler.run_due() == ["picsum_rotation"]
+    storage.update_config(lambda c: {**c, "mode": "duration", "duration_minutes": 5, "duration_started_ms": 1})
+    st1 = os.stat(cfg_path)
+    storage.start_duration(5)  # samme modus og lengde: bare duration_started_ms endres
+    st2 = os.stat(cfg_path)
+    assert (st0.st_ino, st0.st_mtime_ns) != (st1.st_ino, st1.st_mtime_ns)  # mode endret → skrives
+    now = storage.load_config()
+    assert now["theme"]["background"]["picsum"]["id"] == 20
+    assert now["duration_minutes"] == 5 and now["duration_started_ms"] > 1
+    assert now["_version"] == cfg["_version"] + 1  # bare modusbyttet øker _version
+    storage.invalidate_config_cache()  # ny prosess: config.json + logg gir samme config
+    cfg2, etag2 = storage.load_config_versioned()
+    assert cfg2 == now and etag2 != etag0
+    assert (st2.st_ino, st2.st_mtime_ns) == (st1.st_ino, st1.st_mtime_ns)
+
+
+def test_heartbeat_is_shared_through_the_log(cfg_path):
+    client = create_app().test_client()
+    client.post("/debug/view-heartbeat", json={"rev": 42, "page": "view"})
+    shared = storage.runtime_state().get("view_heartbeat")
+    assert shared["rev"] == 42 and shared["ts_ms"] <= int(time.time() * 1000)
+    assert client.get("/debug/view-heartbeat").get_json()["heartbeat"]["rev"] == 42
@@ -0,0 +1,91 @@
+"""
+Pytest: config-cache i storage (stat-signatur + replace_config).
+"""
+import json
+import os
+
+import pytest
+
+import app.storage as storage
+
+
+def test_missing_file_writes_defaults_and_caches(cfg_path):
+    cfg = storage.load_config()
+    assert cfg_path.exists()
+    assert cfg["mode"] == "daily"
+    before = storage.cache_stats()
+    storage.load_config()
+    after = storage.cache_stats()
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+
+
+def test_returned_config_is_a_copy(cfg_path):
+    cfg = storage.load_config()
+    cfg["theme"]["digits"]["size_vmin"] = 99
+    cfg["overlays"].append({"id": "x"})
+    again = storage.load_config()
+    assert again["theme"]["digits"]["size_vmin"] != 99
+    assert again["overlays"] == []
+
+
+def test_replace_config_primes_cache(cfg_path):
+    storage.load_config()
+    storage.save_config_patch({"message_primary": "Hei"})
+    before = storage.cache_stats()
+    assert storage.load_config()["message_primary"] == "Hei"
+    assert storage.cache_stats()["misses"] == before["misses"]
+
+
+def test_external_write_is_detected(cfg_path):
+    storage.load_config()
+    # Simuler en annen worker: ny fil via os.replace (ny inode)
+    raw = json.loads(cfg_path.read_text(encoding="utf-8"))
+    raw["message_primary"] = "Fra worker B"
+    tmp = cfg_path.with_name("other.json")
+    tmp.write_text(json.dumps(raw), encoding="utf-8")
+    os.replace(tmp, cfg_path)
+    before = storage.cache_stats()
+    assert storage.load_config()["message_primary"] == "Fra worker B"
+    assert storage.cache_stats()["misses"] == before["misses"] + 1
+
+
+def test_frozen_defaults_overlay_matches_deep_merge():
+    frozen = storage.frozen_defaults()
+    with pytest.raises(TypeError):
+        frozen["mode"] = "clock"  # type: ignore[index]
+    raw = {
+        "mode": "once",
+        "theme": {"digits": {"size_vmin": 30}, "background": {"mode": "picsum"}},
+        "clock": "ikke-en-dict",
+        "extra": {"x": [1, 2]},
+    }
+    merged = storage._overlay(frozen, raw)
+    legacy = storage._deep_merge(json.loads(json.dumps(storage._DEFAULTS)), raw)
+    assert merged == legacy
+    assert list(merged) == list(legacy)
+    # Urørte deltrær er egne, muterbare kopier
+    merged["overlays"].append({"id": "x"})
+    merged["theme"]["background"]["picsum"]["catalog"] = "endret"
+    assert storage.get_defaults() == json.loads(json.dumps(storage._DEFAULTS))
+
+
+def test_encoder_matches_json_layout_and_compacts_catalog():
+    doc = {
+        "a": "blå \"x\"\n",
+        "n": [1, 2.5, True, None, {}, []],
+        "nested": {"k": {"deep": [{"x": 1}]}, "e": {}},
+        "big": 10**20,
+        "f": float("inf"),
+    }
+    assert storage._encode_json(doc) == json.dumps(doc, indent=2, ensure_ascii=False) + "\n"
+    catalog = [{"id": "1", "author": "Å"}, {"id": "2", "author": "B"}]
+    text = storage._encode_json(storage._mark_compact_lists({"picsum_catalog": catalog, "x": []}))
+    assert text == (
+        '{\n  "picsum_catalog": [\n'
+        '    {"id": "1","author": "Å"},\n'
+        '    {"id": "2","author": "B"}\n'
+        '  ],\n  "x": []\n}\n'
+    )
+    assert json.loads(text) == {"picsum_catalog": catalog, "x": []}
+    assert storage._encode_json(doc, compact=True) == json.dumps(doc, ensure_ascii=False, separators=(",", ":")) + "\n"
@@ -0,0 +1,70 @@
+"""
+Pytest: bufret systemstatus (sysinfo) og /api/sys/about-status.
+"""
+import threading
+import time
+
+import pytest
+
+import app.sysinfo as sysinfo
+from app import create_app
+
+
+class FakeSystemctl:
+    def __init__(self):
+        self.calls = []
+        self.state = {"countdown.service": "active", "kiosk-cog.service": "inactive"}
+        self.lock = threading.Lock()
+
+    def __call__(self, args, timeout=8):
+        with self.lock:
+            self.calls.append(tuple(args))
+        time.sleep(0.02)  # treg subprosess: samtidige kall skal vente, ikke starte egne
+        if args[0] == "git":
+            return True, "abc1234", "", 0
+        unit = next(a for a in args if a.endswith(".service"))
+        return True, f"ActiveState={self.state[unit]}\nSubState=running\nDescription={unit}", "", 0
+
+
+@pytest.fixture
+def fake():
+    fake = FakeSystemctl()
+    events = []
+    info = sysinfo.SysInfo(runner=fake, user_runner=fake, interval_s=60, publish=events.append)
+    sysinfo.set_sysinfo(info)
+    yield fake, info, events
+    sysinfo.set_sysinfo(None)
+
+
+def test_concurrent_snapshots_collect_once_and_push_changes(fake):
+    runner, info, events = fake
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(info.snapshot(background=False))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(out) == 8 and all(s == out[0] for s in out)
+    assert out[0]["commit"] == "abc1234"
+    assert out[0]["services"]["app"]["active"] is True and out[0]["services"]["kiosk"]["active"] is False
+    assert info.stats == {"static_runs": 1, "service_runs": 1, "pushes": 0}
+    assert len(runner.calls) == 3  # git + én show pr. unit ('web' deler med 'app')
+    info.refresh()  # fersk: ingenting skjer
+    assert len(runner.calls) == 3
+    runner.state["kiosk-cog.service"] = "active"
+    info.refresh(force=True)
+    assert events == [{"type": "sys", "services": {k: {"active": True, "substate": "running"} for k in ("app", "web", "kiosk")}}]
+    assert len(runner.calls) == 5  # faste fakta samles ikke på nytt
+
+
+def test_about_status_serves_snapshot(fake, cfg_path, monkeypatch):
+    runner, info, _ = fake
+    import app.routes.api as api
+
+    monkeypatch.setattr(api, "ntp_status", lambda: {"NTPSynchronized": True})
+    monkeypatch.setattr(info, "_ensure_thread", lambda: None)
+    client = create_app().test_client()
+    for _ in range(3):
+        about = client.get("/api/sys/about-status").get_json()["about"]
+    assert about["services"]["app"]["active"] is True and about["ntp"] == {"NTPSynchronized": True}
+    assert "server_time" in about and len(runner.calls) == 3
@@ -0,0 +1,59 @@
+"""
+Pytest: tidskilden (timesource) – ankring, slew, steg og driftestimat med falske klokker.
+"""
+import app.countdown as countdown
+import app.timesource as timesource
+
+
+class Clocks:
+    def __init__(self):
+        self.mono = 0
+        self.wall = 1_760_000_000_000 * 1_000_000  # ns
+        self.wall_ppm = 0.0  # hvor mye fortere systemklokka går enn monoton tid
+
+    def advance_ms(self, ms):
+        self.mono += int(ms * 1e6)
+        self.wall += int(ms * 1e6 * (1 + self.wall_ppm * 1e-6))
+
+
+def _source(c):
+    return timesource.TimeSource(wall_ns=lambda: c.wall, mono_ns=lambda: c.mono, reanchor_s=1.0)
+
+
+def test_small_offset_is_slewed_without_jumps():
+    c = Clocks()
+    ts = _source(c)
+    c.wall += 400 * 1_000_000  # NTP justerer systemklokka +400 ms
+    prev = ts.now_ms()
+    max_step = 0
+    for _ in range(40_000):  # 40 s i 1 ms-steg
+        c.advance_ms(1)
+        now = ts.now_ms()
+        max_step = max(max_step, now - prev)
+        assert now >= prev
+        prev = now
+    assert max_step <= 2  # aldri mer enn 1 ms + slew pr. ms
+    assert abs(prev - c.wall // 1_000_000) <= 1
+    st = ts.stats()
+    assert st["steps"] == 0 and abs(st["slew_pending_ms"]) < 1
+
+
+def test_large_offset_steps_and_drift_is_tracked():
+    c = Clocks()
+    ts = _source(c)
+    c.wall += 5_000 * 1_000_000
+    c.advance_ms(1001)
+    assert abs(ts.now_ms() - c.wall // 1_000_000) <= 1 and ts.stats()["steps"] == 1
+    c.wall_ppm = 200.0
+    for _ in range(600):
+        c.advance_ms(1000)
+        ts.now_ms()
+    st = ts.stats()
+    assert abs(st["drift_ppm"] - 200.0) < 5
+    assert abs(ts.now_ms() - c.wall // 1_000_000) <= 2
+
+
+def test_countdown_uses_the_shared_timesource(monkeypatch):
+    c = Clocks()
+    monkeypatch.setattr(timesource, "_instance", _source(c))
+    assert countdown._now_ms() == c.wall // 1_000_000
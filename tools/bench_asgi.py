@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# File: tools/bench_asgi.py
+"""
+Lastmåling for ASGI-modus: hva koster ledige /events-strømmer?
+Starter asgi:application under uvicorn i en egen prosess (midlertidig config.json),
+måler tråder og RSS (/proc) og svartid for /api/status før og etter at N
+SSE-klienter har koblet til og mottatt første state-ramme.
+Kjør (Linux, krever uvicorn): python tools/bench_asgi.py [antall_strømmer] [status_kall]
+"""
+from __future__ import annotations
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+HOST = "127.0.0.1"
+def _serve(port: int, config_path: str) -> None:
+    import uvicorn  # type: ignore[reportMissingImports]
+    import app.storage as storage
+    from pathlib import Path
+    storage.CONFIG_PATH = Path(config_path)
+    from app import create_app
+    from app.asgi import create_asgi_app
+    uvicorn.run(create_asgi_app(create_app()), host=HOST, port=port, log_level="warning")
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+def _proc(pid: int) -> tuple:
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            fields[key] = value.strip()
+    return int(fields["Threads"]), int(fields["VmRSS"].split()[0])  # KB
+def _wait_ready(port: int, proc: subprocess.Popen) -> None:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("uvicorn avsluttet – er den installert?")
+        try:
+            urllib.request.urlopen(f"http://{HOST}:{port}/tick", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit("serveren svarte ikke innen 30 s")
+def _status_ms(port: int, calls: int) -> tuple:
+    url = f"http://{HOST}:{port}/api/status"
+    urllib.request.urlopen(url, timeout=5).read()  # oppvarming
+    samples = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        urllib.request.urlopen(url, timeout=5).read()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+def _open_streams(port: int, n: int) -> list:
+    request = f"GET /events HTTP/1.1\r\nHost: {HOST}\r\nAccept: text/event-stream\r\n\r\n".encode()
+    streams = []
+    for _ in range(n):
+        s = socket.create_connection((HOST, port), timeout=10)
+        s.sendall(request)
+        streams.append(s)
+    for s in streams:  # strømmen er åpen når første state-ramme er levert
+        buf = b""
+        while b"event: state" not in buf:
+            chunk = s.recv(4096)
+            if not chunk:
+                raise SystemExit("serveren lukket en /events-strøm")
+            buf += chunk
+    return streams
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, COUNTDOWN_SSE_BACKEND="memory", COUNTDOWN_METRICS_SHARED="0")
+        proc = subprocess.Popen(
+            [sys.executable, __file__, "--serve", str(port), os.path.join(tmp, "config.json")],
+            cwd=ROOT,
+            env=env,
+        )
+        streams: list = []
+        try:
+            _wait_ready(port, proc)
+            for s in _open_streams(port, 64):  # fyll WSGI-broens trådpool (8) før nullpunktet
+                s.close()
+            time.sleep(1.0)
+            threads0, rss0 = _proc(proc.pid)
+            med0, p950 = _status_ms(port, calls)
+            streams = _open_streams(port, n)
+            time.sleep(1.0)  # la serveren roe seg før måling
+            threads1, rss1 = _proc(proc.pid)
+            med1, p951 = _status_ms(port, calls)
+        finally:
+            for s in streams:
+                s.close()
+            proc.terminate()
+            proc.wait(timeout=10)
+    print(f"uvicorn, {n} ledige /events-strømmer, {calls} kall til /api/status pr. måling")
+    print(f"{'':>14} | {'tråder':>7} {'RSS KB':>9} | {'status median ms':>16} {'p95 ms':>7}")
+    print(f"{'før':>14} | {threads0:>7} {rss0:>9} | {med0:>16.2f} {p950:>7.2f}")
+    print(f"{'med strømmer':>14} | {threads1:>7} {rss1:>9} | {med1:>16.2f} {p951:>7.2f}")
+    print(f"RSS pr. strøm: {(rss1 - rss0) / n:.1f} KB, trådendring: {threads1 - threads0:+d}")
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--serve":
+        _serve(int(sys.argv[2]), sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# File: tools/bench_sse.py
+"""
+Mikrobenchmark: kostnad pr. SSE-hendelse når antall abonnenter vokser (1 → 500).
+Sammenligner dagens publish() (én serialisering, delt bytes-ramme) med gammel
+modell der hver abonnents generator kjørte json.dumps + f-string selv.
+Kjør: python tools/bench_sse.py [antall_hendelser]
+"""
+from __future__ import annotations
+import json
+import os
+import queue
+import sys
+import time
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import app.sse as sse  # noqa: E402
+from app.broker import InMemoryBackend  # noqa: E402
+SUBSCRIBERS = (1, 10, 50, 100, 250, 500)
+PAYLOAD = {
+    "type": "state",
+    "now_ms": 1_760_000_000_000,
+    "target_ms": 1_760_000_600_000,
+    "target_hhmm": "19:15",
+    "display_ms": 600_000,
+    "signed_display_ms": 600_000,
+    "state": "countdown",
+    "mode": "normal",
+    "blink": False,
+    "warn_ms": 240_000,
+    "alert_ms": 120_000,
+    "overrun_ms": 1_200_000,
+    "cfg_rev": 1_760_000_000,
+}
+def _legacy_format(wire):
+    body = json.dumps(wire["data"], separators=(",", ":"), ensure_ascii=False)
+    return f"id: {wire['id']}\nevent: {wire['type']}\ndata: {body}\n\n".encode("utf-8")
+def _queues(n, events):
+    qs = [sse._new_queue(maxsize=events + 1) for _ in range(n)]
+    return qs
+def bench_new(n, events):
+    qs = _queues(n, events)
+    t0 = time.perf_counter()
+    for _ in range(events):
+        sse.publish(PAYLOAD)
+    t_pub = time.perf_counter() - t0
+    for sq in qs:  # generator-siden: bare yield av ferdig ramme
+        while True:
+            try:
+                sq.q.get_nowait()
+            except queue.Empty:
+                break
+    t_all = time.perf_counter() - t0
+    for sq in qs:
+        sse._remove_queue(sq)
+    return t_pub, t_all
+def bench_legacy(n, events):
+    qs = _queues(n, events)
+    t0 = time.perf_counter()
+    for eid in range(events):
+        wire = {"id": eid, "type": "state", "data": dict(PAYLOAD, ts=time.time())}
+        sse._deliver_local(wire)  # type: ignore[arg-type]
+    t_pub = time.perf_counter() - t0
+    for sq in qs:  # generator-siden: serialiserer pr. abonnent
+        while True:
+            try:
+                _legacy_format(sq.q.get_nowait())
+            except queue.Empty:
+                break
+    t_all = time.perf_counter() - t0
+    for sq in qs:
+        sse._remove_queue(sq)
+    return t_pub, t_all
+def main() -> None:
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    sse.set_backend(InMemoryBackend())
+    t0 = time.perf_counter()
+    for _ in range(events):
+        sse.encode_frame(1, "state", PAYLOAD)
+    enc_us = (time.perf_counter() - t0) / events * 1e6
+    print(f"serialisering alene: {enc_us:.1f} µs/hendelse ({events} hendelser pr. måling)")
+    print(f"{'abonnenter':>10} | {'ny µs/hendelse':>15} {'µs/abonnent':>12} | {'gammel µs/hendelse':>19} {'µs/abonnent':>12}")
+    for n in SUBSCRIBERS:
+        _, new_all = bench_new(n, events)
+        _, old_all = bench_legacy(n, events)
+        new_ev = new_all / events * 1e6
+        old_ev = old_all / events * 1e6
+        print(f"{n:>10} | {new_ev:>15.1f} {new_ev / n:>12.2f} | {old_ev:>19.1f} {old_ev / n:>12.2f}")
+    print("Serialiseringskostnaden er konstant pr. hendelse; resten er kø-innsetting (O(n)).")
+if __name__ == "__main__":
+    main()
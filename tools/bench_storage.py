@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# File: tools/bench_storage.py
+"""
+Mikrobenchmark: load_config kald (cache-miss: les + merge + coerce + validate),
+varm (stat-treff) og save_config_patch, mot en midlertidig config.json.
+Viser i tillegg selve defaults-mergen: gammel json.loads(json.dumps(_DEFAULTS))
++ _deep_merge mot frosne defaults + _overlay, og serialiseringen av en config med
+5000 elementer i picsum_catalog: gammel skriver (mange fp.write + json.dumps pr.
+nøkkel) mot _encode_json (én join), pen og compact.
+Kjør: python tools/bench_storage.py [iterasjoner]
+"""
+from __future__ import annotations
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import app.storage as storage  # noqa: E402
+def _per_call_us(fn, n: int) -> float:
+    fn()  # oppvarming
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+def _cold() -> None:
+    storage.invalidate_config_cache()
+    storage.load_config()
+def _legacy_merge(raw):
+    return storage._deep_merge(json.loads(json.dumps(storage._DEFAULTS)), raw)
+def _legacy_write(fp, value, indent, level):
+    """Den gamle storage._write_json_value (referanse for sammenligning)."""
+    indent_current = " " * (indent * level)
+    indent_inner = " " * (indent * (level + 1))
+    if isinstance(value, dict):
+        items = list(value.items())
+        if not items:
+            fp.write("{}")
+            return
+        fp.write("{\n")
+        for i, (k, v) in enumerate(items):
+            fp.write(f"{indent_inner}{json.dumps(k, ensure_ascii=False)}: ")
+            _legacy_write(fp, v, indent, level + 1)
+            fp.write(",\n" if i < len(items) - 1 else "\n")
+        fp.write(f"{indent_current}}}")
+        return
+    if isinstance(value, list):
+        if not value:
+            fp.write("[]")
+            return
+        fp.write("[\n")
+        if isinstance(value, storage._CompactList):
+            lines = [f"{indent_inner}{json.dumps(x, ensure_ascii=False, separators=(',', ': '))}" for x in value]
+            fp.write(",\n".join(lines))
+            fp.write(f"\n{indent_current}]")
+            return
+        for i, item in enumerate(value):
+            fp.write(indent_inner)
+            _legacy_write(fp, item, indent, level + 1)
+            fp.write(",\n" if i < len(value) - 1 else "\n")
+        fp.write(f"{indent_current}]")
+        return
+    fp.write(json.dumps(value, ensure_ascii=False))
+def _legacy_dump(obj) -> str:
+    buf = io.StringIO()
+    _legacy_write(buf, obj, 2, 0)
+    buf.write("\n")
+    return buf.getvalue()
+def _big_config():
+    cfg = storage.get_defaults()
+    cfg["picsum_catalog"] = [
+        {"id": str(i), "author": f"Fotograf {i}", "width": 5000, "height": 3333, "url": f"https://unsplash.com/photos/{i:08x}"}
+        for i in range(5000)
+    ]
+    cfg["overlays"] = [{"id": f"o{i}", "type": "image", "url": f"/static/img/{i}.png", "x": i, "y": 0} for i in range(50)]
+    return storage._mark_compact_lists(storage._order_like_defaults(storage._DEFAULTS, cfg))
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.CONFIG_PATH = Path(tmp) / "config.json"
+        storage.invalidate_config_cache()
+        storage.load_config()
+        raw = json.loads(storage.CONFIG_PATH.read_text(encoding="utf-8"))
+        rows = [
+            ("load_config kald (miss)", _cold),
+            ("load_config varm (treff)", storage.load_config),
+            ("get_defaults()", storage.get_defaults),
+            ("merge: gammel json-kopi", lambda: _legacy_merge(raw)),
+        ]
+        if hasattr(storage, "_overlay"):
+            rows.append(("merge: frosset _overlay", lambda: storage._overlay(storage.frozen_defaults(), raw)))
+        for name, fn in rows:
+            print(f"{name:<28} {_per_call_us(fn, n):>9.1f} µs/kall")
+        t_save = _per_call_us(lambda: storage.save_config_patch({"message_primary": "x"}), max(1, n // 20))
+        print(f"{'save_config_patch (fsync)':<28} {t_save:>9.1f} µs/kall")
+    big = _big_config()
+    assert _legacy_dump(big) == storage._encode_json(big), "utdata skal være byte-identisk"
+    m = max(1, n // 100)
+    for name, fn in (
+        ("serialiser 5k: gammel", lambda: _legacy_dump(big)),
+        ("serialiser 5k: join", lambda: storage._encode_json(big)),
+        ("serialiser 5k: compact", lambda: storage._encode_json(big, compact=True)),
+    ):
+        print(f"{name:<28} {_per_call_us(fn, m) / 1000:>9.2f} ms/kall")
+if __name__ == "__main__":
+    main()
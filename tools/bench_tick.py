@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# File: tools/bench_tick.py
+"""
+Mikrobenchmark: ticks/s på én kjerne for compute_tick.
+- uten cache: CompiledSchedule(cfg).tick – tolker daily_time/once_at, TZ og strftime
+  hver gang (samme arbeid som gammel compute_tick)
+- compute_tick: kompilert plan slått opp pr. kall (nøkkel fra SCHEDULE_KEYS)
+- plan.tick: ferdig plan holdt av kalleren (ren heltallssti)
+- instances.compute_ticks: alle N navngitte instanser i én runde (felles now_ms)
+Kjør: python tools/bench_tick.py [iterasjoner]
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import app.countdown as countdown  # noqa: E402
+import app.instances as instances  # noqa: E402
+import app.storage as storage  # noqa: E402
+def _rate(fn, n: int) -> float:
+    fn()  # oppvarming
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / (time.perf_counter() - t0)
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    now = countdown._now_ms()
+    cfgs = {
+        "daily": storage.get_defaults(),
+        "once": {**storage.get_defaults(), "mode": "once", "once_at": "2030-01-01T12:00"},
+        "duration": {
+            **storage.get_defaults(),
+            "mode": "duration",
+            "duration_minutes": 30,
+            "duration_started_ms": now,
+        },
+    }
+    for name, cfg in cfgs.items():
+        plan = countdown.compile_schedule(cfg)
+        rows = [
+            ("uten cache", lambda: countdown.CompiledSchedule(cfg).tick(now)),
+            ("compute_tick", lambda: countdown.compute_tick(cfg)),
+            ("plan.tick", lambda: plan.tick(now)),
+        ]
+        for label, fn in rows:
+            print(f"{name:<9} {label:<14} {_rate(fn, n):>12,.0f} ticks/s")
+    for count in (10, 100, 1000, 5000):
+        cfg = {**storage.get_defaults(), "instances": {}}
+        for i in range(count):
+            cfg["instances"][f"rom-{i}"] = {"daily_time": f"{8 + i % 12:02d}:{i % 60:02d}"}
+        etag = f"bench-{count}"
+        t0 = time.perf_counter()
+        instances.instance_plans(cfg, etag)
+        t_compile = time.perf_counter() - t0
+        rounds = max(3, n // (count * 4))
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            instances.compute_ticks(cfg, etag)
+        per_round = (time.perf_counter() - t0) / rounds
+        print(
+            f"instanser {count:>5}: kompilering {t_compile * 1000:7.1f} ms, "
+            f"runde {per_round * 1000:7.2f} ms ({count / per_round:>10,.0f} ticks/s)"
+        )
+if __name__ == "__main__":
+    main()